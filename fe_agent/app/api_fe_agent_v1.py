@@ -0,0 +1,99 @@
+# ============================================================
+#  api_fe_agent_v1.py
+#  Agente FE — API HTTP asíncrona (ASGI) sin interfaz
+# ============================================================
+#
+#  Requiere, además de las dependencias del agente:
+#    pip install fastapi pydantic uvicorn httpx
+#
+#  Uso (desde fe_agent/):
+#    uvicorn app.api_fe_agent_v1:app --host 0.0.0.0 --port 8000
+#
+#  Un solo proceso atiende a todos los usuarios con los mismos diccionarios,
+#  clasificador, cachés y pool HTTP (core/agent_service_v1.py). Con varios
+#  workers de uvicorn cada uno carga su copia; sesiones (SQLite WAL) y tablas
+#  (table store en disco) se comparten entre ellos.
+
+import sys, os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from contextlib import asynccontextmanager
+from typing import Any, Dict, Optional
+
+import pyarrow as pa
+from fastapi import FastAPI, HTTPException, Request, Response
+from pydantic import BaseModel, Field
+
+from core.agent_service_v1 import AgentServiceV1
+from core.tracing_v1 import configure_tracer
+
+
+class PreguntaV1(BaseModel):
+    pregunta: str = Field(..., min_length=1)
+    sesion_id: Optional[str] = None
+
+
+class AccionV1(BaseModel):
+    accion: str = Field(..., min_length=1)
+    parametros: Dict[str, Any] = Field(default_factory=dict)
+    visualizacion: Optional[str] = None
+    sesion_id: Optional[str] = None
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Carga única al arrancar el proceso (no por petición ni por usuario)
+    configure_tracer(os.environ.get("FE_TRACES_PATH", "data/traces.jsonl"))
+    app.state.servicio = AgentServiceV1(
+        llm_url=os.environ.get("FE_LLM_URL", "http://localhost:11434/api/generate"),
+        model=os.environ.get("FE_LLM_MODEL", "gemma:2b"),
+    )
+    yield
+    await app.state.servicio.cerrar()
+
+
+app = FastAPI(title="Agente FE", version="1.0", lifespan=lifespan)
+
+
+def _servicio(request: Request) -> AgentServiceV1:
+    return request.app.state.servicio
+
+
+@app.post("/ask")
+async def ask(cuerpo: PreguntaV1, request: Request) -> Dict[str, Any]:
+    """Turno completo: aclaración o interpretación + ejecución."""
+    return await _servicio(request).ask(cuerpo.pregunta, cuerpo.sesion_id)
+
+
+@app.post("/clarify")
+async def clarify(cuerpo: PreguntaV1, request: Request) -> Dict[str, Any]:
+    """Evalúa ambigüedad y devuelve la aclaración, sin ejecutar."""
+    return await _servicio(request).clarify(cuerpo.pregunta, cuerpo.sesion_id)
+
+
+@app.post("/execute")
+async def execute(cuerpo: AccionV1, request: Request) -> Dict[str, Any]:
+    """Ejecuta una acción ya resuelta (motor local, operación de interfaz o n8n)."""
+    return await _servicio(request).execute(cuerpo.accion, cuerpo.parametros,
+                                            cuerpo.visualizacion, cuerpo.sesion_id)
+
+
+@app.get("/tables/{ref}")
+async def tabla(ref: str, request: Request, formato: str = "json") -> Response:
+    """Tabla completa de un resultado: JSON (registros) o Arrow IPC (formato=arrow)."""
+    df = await _servicio(request).tabla(ref)
+    if df is None:
+        raise HTTPException(status_code=404, detail=f"Tabla {ref} no encontrada")
+    if formato == "arrow":
+        sink = pa.BufferOutputStream()
+        t = pa.Table.from_pandas(df, preserve_index=False)
+        with pa.ipc.new_stream(sink, t.schema) as writer:
+            writer.write_table(t)
+        return Response(sink.getvalue().to_pybytes(), media_type="application/vnd.apache.arrow.stream")
+    return Response(df.to_json(orient="records", date_format="iso", force_ascii=False),
+                    media_type="application/json")
+
+
+@app.get("/health")
+async def health() -> Dict[str, Any]:
+    return {"ok": True}
@@ -0,0 +1,131 @@
+# ============================================================
+#  app_fe_agent_v10.py
+#  Agente FE — Cliente Streamlit liviano sobre la API (api_fe_agent_v1)
+# ============================================================
+#
+#  Requiere (la API): pip install fastapi pydantic uvicorn httpx
+#
+#  Uso (desde fe_agent/):
+#    uvicorn app.api_fe_agent_v1:app --port 8000
+#    FE_AGENT_API_URL=http://localhost:8000 streamlit run app/app_fe_agent_v10.py
+
+import sys, os, uuid
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+
+import streamlit as st
+import pandas as pd
+import pyarrow as pa
+
+from core.http_transport import get_transport
+from core.render_visualization import VisualizationRenderer
+
+API_URL = os.environ.get("FE_AGENT_API_URL", "http://localhost:8000").rstrip("/")
+
+# ------------------------------------
+# INIT
+# ------------------------------------
+st.set_page_config(page_title="Agente FE v10", layout="wide")
+st.title("🧠 Agente FE — Asistente de Análisis Comercial Inteligente")
+
+# Sesión por usuario (se conserva en la URL para sobrevivir a recargas)
+if "sesion_id" not in st.session_state:
+    st.session_state.sesion_id = st.query_params.get("sesion") or uuid.uuid4().hex
+    st.query_params["sesion"] = st.session_state.sesion_id
+
+
+@st.cache_resource(show_spinner=False)
+def renderer() -> VisualizationRenderer:
+    # Uno por proceso: la caché de figuras y su pool se comparten entre sesiones
+    return VisualizationRenderer()
+
+
+viz = renderer()
+http = get_transport()
+
+
+def llamar_api(endpoint: str, cuerpo: dict) -> dict:
+    """POST a la API del agente; los errores se devuelven con el mismo sobre que la API."""
+    try:
+        response = http.post(f"{API_URL}/{endpoint}", json=dict(cuerpo, sesion_id=st.session_state.sesion_id),
+                             timeout=(5, 600))
+        response.raise_for_status()
+        return response.json()
+    except Exception as e:
+        print(f"[app_fe_agent_v10] Error llamando a /{endpoint}: {e}")
+        return {"tipo": "error", "ok": False, "mensaje": "El servicio del agente no está disponible."}
+
+
+def tabla_completa(ref: str):
+    """Tabla completa de un resultado (GET /tables/{ref} en Arrow IPC); None si no se pudo obtener."""
+    try:
+        response = http.get(f"{API_URL}/tables/{ref}", params={"formato": "arrow"}, timeout=(5, 600))
+        response.raise_for_status()
+        return pa.ipc.open_stream(response.content).read_pandas()
+    except Exception as e:
+        print(f"[app_fe_agent_v10] Error obteniendo la tabla {ref}: {e}")
+        return None
+
+
+# Sidebar
+with st.sidebar:
+    st.subheader("⚙️ Configuración del Asistente")
+    st.markdown("Este asistente te ayuda a analizar tus **ventas**, **compras**, **clientes** y **stock** usando IA.")
+    backend = st.selectbox(
+        "Motor de visualización",
+        ["streamlit", "matplotlib", "plotly"],
+        index=0
+    )
+    st.info(f"Backend actual: {backend}")
+    st.caption(f"API: {API_URL}")
+
+# ------------------------------------
+# INTERFAZ PRINCIPAL
+# ------------------------------------
+user_input = st.chat_input("Soy tu asistente de análisis de compra-venta. ¿En qué te puedo ayudar hoy?")
+
+if user_input:
+    st.chat_message("user").markdown(user_input)
+    r = llamar_api("ask", {"pregunta": user_input})
+    tipo = r.get("tipo")
+
+    if tipo in ("clarificacion", "fuera_de_dominio"):
+        clar = r.get("clarificacion") or {}
+        q = clar.get("clarification_question")
+        reph = clar.get("rephrased_question")
+        if tipo == "fuera_de_dominio":
+            st.chat_message("assistant").markdown(q or "Esa pregunta parece fuera del dominio de la ferretería.")
+        else:
+            if q:
+                st.chat_message("assistant").markdown(q)
+            if reph:
+                st.chat_message("assistant").markdown(f"¿Te refieres a: *{reph}*?")
+        st.stop()
+
+    if not r.get("ok"):
+        st.chat_message("assistant").markdown(r.get("mensaje") or "No se pudo ejecutar la acción solicitada.")
+        st.stop()
+
+    if r.get("mensaje"):
+        st.chat_message("assistant").markdown(r["mensaje"])
+
+    tabla = r.get("tabla")
+    visual = r.get("visualizacion")
+    if tabla:
+        df = pd.DataFrame(tabla["filas"], columns=tabla["columnas"])
+        st.dataframe(df)
+        grafico = df
+        if tabla.get("truncada"):
+            st.caption(f"Mostrando {len(df)} de {tabla['total_filas']} filas.")
+            # El gráfico se arma con la tabla completa, nunca con la primera página
+            grafico = tabla_completa(tabla["ref"]) if visual and tabla.get("ref") else None
+        if visual and grafico is None:
+            st.caption("No se pudo obtener la tabla completa; el gráfico se omite para no mostrar datos parciales.")
+        elif visual:
+            if tipo == "resultado":
+                st.chat_message("assistant").markdown(
+                    f"Generando gráfico sugerido: **{visual}** ({backend})"
+                )
+            viz.render(grafico, visual, backend=backend)
+    elif r.get("texto") is not None:
+        st.chat_message("assistant").markdown(str(r["texto"]))
@@ -3,20 +3,86 @@
 #  Agente FE — Visualización avanzada con Matplotlib y Plotly
 # ============================================================
 
-import sys, os
+import sys, os, uuid
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
 
 import streamlit as st
-import pandas as pd
 
-from core.context_manager_v3 import ContextManager
-from core.llm_interpreter_v3 import LLMInterpreterV3
-from core.n8n_connector_v3 import N8NConnectorV3
-from core.ambiguity_manager_v3 import AmbiguityManagerV3
-from core.disambiguation_manager_v2 import DisambiguationManagerV2
-from core.hypothesis_router_v1 import HypothesisRouterV1
-from core.render_visualization import VisualizationRenderer
+from core.startup_v1 import RecursosCompartidosV1
+from core.tracing_v1 import configure_tracer
+from core.turn_flow_v1 import FlujoTurnoV1, PresentadorTurnoV1, TIPOS_PRECALENTADOS
+
+PROMPT_FILE = "data/FE_prompt_instruccional_v4.json"
+DICCIONARIO_FILE = "data/FE_diccionario_operativo_integrado_v4.json"
+
+# ------------------------------------
+# RECURSOS COMPARTIDOS (una vez por proceso, para todas las sesiones)
+# Las importaciones pesadas (pandas, pyarrow, numpy, motor local) viven en
+# las fábricas: la página se dibuja sin esperarlas y se cargan en segundo plano.
+# ------------------------------------
+def _llm():
+    from core.llm_interpreter_v3 import LLMInterpreterV3
+    from core.intent_cache_v1 import IntentCacheV1
+    return LLMInterpreterV3(
+        llm_url="http://localhost:11434/api/generate",
+        model="gemma:2b",
+        prompt_file=PROMPT_FILE,
+        prefix_cache=True,
+        stream=True,
+        cache=IntentCacheV1(archivos_vigilados=[PROMPT_FILE, DICCIONARIO_FILE])
+    )
+
+def _n8n():
+    from core.n8n_connector_v3 import N8NConnectorV3
+    from core.result_cache_v1 import ResultCacheV1
+    return N8NConnectorV3(
+        diccionario_path=DICCIONARIO_FILE,
+        result_cache=ResultCacheV1()
+    )
+
+def _amb():
+    from core.ambiguity_manager_v3 import AmbiguityManagerV3
+    return AmbiguityManagerV3()
+
+def _dis():
+    from core.disambiguation_manager_v2 import DisambiguationManagerV2
+    from core.intent_classifier_v1 import IntentClassifierV1
+    return DisambiguationManagerV2(classifier=IntentClassifierV1.cargar_o_entrenar())
+
+def _hyp():
+    from core.hypothesis_router_v1 import HypothesisRouterV1
+    from core.local_engine_v1 import LocalExecutionEngineV1
+    from core.data_store_v1 import ColumnarDataStoreV1
+    return HypothesisRouterV1(
+        local_engine=LocalExecutionEngineV1(
+            diccionario_path=DICCIONARIO_FILE,
+            data_store=ColumnarDataStoreV1(data_dir="data", snapshot_dir="data/snapshots")
+        )
+    )
+
+def _viz():
+    from core.render_visualization import VisualizationRenderer
+    return VisualizationRenderer()
+
+def _fast():
+    from core.intent_matcher_v1 import IntentMatcherV1
+    return IntentMatcherV1()
+
+def _stores():
+    from core.session_store_v1 import get_session_store
+    from core.table_store_v1 import get_table_store
+    return get_session_store("data/sessions.sqlite"), get_table_store("data/result_tables")
+
+@st.cache_resource(show_spinner=False)
+def recursos_compartidos() -> RecursosCompartidosV1:
+    recursos = RecursosCompartidosV1(
+        {"stores": _stores, "fast": _fast, "amb": _amb, "llm": _llm, "n8n": _n8n,
+         "dis": _dis, "viz": _viz, "hyp": _hyp},
+        tracer=configure_tracer("data/traces.jsonl")
+    )
+    recursos.precargar(modulos=("pandas", "pyarrow", "numpy"))
+    return recursos
 
 # ------------------------------------
 # INIT
@@ -24,35 +90,65 @@ from core.render_visualization import VisualizationRenderer
 st.set_page_config(page_title="Agente FE v9", layout="wide")
 st.title("🧠 Agente FE — Asistente de Análisis Comercial Inteligente")
 
-# Managers
-if "cm" not in st.session_state:
-    st.session_state.cm = ContextManager(persist_path="data/session.json")
-if "llm" not in st.session_state:
-    st.session_state.llm = LLMInterpreterV3(
-        llm_url="http://localhost:11434/api/generate",
-        model="gemma:2b",
-        prompt_file="data/FE_prompt_instruccional_v4.json"
-    )
-if "n8n" not in st.session_state:
-    st.session_state.n8n = N8NConnectorV3()
-if "amb" not in st.session_state:
-    st.session_state.amb = AmbiguityManagerV3()
-if "dis" not in st.session_state:
-    st.session_state.dis = DisambiguationManagerV2()
-if "hyp" not in st.session_state:
-    st.session_state.hyp = HypothesisRouterV1()
-if "viz" not in st.session_state:
-    st.session_state.viz = VisualizationRenderer()
-
-cm, llm, n8n, amb, dis, hyp, viz = (
-    st.session_state.cm,
-    st.session_state.llm,
-    st.session_state.n8n,
-    st.session_state.amb,
-    st.session_state.dis,
-    st.session_state.hyp,
-    st.session_state.viz,
-)
+tracer = configure_tracer("data/traces.jsonl")
+recursos = recursos_compartidos()
+
+# Sesión por usuario (se conserva en la URL para sobrevivir a recargas)
+if "sesion_id" not in st.session_state:
+    st.session_state.sesion_id = st.query_params.get("sesion") or uuid.uuid4().hex
+    st.query_params["sesion"] = st.session_state.sesion_id
+
+
+def contexto_sesion():
+    """ContextManager de la sesión (lo único que no se comparte entre usuarios)."""
+    if "cm" not in st.session_state:
+        from core.context_manager_v3 import ContextManager
+        session_store, table_store = recursos.get("stores")
+        st.session_state.cm = ContextManager(
+            store=session_store,
+            session_id=st.session_state.sesion_id,
+            table_store=table_store
+        )
+    return st.session_state.cm
+
+class PresentadorStreamlit(PresentadorTurnoV1):
+    """Dibuja el turno en la página; tablas y avance comparten un mismo espacio (st.empty)."""
+
+    def __init__(self, viz, backend: str):
+        self.viz = viz
+        self.backend = backend
+        self._vista = None
+
+    def vista(self):
+        if self._vista is None:
+            self._vista = st.empty()
+        return self._vista
+
+    def mensaje(self, texto: str) -> None:
+        st.chat_message("assistant").markdown(texto)
+
+    def avance(self, primeras, filas: int) -> None:
+        with self.vista().container():
+            st.dataframe(primeras)
+            st.caption(f"Recibiendo resultado... {filas:,} filas")
+
+    def tabla(self, df) -> None:
+        self.vista().dataframe(df)
+
+    def tabla_parcial(self, primeras, total: int) -> None:
+        with self.vista().container():
+            st.dataframe(primeras)
+            st.caption(f"Primeras {primeras.num_rows:,} de {total:,} filas; "
+                       "la tabla completa está disponible para exportar.")
+
+    def grafico(self, df, visual: str, precalentar: bool = False) -> None:
+        if precalentar:
+            self.mensaje(f"Generando gráfico sugerido: **{visual}** ({self.backend})")
+        self.viz.render(df, visual, backend=self.backend)
+        if precalentar:
+            # Los otros tipos quedan listos en segundo plano (cambiar de gráfico es instantáneo)
+            self.viz.precalentar(df, TIPOS_PRECALENTADOS, self.backend)
+
 
 # Sidebar
 with st.sidebar:
@@ -65,6 +161,11 @@ with st.sidebar:
     )
     st.info(f"Backend actual: {backend}")
     st.markdown("**Modo gráfico:** adaptativo según acción o preferencia del usuario.")
+    with st.expander("⏱️ Perfil de arranque"):
+        if recursos.listo_ms is not None:
+            st.caption(f"Recursos listos en {recursos.listo_ms} ms")
+        for p in recursos.perfil():
+            st.caption(f"{p['etapa']} {p['nombre']}: {p['ms']} ms")
 
 # ------------------------------------
 # INTERFAZ PRINCIPAL
@@ -72,61 +173,13 @@ with st.sidebar:
 user_input = st.chat_input("Soy tu asistente de análisis de compra-venta. ¿En qué te puedo ayudar hoy?")
 
 if user_input:
-    st.chat_message("user").markdown(user_input)
-
-    # 1️⃣ Detectar ambigüedad o fuera de dominio
-    amb_eval = amb.procesar_input(user_input)
-    if amb_eval.get("requiere_clarificacion"):
-        tipo = amb_eval.get("tipo")
-        motivo = amb_eval.get("mensaje")
-
-        if tipo in ("clarify", "out_of_scope"):
-            ctx = cm.to_llm_context(limit_historial=6)
-            clar = dis.clarify(user_input, ctx)
-            status = clar.get("status")
-            q = clar.get("clarification_question")
-            reph = clar.get("rephrased_question")
-
-            if status == "out_of_scope":
-                st.chat_message("assistant").markdown(
-                    q or "Esa pregunta parece fuera del dominio de la ferretería."
-                )
-                st.stop()
-
-            if q:
-                st.chat_message("assistant").markdown(q)
-                cm.update("clarificacion_pendiente", q)
-            if reph:
-                st.chat_message("assistant").markdown(f"¿Te refieres a: *{reph}*?")
-            st.stop()
-
-    # 2️⃣ Interpretación normal
-    parsed = llm.interpret(user_input, cm.to_llm_context())
-    accion, params = parsed.get("accion"), parsed.get("parametros")
-    visual = parsed.get("visualizacion_sugerida", "")
-
-    # 3️⃣ Ejecutar acción
-    result = n8n.execute(accion, params)
-    data = result.get("data")
-    ok = result.get("ok", False)
-
-    if not ok:
-        st.chat_message("assistant").markdown("No se pudo ejecutar la acción solicitada.")
-        st.stop()
-
-    # 4️⃣ Mostrar resultado + visualización
-    if isinstance(data, dict) and "tabla" in data:
-        df = pd.DataFrame(data["tabla"])
-        st.dataframe(df)
-        cm.update("ultima_tabla", data["tabla"])
-
-        if visual:
-            st.chat_message("assistant").markdown(
-                f"Generando gráfico sugerido: **{visual}** ({backend})"
-            )
-            viz.render(df, visual, backend=backend)
-    else:
-        st.chat_message("assistant").markdown(str(data))
-
-    cm.update_last_action(accion)
-    cm.save_to_file()
+    # Una traza por turno (spans por etapa y por llamada HTTP, exportados a data/traces.jsonl)
+    with tracer.traza("turno", sesion=st.session_state.sesion_id):
+        st.chat_message("user").markdown(user_input)
+        with st.spinner("Preparando el asistente..."):
+            cm = contexto_sesion()
+            llm, n8n, amb, dis, hyp, viz, fast = (recursos.get(n) for n in
+                                                  ("llm", "n8n", "amb", "dis", "hyp", "viz", "fast"))
+
+        flujo = FlujoTurnoV1(fast, amb, dis, llm, hyp, n8n)
+        flujo.run(cm, user_input, PresentadorStreamlit(viz, backend))
@@ -0,0 +1,338 @@
+# ============================================================
+#  benchmarks/bench_pipeline_v1.py
+#  Benchmark de punta a punta del pipeline de app_fe_agent_v9 (sin UI)
+#  Autor: Eduardo Sánchez Santana
+#  Fecha: 2025-11-07
+# ============================================================
+#
+#  Uso (desde fe_agent/):
+#    python -m benchmarks.bench_pipeline_v1 --usuarios 8 --turnos 25
+#    python -m benchmarks.bench_pipeline_v1 --sin-matcher --sin-motor-local --json base.json
+#    python -m benchmarks.bench_pipeline_v1 --base base.json      # compara contra una corrida previa
+#
+#  Ollama y n8n se sustituyen por servidores locales (benchmarks/mock_servers.py);
+#  las URLs de localhost:11434 y localhost:5678 se redirigen a ellos. Sesiones,
+#  tablas y logs (n8n, fallback) van a un directorio temporal: data/ no se toca.
+#  Las latencias se reportan también por resultado del turno, y la corrida
+#  falla (código 1) si la tasa de errores supera --max-errores.
+
+import argparse
+import json
+import logging
+import os
+import random
+import tempfile
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from benchmarks.mock_servers import MockN8NServer, MockOllamaServer
+from core.ambiguity_manager_v3 import AmbiguityManagerV3
+from core.context_manager_v3 import ContextManager
+from core.data_store_v1 import ColumnarDataStoreV1
+from core.disambiguation_manager_v2 import DisambiguationManagerV2
+from core.http_transport import HTTPTransport
+from core.hypothesis_router_v1 import HypothesisRouterV1
+from core.intent_cache_v1 import IntentCacheV1
+from core.intent_classifier_v1 import IntentClassifierV1
+from core.intent_matcher_v1 import IntentMatcherV1
+from core.llm_interpreter_v3 import LLMInterpreterV3
+from core.local_engine_v1 import LocalExecutionEngineV1
+from core.n8n_connector_v3 import N8NConnectorV3
+from core.render_visualization import VisualizationRenderer
+from core.result_cache_v1 import ResultCacheV1
+from core.session_store_v1 import get_session_store
+from core.table_store_v1 import get_table_store
+from core.turn_flow_v1 import TIPOS_PRECALENTADOS, FlujoTurnoV1, PresentadorTurnoV1
+
+PROMPT_FILE = "data/FE_prompt_instruccional_v4.json"
+DICCIONARIO_FILE = "data/FE_diccionario_operativo_integrado_v4.json"
+
+ETAPAS = ("ambiguedad", "desambiguacion", "interpretacion", "ejecucion", "renderizado", "turno")
+# Resultados de turno que cuentan como error (además de "excepcion:<Tipo>")
+RESULTADOS_ERROR = ("error_ejecucion",)
+
+# Preguntas que no están en el banco: vagas, fuera de dominio y operaciones de interfaz
+PREGUNTAS_EXTRA = [
+    "ventas?",
+    "muéstrame eso de los datos",
+    "¿qué tiempo hará mañana en Santiago?",
+    "ventas o compras y margen del mes",
+    "repite la última tabla",
+    "¿cuánto vendimos la semana pasada en la sucursal centro?",
+]
+
+
+class _TransporteRedirigido(HTTPTransport):
+    """HTTPTransport que reescribe los prefijos de URL reales hacia los servidores simulados."""
+
+    def __init__(self, redirecciones: Dict[str, str], **kwargs):
+        super().__init__(**kwargs)
+        self.redirecciones = redirecciones
+
+    def post(self, url: str, *args, **kwargs):
+        for origen, destino in self.redirecciones.items():
+            if url.startswith(origen):
+                url = destino + url[len(origen):]
+                break
+        return super().post(url, *args, **kwargs)
+
+
+class PipelineHeadlessV1:
+    """
+    Corre el mismo flujo de turno que app_fe_agent_v9 (core/turn_flow_v1) sin
+    Streamlit y mide cada etapa (time.perf_counter, en milisegundos). Los componentes sin estado de usuario
+    se comparten entre usuarios simulados; cada usuario tiene su ContextManager.
+    """
+
+    def __init__(self,
+                 transporte: HTTPTransport,
+                 directorio: str,
+                 backend: str = "plotly",
+                 usar_matcher: bool = True,
+                 usar_motor_local: bool = True,
+                 usar_clasificador: bool = True,
+                 usar_cache: bool = True):
+        self.backend = backend
+        self.directorio = directorio
+        self.session_store = get_session_store(os.path.join(directorio, "sessions.sqlite"))
+        fallback_log = os.path.join(directorio, "fallback_log.jsonl")
+        self.table_store = get_table_store(os.path.join(directorio, "result_tables"))
+        self.llm = LLMInterpreterV3(
+            prompt_file=PROMPT_FILE,
+            prefix_cache=True,
+            stream=True,
+            cache=IntentCacheV1(archivos_vigilados=[PROMPT_FILE, DICCIONARIO_FILE],
+                                persist_path=None) if usar_cache else None,
+            transport=transporte,
+        )
+        self.n8n = N8NConnectorV3(
+            diccionario_path=DICCIONARIO_FILE,
+            log_path=os.path.join(directorio, "n8n_logs.jsonl"),
+            result_cache=ResultCacheV1() if usar_cache else None,
+            transport=transporte,
+            table_store=self.table_store,
+            fallback_log=fallback_log,
+        )
+        self.amb = AmbiguityManagerV3()
+        self.dis = DisambiguationManagerV2(
+            transport=transporte,
+            classifier=IntentClassifierV1.cargar_o_entrenar() if usar_clasificador else None,
+        )
+        self.hyp = HypothesisRouterV1(
+            local_engine=LocalExecutionEngineV1(
+                diccionario_path=DICCIONARIO_FILE,
+                data_store=ColumnarDataStoreV1(data_dir="data", snapshot_dir=os.path.join(directorio, "snapshots")),
+            ) if usar_motor_local else None,
+            fallback_log=fallback_log,
+        )
+        self.viz = VisualizationRenderer()
+        self.fast = IntentMatcherV1() if usar_matcher else None
+
+    def cerrar(self) -> None:
+        """Vacía los logs en segundo plano y cierra la base de sesiones antes de borrar el directorio."""
+        self.n8n.log.close()
+        self.n8n.fb.store.log.close()
+        self.session_store.close()
+
+    def contexto_usuario(self, usuario: int) -> ContextManager:
+        return ContextManager(store=self.session_store, session_id=f"bench-{usuario}",
+                              table_store=self.table_store, state={})
+
+    def turno(self, cm: ContextManager, user_input: str) -> Dict[str, Any]:
+        """Un turno completo (FlujoTurnoV1, el mismo de la app); devuelve {"etapas": {etapa: ms}, "resultado": str}."""
+        etapas: Dict[str, float] = {}
+
+        def medir(etapa: str, ms: float) -> None:
+            etapas[etapa] = etapas.get(etapa, 0.0) + ms
+
+        flujo = FlujoTurnoV1(self.fast, self.amb, self.dis, self.llm, self.hyp, self.n8n, medir=medir)
+        inicio = time.perf_counter()
+        salida = flujo.run(cm, user_input, _PresentadorHeadless(self.viz, self.backend))
+        etapas["turno"] = (time.perf_counter() - inicio) * 1000
+        return {"etapas": etapas, "resultado": salida["resultado"]}
+
+
+class _PresentadorHeadless(PresentadorTurnoV1):
+    """Sin interfaz: solo se construyen las figuras (lo que cuesta el renderizado)."""
+
+    def __init__(self, viz: VisualizationRenderer, backend: str):
+        self.viz = viz
+        self.backend = backend
+
+    def grafico(self, df: pd.DataFrame, visual: str, precalentar: bool = False) -> None:
+        self.viz.render(df, visual, backend=self.backend)
+        if precalentar:
+            self.viz.precalentar(df, TIPOS_PRECALENTADOS, self.backend)
+
+
+def cargar_preguntas(path: str = "data/FE_preguntas_respuestas_v3.json") -> List[str]:
+    with open(path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    preguntas = []
+    for p in data.get("preguntas", []):
+        preguntas.append(p["pregunta"])
+        preguntas.extend(p.get("sinonimos", []))
+    return preguntas + PREGUNTAS_EXTRA
+
+
+def percentiles(valores: List[float]) -> Dict[str, float]:
+    if not valores:
+        return {"n": 0}
+    p50, p95, p99 = np.percentile(valores, [50, 95, 99])
+    return {"n": len(valores), "p50": round(float(p50), 2), "p95": round(float(p95), 2),
+            "p99": round(float(p99), 2), "media": round(float(np.mean(valores)), 2)}
+
+
+def es_error(resultado: str) -> bool:
+    return resultado in RESULTADOS_ERROR or resultado.startswith("excepcion:")
+
+
+def ejecutar(pipeline: PipelineHeadlessV1, usuarios: int, turnos: int, semilla: int = 7) -> Dict[str, Any]:
+    """
+    Lanza `usuarios` hilos que hacen `turnos` preguntas cada uno; agrega tiempos
+    por etapa, en total y por resultado del turno (un error rápido no debe
+    pasar por una latencia buena).
+    """
+    preguntas = cargar_preguntas()
+    muestras: Dict[str, List[float]] = {e: [] for e in ETAPAS}
+    por_resultado: Dict[str, Dict[str, List[float]]] = {}
+    resultados: Dict[str, int] = {}
+    lock = threading.Lock()
+
+    def usuario(u: int) -> None:
+        rng = random.Random(semilla + u)
+        cm = pipeline.contexto_usuario(u)
+        for _ in range(turnos):
+            try:
+                salida = pipeline.turno(cm, rng.choice(preguntas))
+            except Exception as e:
+                salida = {"etapas": {}, "resultado": f"excepcion:{type(e).__name__}"}
+            with lock:
+                propias = por_resultado.setdefault(salida["resultado"], {e: [] for e in ETAPAS})
+                for etapa, ms in salida["etapas"].items():
+                    muestras[etapa].append(ms)
+                    propias[etapa].append(ms)
+                resultados[salida["resultado"]] = resultados.get(salida["resultado"], 0) + 1
+
+    inicio = time.perf_counter()
+    hilos = [threading.Thread(target=usuario, args=(u,), name=f"bench-user-{u}") for u in range(usuarios)]
+    for h in hilos:
+        h.start()
+    for h in hilos:
+        h.join()
+    duracion = time.perf_counter() - inicio
+
+    total = usuarios * turnos
+    errores = sum(n for r, n in resultados.items() if es_error(r))
+    return {
+        "usuarios": usuarios,
+        "turnos": total,
+        "duracion_s": round(duracion, 3),
+        "throughput_turnos_s": round(total / duracion, 2) if duracion else 0.0,
+        "resultados": resultados,
+        "tasa_errores": round(errores / total, 4) if total else 0.0,
+        "etapas": {e: percentiles(v) for e, v in muestras.items()},
+        "etapas_por_resultado": {r: {e: percentiles(v) for e, v in m.items()}
+                                 for r, m in sorted(por_resultado.items())},
+    }
+
+
+def _tabla_etapas(etapas: Dict[str, Dict[str, float]], previas: Optional[Dict[str, Any]] = None) -> None:
+    print(f"{'etapa':<16}{'n':>6}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'media':>10}"
+          + (f"{'Δp95':>11}" if previas is not None else ""))
+    for etapa, s in etapas.items():
+        if not s.get("n"):
+            print(f"{etapa:<16}{0:>6}")
+            continue
+        linea = f"{etapa:<16}{s['n']:>6}{s['p50']:>10}{s['p95']:>10}{s['p99']:>10}{s['media']:>10}"
+        previo = (previas or {}).get(etapa, {})
+        if previo.get("p95"):
+            linea += f"{(s['p95'] - previo['p95']) / previo['p95'] * 100:>+10.1f}%"
+        print(linea)
+
+
+def imprimir(reporte: Dict[str, Any], base: Optional[Dict[str, Any]] = None) -> None:
+    print(f"\nUsuarios: {reporte['usuarios']}  Turnos: {reporte['turnos']}  "
+          f"Duración: {reporte['duracion_s']} s  Throughput: {reporte['throughput_turnos_s']} turnos/s")
+    print(f"Resultados: {reporte['resultados']}  Tasa de errores: {reporte['tasa_errores']:.1%}\n")
+    print("Todos los turnos")
+    _tabla_etapas(reporte["etapas"], (base or {}).get("etapas") if base else None)
+    for resultado, etapas in reporte["etapas_por_resultado"].items():
+        previas = ((base or {}).get("etapas_por_resultado") or {}).get(resultado, {}) if base else None
+        print(f"\nResultado: {resultado}" + ("  (error)" if es_error(resultado) else ""))
+        _tabla_etapas(etapas, previas)
+    if base:
+        delta = (reporte["throughput_turnos_s"] - base["throughput_turnos_s"]) / (base["throughput_turnos_s"] or 1) * 100
+        print(f"\nThroughput vs base: {delta:+.1f}%")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark de punta a punta del agente FE")
+    parser.add_argument("--usuarios", type=int, default=4, help="usuarios simulados concurrentes")
+    parser.add_argument("--turnos", type=int, default=20, help="turnos por usuario")
+    parser.add_argument("--latencia-llm", type=float, default=150.0, help="ms hasta el primer token del LLM simulado")
+    parser.add_argument("--tokens-por-segundo", type=float, default=40.0, help="velocidad de generación del LLM simulado")
+    parser.add_argument("--latencia-n8n", type=float, default=80.0, help="ms de ejecución de cada webhook simulado")
+    parser.add_argument("--filas", type=int, default=12, help="filas de las tablas sintetizadas por n8n")
+    parser.add_argument("--formato-n8n", default="json", choices=["json", "ndjson", "paginas"],
+                        help="cómo responde n8n las tablas (cuerpo completo, NDJSON o páginas con cursor)")
+    parser.add_argument("--backend", default="plotly", choices=["plotly", "matplotlib"])
+    parser.add_argument("--sin-matcher", action="store_true", help="desactiva el atajo determinista")
+    parser.add_argument("--sin-motor-local", action="store_true", help="todas las acciones van a n8n")
+    parser.add_argument("--sin-clasificador", action="store_true", help="la desambiguación siempre consulta al LLM")
+    parser.add_argument("--sin-cache", action="store_true", help="sin caché de intenciones ni de resultados")
+    parser.add_argument("--max-errores", type=float, default=0.05,
+                        help="tasa de turnos con error por encima de la cual la corrida falla")
+    parser.add_argument("--json", help="guarda el reporte en este archivo")
+    parser.add_argument("--base", help="reporte JSON previo contra el cual comparar")
+    args = parser.parse_args()
+
+    # Sin ScriptRunContext, cada st.* emite un aviso: se desactivan los loggers de streamlit
+    # (set_log_level no basta: streamlit lo restablece al cargar su configuración).
+    for nombre in list(logging.root.manager.loggerDict):
+        if nombre.startswith("streamlit"):
+            logging.getLogger(nombre).disabled = True
+
+    ollama = MockOllamaServer(latencia_ms=args.latencia_llm, tokens_por_segundo=args.tokens_por_segundo).start()
+    n8n = MockN8NServer(latencia_ms=args.latencia_n8n, filas=args.filas, formato=args.formato_n8n).start()
+    try:
+        with tempfile.TemporaryDirectory(prefix="fe_bench_") as directorio:
+            transporte = _TransporteRedirigido(
+                {"http://localhost:11434": ollama.url, "http://localhost:5678": n8n.url},
+                pool_size=max(10, args.usuarios * 2),
+            )
+            pipeline = PipelineHeadlessV1(
+                transporte, directorio,
+                backend=args.backend,
+                usar_matcher=not args.sin_matcher,
+                usar_motor_local=not args.sin_motor_local,
+                usar_clasificador=not args.sin_clasificador,
+                usar_cache=not args.sin_cache,
+            )
+            reporte = ejecutar(pipeline, args.usuarios, args.turnos)
+            pipeline.cerrar()
+    finally:
+        ollama.stop()
+        n8n.stop()
+
+    reporte["config"] = vars(args)
+    base = None
+    if args.base:
+        with open(args.base, "r", encoding="utf-8") as f:
+            base = json.load(f)
+    imprimir(reporte, base)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(reporte, f, ensure_ascii=False, indent=2)
+    if reporte["tasa_errores"] > args.max_errores:
+        print(f"\nCorrida inválida: {reporte['tasa_errores']:.1%} de turnos con error "
+              f"(máximo {args.max_errores:.1%}); las latencias no son representativas.")
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
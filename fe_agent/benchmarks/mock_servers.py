@@ -0,0 +1,314 @@
+# ============================================================
+#  benchmarks/mock_servers.py
+#  Servidores locales que sustituyen a Ollama y n8n en los benchmarks
+#  Autor: Eduardo Sánchez Santana
+#  Fecha: 2025-11-07
+# ============================================================
+
+import json
+import re
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+from core.text_normalizer import normalizar_texto
+
+
+class _HTTPServerSilencioso(ThreadingHTTPServer):
+    """Ignora las conexiones cortadas por el cliente (streams interrumpidos a propósito)."""
+
+    def handle_error(self, request, client_address):
+        if not isinstance(sys.exc_info()[1], (ConnectionResetError, BrokenPipeError)):
+            super().handle_error(request, client_address)
+
+
+class _ServidorBase:
+    """ThreadingHTTPServer en un hilo daemon; `url` queda disponible tras start()."""
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0):
+        self.host = host
+        self.port = port
+        self._httpd: Optional[ThreadingHTTPServer] = None
+        self._hilo: Optional[threading.Thread] = None
+        self.peticiones = 0
+
+    def _handler(self) -> type:
+        servidor = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def do_POST(self):
+                servidor.peticiones += 1
+                largo = int(self.headers.get("Content-Length") or 0)
+                try:
+                    cuerpo = json.loads(self.rfile.read(largo) or b"{}")
+                except ValueError:
+                    cuerpo = {}
+                servidor.atender(self, urlsplit(self.path).path, cuerpo)
+
+        return Handler
+
+    def atender(self, h: BaseHTTPRequestHandler, path: str, cuerpo: Dict[str, Any]) -> None:
+        raise NotImplementedError
+
+    @staticmethod
+    def responder_json(h: BaseHTTPRequestHandler, estado: int, datos: Any) -> None:
+        cuerpo = json.dumps(datos, ensure_ascii=False).encode("utf-8")
+        h.send_response(estado)
+        h.send_header("Content-Type", "application/json; charset=utf-8")
+        h.send_header("Content-Length", str(len(cuerpo)))
+        h.end_headers()
+        h.wfile.write(cuerpo)
+
+    @property
+    def url(self) -> str:
+        return f"http://{self.host}:{self.port}"
+
+    def start(self) -> "_ServidorBase":
+        self._httpd = _HTTPServerSilencioso((self.host, self.port), self._handler())
+        self._httpd.daemon_threads = True
+        self.port = self._httpd.server_address[1]
+        self._hilo = threading.Thread(target=self._httpd.serve_forever, name=type(self).__name__, daemon=True)
+        self._hilo.start()
+        return self
+
+    def stop(self) -> None:
+        if self._httpd is not None:
+            self._httpd.shutdown()
+            self._httpd.server_close()
+            self._httpd = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+# ------------------------------------------------------------
+# Ollama
+# ------------------------------------------------------------
+
+class MockOllamaServer(_ServidorBase):
+    """
+    Imita /api/generate de Ollama con latencia configurable:
+      - `latencia_ms`: tiempo hasta el primer token (carga + evaluación del prompt),
+      - `tokens_por_segundo`: velocidad de generación (~4 caracteres por token).
+    Responde con la acción del diccionario operativo más parecida a la pregunta
+    (solapamiento de palabras) o con una aclaración si el prompt es
+    el de DisambiguationManagerV2. Soporta stream=True (NDJSON token a token)
+    e informa prompt_eval_count, eval_count y duraciones en nanosegundos.
+    """
+
+    def __init__(self,
+                 host: str = "127.0.0.1",
+                 port: int = 0,
+                 latencia_ms: float = 150.0,
+                 tokens_por_segundo: float = 40.0,
+                 diccionario_path: str = "data/FE_diccionario_operativo_integrado_v4.json"):
+        super().__init__(host, port)
+        self.latencia_ms = latencia_ms
+        self.tokens_por_segundo = tokens_por_segundo
+        self._acciones = self._cargar_acciones(diccionario_path)
+
+    @staticmethod
+    def _cargar_acciones(path: str) -> List[Tuple[set, Dict[str, Any]]]:
+        """(palabras, salida) por acción del diccionario: pregunta modelo, descripción y palabras clave."""
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        acciones = []
+        for grupo in data.get("contenido", {}).values():
+            for accion, info in grupo.items():
+                salida = {"accion": accion, "parametros": {}, "visualizacion_sugerida": "barras"}
+                textos = [info.get("pregunta_modelo") or "", info.get("descripcion") or ""]
+                for texto in textos + list(info.get("palabras_clave") or []):
+                    palabras = set(normalizar_texto(texto, quitar_stopwords=True).split())
+                    if palabras:
+                        acciones.append((palabras, salida))
+        return acciones
+
+    def _interpretar(self, pregunta: str) -> Dict[str, Any]:
+        palabras = set(normalizar_texto(pregunta, quitar_stopwords=True).split())
+        mejor, puntaje = None, 0.0
+        for claves, salida in self._acciones:
+            union = len(palabras | claves) or 1
+            p = len(palabras & claves) / union
+            if p > puntaje:
+                mejor, puntaje = salida, p
+        return mejor or {"accion": "fallback", "parametros": {}, "visualizacion_sugerida": None}
+
+    def _generar(self, prompt: str) -> str:
+        m = re.search(r'Pregunta actual:\s*"""(.*?)"""', prompt, re.S)
+        if m:
+            salida = self._interpretar(m.group(1))
+            return json.dumps({
+                "status": "clarify",
+                "reason": "Respuesta simulada",
+                "clarification_question": "¿Te refieres a ventas, compras o margen?",
+                "rephrased_question": None,
+                "candidate_intents": [dict(salida, confidence=0.5)],
+            }, ensure_ascii=False)
+        m = re.search(r'PREGUNTA DEL USUARIO:\s*"(.*?)"', prompt, re.S)
+        return json.dumps(self._interpretar(m.group(1) if m else prompt), ensure_ascii=False)
+
+    @staticmethod
+    def _tokens(texto: str) -> List[str]:
+        return [texto[i:i + 4] for i in range(0, len(texto), 4)] or [""]
+
+    def atender(self, h: BaseHTTPRequestHandler, path: str, cuerpo: Dict[str, Any]) -> None:
+        if path != "/api/generate":
+            self.responder_json(h, 404, {"error": "not found"})
+            return
+        prompt = (cuerpo.get("system") or "") + (cuerpo.get("prompt") or "")
+        tokens = self._tokens(self._generar(cuerpo.get("prompt") or ""))
+        por_token = 1.0 / self.tokens_por_segundo if self.tokens_por_segundo > 0 else 0.0
+        prompt_eval_ns = int(self.latencia_ms * 1e6)
+        time.sleep(self.latencia_ms / 1000.0)
+
+        final = {
+            "model": cuerpo.get("model", "mock"),
+            "done": True,
+            "prompt_eval_count": len(prompt) // 4,
+            "prompt_eval_duration": prompt_eval_ns,
+            "eval_count": len(tokens),
+            "eval_duration": int(len(tokens) * por_token * 1e9),
+            "total_duration": prompt_eval_ns + int(len(tokens) * por_token * 1e9),
+        }
+        if not cuerpo.get("stream"):
+            time.sleep(len(tokens) * por_token)
+            self.responder_json(h, 200, dict(final, response="".join(tokens)))
+            return
+
+        h.send_response(200)
+        h.send_header("Content-Type", "application/x-ndjson")
+        h.send_header("Transfer-Encoding", "chunked")
+        h.end_headers()
+
+        def enviar(obj: Dict[str, Any]) -> None:
+            linea = json.dumps(obj, ensure_ascii=False).encode("utf-8") + b"\n"
+            h.wfile.write(f"{len(linea):X}\r\n".encode() + linea + b"\r\n")
+            h.wfile.flush()
+
+        try:
+            for t in tokens:
+                time.sleep(por_token)
+                enviar({"model": final["model"], "response": t, "done": False})
+            enviar(dict(final, response=""))
+            h.wfile.write(b"0\r\n\r\n")
+        except (BrokenPipeError, ConnectionResetError):
+            # El cliente cortó el stream al completar el JSON (igual que con Ollama).
+            h.close_connection = True
+
+
+# ------------------------------------------------------------
+# n8n
+# ------------------------------------------------------------
+
+def _js_a_json(codigo: str) -> Optional[Any]:
+    """Convierte el literal devuelto por un nodo Code simple de n8n (return [{json: {...}}]) a JSON."""
+    m = re.search(r"return\s*\[\s*\{\s*json\s*:\s*(\{.*\})\s*\}\s*\]\s*;?\s*$", codigo, re.S)
+    if not m:
+        return None
+    literal = m.group(1)
+    literal = re.sub(r"new Date\(\)\.toISOString\(\)", '"__timestamp__"', literal)
+    literal = re.sub(r"([{,]\s*)([A-Za-z_]\w*)\s*:", r'\1"\2":', literal)
+    literal = re.sub(r",(\s*[}\]])", r"\1", literal)
+    try:
+        return json.loads(literal)
+    except ValueError:
+        return None
+
+
+class MockN8NServer(_ServidorBase):
+    """
+    Imita los webhooks de n8n:
+      - reproduce los flujos exportados en `flows/` (webhook + nodo Code con un literal),
+      - sintetiza una respuesta {"ok", "accion", "tabla"} para cada webhook de
+        FE_action_router.json que no tenga flujo exportado.
+    `latencia_ms` simula el tiempo de ejecución del flujo.
+    `formato` elige cómo viajan las tablas: "json" (cuerpo completo), "ndjson"
+    (una fila por línea, chunked) o "paginas" ({"tabla", "cursor"} de a `filas_pagina`).
+    """
+
+    def __init__(self,
+                 host: str = "127.0.0.1",
+                 port: int = 0,
+                 latencia_ms: float = 80.0,
+                 filas: int = 12,
+                 formato: str = "json",
+                 filas_pagina: int = 1000,
+                 flows: Tuple[str, ...] = ("flows/FE_TopProductos.json", "flows/FE_TotalVentas.json"),
+                 router_path: str = "data/FE_action_router.json"):
+        super().__init__(host, port)
+        self.latencia_ms = latencia_ms
+        self.filas = filas
+        self.formato = formato
+        self.filas_pagina = filas_pagina
+        self.rutas: Dict[str, Callable[[Dict[str, Any]], Any]] = {}
+        self._cargar_router(router_path)
+        for path in flows:
+            self._cargar_flujo(path)
+
+    def _cargar_flujo(self, path: str) -> None:
+        with open(path, "r", encoding="utf-8") as f:
+            flujo = json.load(f)
+        ruta, respuesta = None, None
+        for nodo in flujo.get("nodes", []):
+            if nodo.get("type") == "n8n-nodes-base.webhook":
+                ruta = nodo.get("parameters", {}).get("path")
+            elif nodo.get("type") == "n8n-nodes-base.code":
+                respuesta = _js_a_json(nodo.get("parameters", {}).get("jsCode", ""))
+        if ruta and respuesta is not None:
+            plantilla = json.dumps(respuesta, ensure_ascii=False)
+            self.rutas["/webhook/" + ruta] = lambda _p, t=plantilla: json.loads(
+                t.replace("__timestamp__", time.strftime("%Y-%m-%dT%H:%M:%S"))
+            )
+
+    def _cargar_router(self, path: str) -> None:
+        with open(path, "r", encoding="utf-8") as f:
+            router = json.load(f)
+        for grupo in router.values():
+            if not isinstance(grupo, dict):
+                continue
+            for accion, url in grupo.items():
+                self.rutas[urlsplit(url).path] = lambda p, a=accion: self._sintetizar(a, p)
+
+    def _sintetizar(self, accion: str, parametros: Dict[str, Any]) -> Dict[str, Any]:
+        tabla = [{"nombre": f"Item {i + 1}", "valor": round(1000.0 / (i + 1), 2)} for i in range(self.filas)]
+        return {"ok": True, "accion": accion, "parametros": parametros, "tabla": tabla}
+
+    def atender(self, h: BaseHTTPRequestHandler, path: str, cuerpo: Dict[str, Any]) -> None:
+        generar = self.rutas.get(path)
+        if generar is None:
+            self.responder_json(h, 404, {"message": f"webhook {path} no registrado"})
+            return
+        time.sleep(self.latencia_ms / 1000.0)
+        respuesta = generar(cuerpo)
+        tabla = respuesta.get("tabla") if isinstance(respuesta, dict) else None
+        if self.formato == "ndjson" and isinstance(tabla, list):
+            self._responder_ndjson(h, tabla)
+        elif self.formato == "paginas" and isinstance(tabla, list):
+            desde = int(cuerpo.get("cursor") or 0)
+            hasta = desde + self.filas_pagina
+            self.responder_json(h, 200, dict(respuesta, tabla=tabla[desde:hasta],
+                                             cursor=str(hasta) if hasta < len(tabla) else None))
+        else:
+            self.responder_json(h, 200, respuesta)
+
+    @staticmethod
+    def _responder_ndjson(h: BaseHTTPRequestHandler, tabla: List[Dict[str, Any]]) -> None:
+        h.send_response(200)
+        h.send_header("Content-Type", "application/x-ndjson")
+        h.send_header("Transfer-Encoding", "chunked")
+        h.end_headers()
+        for i in range(0, len(tabla), 500):
+            bloque = "".join(json.dumps(fila, ensure_ascii=False) + "\n" for fila in tabla[i:i + 500]).encode("utf-8")
+            h.wfile.write(f"{len(bloque):X}\r\n".encode() + bloque + b"\r\n")
+        h.wfile.write(b"0\r\n\r\n")
@@ -0,0 +1,222 @@
+# ============================================================
+#  core/action_registry_v1.py
+#  Registro de acciones compilado, inmutable y compartido por proceso
+#  Autor: Eduardo Sánchez Santana
+#  Fecha: 2025-11-08
+# ============================================================
+
+import json
+import os
+import threading
+import time
+from types import MappingProxyType
+from typing import Any, Dict, Iterable, Mapping, Optional, Tuple
+
+DICCIONARIO_PATH = "data/FE_diccionario_operativo_integrado_v4.json"
+ROUTER_PATH = "data/FE_action_router.json"
+DEFAULT_URL = "http://localhost:5678/webhook/"
+
+
+def _congelar(valor: Any) -> Any:
+    """dict -> MappingProxyType y list -> tuple, recursivamente."""
+    if isinstance(valor, dict):
+        return MappingProxyType({k: _congelar(v) for k, v in valor.items()})
+    if isinstance(valor, list):
+        return tuple(_congelar(v) for v in valor)
+    return valor
+
+
+class _SnapshotV1:
+    """Una versión compilada del registro; nunca se modifica, se reemplaza entera."""
+
+    __slots__ = ("firma", "acciones", "cargado_en")
+
+    def __init__(self, firma: Tuple, acciones: Mapping[str, Mapping[str, Any]]):
+        self.firma = firma
+        self.acciones = acciones
+        self.cargado_en = time.time()
+
+
+class ActionRegistryV1:
+    """
+    Registro único de acciones, aplanado a partir de:
+      - el diccionario operativo (plano en "acciones" o v4, agrupado bajo
+        "contenido": acciones_operativas / acciones_gerenciales / acciones_genericas),
+      - FE_action_router.json (URL del webhook por acción; prevalece sobre la
+        del diccionario).
+    Cada entrada es un MappingProxyType con lo que antes se calculaba en cada
+    ejecución: endpoint resuelto, inputs requeridos, TTL de caché y ruta
+    ("motor" si el motor local implementa su funcion_python, "n8n" en otro caso).
+    La búsqueda es un acceso a dict. Cuando cambian los archivos en disco
+    (mtime/tamaño, revisados como mucho cada `intervalo_revision` segundos) se
+    compila un registro nuevo y se reemplaza de una sola asignación: los
+    lectores ven la versión anterior o la nueva, nunca una mezcla.
+    """
+
+    def __init__(self,
+                 diccionario_path: str = DICCIONARIO_PATH,
+                 router_path: Optional[str] = ROUTER_PATH,
+                 default_url: str = DEFAULT_URL,
+                 intervalo_revision: float = 2.0):
+        self.diccionario_path = diccionario_path
+        self.router_path = router_path
+        self.default_url = default_url
+        self.intervalo_revision = intervalo_revision
+        self._funciones_locales: frozenset = frozenset()
+        self._lock = threading.Lock()
+        self._proxima_revision = 0.0
+        self._snapshot = self._compilar(self._firma())
+
+    # ------------------------------------------------------------
+    # Compilación
+    # ------------------------------------------------------------
+
+    def _firma(self) -> Tuple:
+        partes = []
+        for path in (self.diccionario_path, self.router_path):
+            if not path:
+                continue
+            try:
+                st = os.stat(path)
+                partes.append((path, st.st_mtime_ns, st.st_size))
+            except OSError:
+                partes.append((path, None, None))
+        return tuple(partes)
+
+    @staticmethod
+    def _leer(path: Optional[str]) -> Dict[str, Any]:
+        if not path:
+            return {}
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except Exception as e:
+            print(f"[ActionRegistryV1] Error cargando {path}: {e}")
+            return {}
+
+    def _endpoint(self, url: Optional[str], accion: str) -> str:
+        endpoint = url or accion
+        if not endpoint.startswith("http"):
+            endpoint = self.default_url.rstrip("/") + f"/{endpoint.lstrip('/')}"
+        return endpoint
+
+    def _compilar(self, firma: Tuple) -> _SnapshotV1:
+        diccionario = self._leer(self.diccionario_path)
+        grupos = diccionario.get("contenido") or {"acciones": diccionario.get("acciones", {})}
+        rutas: Dict[str, str] = {}
+        for grupo in self._leer(self.router_path).values():
+            if isinstance(grupo, dict):
+                rutas.update(grupo)
+
+        acciones: Dict[str, Mapping[str, Any]] = {}
+        for nombre_grupo, grupo in grupos.items():
+            if not isinstance(grupo, dict):
+                continue
+            for accion, info in grupo.items():
+                info = info if isinstance(info, dict) else {}
+                acciones[accion] = self._entrada(accion, nombre_grupo, info, rutas.get(accion))
+        # Rutas del router sin ficha en el diccionario: ejecutables, sin metadatos
+        for accion, url in rutas.items():
+            if accion not in acciones:
+                acciones[accion] = self._entrada(accion, None, {}, url)
+        return _SnapshotV1(firma, MappingProxyType(acciones))
+
+    def _entrada(self, accion: str, grupo: Optional[str], info: Dict[str, Any],
+                 url_router: Optional[str]) -> Mapping[str, Any]:
+        funcion = info.get("funcion_python")
+        return MappingProxyType({
+            "accion": accion,
+            "grupo": grupo,
+            "endpoint": self._endpoint(url_router or info.get("webhook_url") or info.get("webhook"), accion),
+            "inputs": tuple(info.get("input_requerido") or ()),
+            "cache_ttl": int(info.get("cache_ttl_segundos") or 0),
+            "funcion_python": funcion,
+            "ruta": "motor" if funcion in self._funciones_locales else "n8n",
+            "respuesta_tipo": info.get("respuesta_tipo"),
+            "tipo_accion": info.get("tipo_accion"),
+            "info": _congelar(info),
+        })
+
+    # ------------------------------------------------------------
+    # Recarga
+    # ------------------------------------------------------------
+
+    def _vigente(self) -> _SnapshotV1:
+        """Snapshot actual; si toca revisar y los archivos cambiaron, compila y reemplaza."""
+        snapshot = self._snapshot
+        ahora = time.monotonic()
+        if ahora < self._proxima_revision:
+            return snapshot
+        with self._lock:
+            if ahora < self._proxima_revision:
+                return self._snapshot
+            self._proxima_revision = ahora + self.intervalo_revision
+            firma = self._firma()
+            if firma != self._snapshot.firma:
+                self._snapshot = self._compilar(firma)
+            return self._snapshot
+
+    def recargar(self) -> None:
+        """Fuerza la recompilación (p. ej., tras editar los archivos en el mismo segundo)."""
+        with self._lock:
+            self._snapshot = self._compilar(self._firma())
+
+    def registrar_funciones_locales(self, funciones: Iterable[str]) -> None:
+        """El motor local declara sus funcion_python; las rutas se precalculan con ellas."""
+        with self._lock:
+            nuevas = self._funciones_locales | frozenset(funciones)
+            if nuevas != self._funciones_locales:
+                self._funciones_locales = nuevas
+                self._snapshot = self._compilar(self._snapshot.firma)
+
+    # ------------------------------------------------------------
+    # API pública
+    # ------------------------------------------------------------
+
+    def get(self, accion: Optional[str]) -> Optional[Mapping[str, Any]]:
+        """Entrada inmutable de la acción, o None si no existe."""
+        return self._vigente().acciones.get(accion)
+
+    def __contains__(self, accion: object) -> bool:
+        return accion in self._vigente().acciones
+
+    def __len__(self) -> int:
+        return len(self._vigente().acciones)
+
+    def acciones(self) -> Mapping[str, Mapping[str, Any]]:
+        """Vista de solo lectura de todas las entradas (una versión consistente)."""
+        return self._vigente().acciones
+
+    def ruta(self, accion: Optional[str]) -> Optional[str]:
+        entrada = self.get(accion)
+        return entrada["ruta"] if entrada is not None else None
+
+    def stats(self) -> Dict[str, Any]:
+        snapshot = self._snapshot
+        return {
+            "acciones": len(snapshot.acciones),
+            "motor": sum(1 for e in snapshot.acciones.values() if e["ruta"] == "motor"),
+            "cargado_en": snapshot.cargado_en,
+        }
+
+
+# ------------------------------------------------------------
+# Un registro por fuentes y por proceso
+# ------------------------------------------------------------
+_REGISTROS: Dict[Tuple[str, str, str], ActionRegistryV1] = {}
+_REGISTROS_LOCK = threading.Lock()
+
+
+def get_action_registry(diccionario_path: str = DICCIONARIO_PATH,
+                        router_path: Optional[str] = ROUTER_PATH,
+                        default_url: str = DEFAULT_URL) -> ActionRegistryV1:
+    """Devuelve el registro compartido para esas fuentes (se compila una sola vez por proceso)."""
+    clave = (os.path.abspath(diccionario_path),
+             os.path.abspath(router_path) if router_path else "",
+             default_url)
+    with _REGISTROS_LOCK:
+        registro = _REGISTROS.get(clave)
+        if registro is None:
+            registro = ActionRegistryV1(diccionario_path, router_path, default_url)
+            _REGISTROS[clave] = registro
+        return registro
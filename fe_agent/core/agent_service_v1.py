@@ -0,0 +1,284 @@
+# ============================================================
+#  core/agent_service_v1.py
+#  Servicio del agente sin interfaz: un turno por petición, asíncrono
+#  Autor: Eduardo Sánchez Santana
+#  Fecha: 2025-11-08
+# ============================================================
+
+import asyncio
+import json
+import uuid
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+import pandas as pd
+
+from core.ambiguity_manager_v3 import AmbiguityManagerV3
+from core.async_pipeline_v1 import (AgentOrchestratorV1, AsyncDisambiguationManagerV2,
+                                    AsyncLLMInterpreterV3, AsyncN8NConnectorV3)
+from core.context_manager_v3 import ContextManager
+from core.data_store_v1 import ColumnarDataStoreV1
+from core.http_transport import AsyncHTTPTransport, get_async_transport
+from core.hypothesis_router_v1 import HypothesisRouterV1
+from core.intent_cache_v1 import IntentCacheV1
+from core.intent_classifier_v1 import IntentClassifierV1
+from core.intent_matcher_v1 import IntentMatcherV1
+from core.local_engine_v1 import LocalExecutionEngineV1
+from core.result_cache_v1 import ResultCacheV1
+from core.session_store_v1 import get_session_store
+from core.table_store_v1 import get_table_store
+from core.tracing_v1 import get_tracer
+
+PROMPT_FILE = "data/FE_prompt_instruccional_v4.json"
+DICCIONARIO_FILE = "data/FE_diccionario_operativo_integrado_v4.json"
+
+
+class _SesionV1:
+    """Contexto de una sesión y el lock que serializa sus turnos."""
+
+    __slots__ = ("cm", "lock")
+
+    def __init__(self, cm: ContextManager):
+        self.cm = cm
+        self.lock = asyncio.Lock()
+
+
+class AgentServiceV1:
+    """
+    El pipeline del agente como servicio, independiente de Streamlit:
+      - diccionarios, prompt, clasificador, motor local y cachés se cargan una
+        vez por proceso y se comparten entre todos los usuarios,
+      - un único AsyncHTTPTransport (pool httpx) para Ollama y n8n,
+      - cada petición es una corrutina; lo que bloquea (motor pandas, SQLite,
+        tablas Arrow) va a hilos con asyncio.to_thread, así el event loop
+        sigue atendiendo a otros usuarios mientras se espera al LLM o a n8n,
+      - el contexto de cada sesión vive en memoria (LRU de `max_sesiones`) y
+        se persiste por deltas en el SessionStoreV1 tras cada turno; los turnos
+        de una misma sesión se serializan, los de sesiones distintas no.
+    Las respuestas son dicts serializables a JSON (ver _respuesta).
+    """
+
+    def __init__(self,
+                 llm_url: str = "http://localhost:11434/api/generate",
+                 model: str = "gemma:2b",
+                 prompt_file: str = PROMPT_FILE,
+                 diccionario_path: str = DICCIONARIO_FILE,
+                 sesiones_path: str = "data/sessions.sqlite",
+                 tablas_path: str = "data/result_tables",
+                 max_sesiones: int = 1000,
+                 max_filas: int = 500,
+                 usar_motor_local: bool = True,
+                 async_transport: Optional[AsyncHTTPTransport] = None):
+        self.max_sesiones = max_sesiones
+        self.max_filas = max_filas
+        self.ahttp = async_transport or get_async_transport()
+        self.session_store = get_session_store(sesiones_path)
+        self.table_store = get_table_store(tablas_path)
+
+        self.llm = AsyncLLMInterpreterV3(
+            llm_url=llm_url,
+            model=model,
+            prompt_file=prompt_file,
+            prefix_cache=True,
+            stream=True,
+            cache=IntentCacheV1(archivos_vigilados=[prompt_file, diccionario_path]),
+            async_transport=self.ahttp,
+        )
+        self.dis = AsyncDisambiguationManagerV2(
+            llm_url=llm_url,
+            model=model,
+            classifier=IntentClassifierV1.cargar_o_entrenar(),
+            async_transport=self.ahttp,
+        )
+        self.n8n = AsyncN8NConnectorV3(
+            diccionario_path=diccionario_path,
+            result_cache=ResultCacheV1(),
+            async_transport=self.ahttp,
+            table_store=self.table_store,
+        )
+        self.amb = AmbiguityManagerV3()
+        self.fast = IntentMatcherV1()
+        self.hyp = HypothesisRouterV1(
+            local_engine=LocalExecutionEngineV1(
+                diccionario_path=diccionario_path,
+                data_store=ColumnarDataStoreV1(data_dir="data", snapshot_dir="data/snapshots"),
+            ) if usar_motor_local else None
+        )
+        self.orquestador = AgentOrchestratorV1(self.llm, self.dis, self.n8n, self.amb, self.fast)
+        self._sesiones: "OrderedDict[str, _SesionV1]" = OrderedDict()
+
+    # ------------------------------------------------------------
+    # Sesiones
+    # ------------------------------------------------------------
+
+    def _sesion(self, sesion_id: str) -> _SesionV1:
+        """Sesión en memoria (LRU); si no está, se carga desde el store."""
+        sesion = self._sesiones.get(sesion_id)
+        if sesion is not None:
+            self._sesiones.move_to_end(sesion_id)
+            return sesion
+        cm = ContextManager(store=self.session_store, session_id=sesion_id,
+                            table_store=self.table_store, state={})
+        sesion = self._sesiones[sesion_id] = _SesionV1(cm)
+        # Las sesiones expulsadas ya se guardaron al cerrar su último turno.
+        while len(self._sesiones) > self.max_sesiones:
+            _, expulsada = self._sesiones.popitem(last=False)
+            if expulsada.lock.locked():
+                self._sesiones[expulsada.cm.session_id] = expulsada
+                break
+        return sesion
+
+    # ------------------------------------------------------------
+    # Endpoints
+    # ------------------------------------------------------------
+
+    async def ask(self, pregunta: str, sesion_id: Optional[str] = None) -> Dict[str, Any]:
+        """Turno completo: interpretación (o aclaración) y ejecución."""
+        sesion_id = sesion_id or uuid.uuid4().hex
+        sesion = self._sesion(sesion_id)
+        async with sesion.lock:
+            with get_tracer().traza("turno", sesion=sesion_id, endpoint="ask") as raiz:
+                cm = sesion.cm
+                resuelto = await self.orquestador.resolve(pregunta, cm.to_llm_context())
+                if resuelto["tipo"] == "accion":
+                    respuesta = await self._ejecutar(cm, resuelto["parsed"])
+                else:
+                    respuesta = self._aclaracion(cm, resuelto["tipo"], resuelto["clarificacion"])
+                await asyncio.to_thread(cm.save)
+                raiz.set("resultado", respuesta["tipo"])
+                return dict(respuesta, sesion_id=sesion_id, trace_id=raiz.trace_id)
+
+    async def clarify(self, pregunta: str, sesion_id: Optional[str] = None) -> Dict[str, Any]:
+        """Solo la etapa de ambigüedad/aclaración, sin ejecutar nada."""
+        sesion_id = sesion_id or uuid.uuid4().hex
+        sesion = self._sesion(sesion_id)
+        async with sesion.lock:
+            with get_tracer().traza("turno", sesion=sesion_id, endpoint="clarify") as raiz:
+                cm = sesion.cm
+                amb_eval = self.amb.procesar_input(pregunta)
+                clar = await self.dis.clarify_async(pregunta, cm.to_llm_context(limit_historial=6),
+                                                    amb_eval.get("coincidencias"))
+                tipo = "fuera_de_dominio" if clar.get("status") == "out_of_scope" else "clarificacion"
+                respuesta = self._aclaracion(cm, tipo, clar)
+                respuesta["ambiguedad"] = {
+                    "requiere_clarificacion": bool(amb_eval.get("requiere_clarificacion")),
+                    "tipo": amb_eval.get("tipo"),
+                    "mensaje": amb_eval.get("mensaje"),
+                }
+                await asyncio.to_thread(cm.save)
+                raiz.set("resultado", respuesta["tipo"])
+                return dict(respuesta, sesion_id=sesion_id, trace_id=raiz.trace_id)
+
+    async def execute(self, accion: str, parametros: Optional[Dict[str, Any]] = None,
+                      visualizacion: Optional[str] = None,
+                      sesion_id: Optional[str] = None) -> Dict[str, Any]:
+        """Ejecuta una acción ya resuelta (p. ej., la elegida por el usuario tras aclarar)."""
+        sesion_id = sesion_id or uuid.uuid4().hex
+        sesion = self._sesion(sesion_id)
+        async with sesion.lock:
+            with get_tracer().traza("turno", sesion=sesion_id, endpoint="execute") as raiz:
+                parsed = {"accion": accion, "parametros": parametros or {},
+                          "visualizacion_sugerida": visualizacion}
+                respuesta = await self._ejecutar(sesion.cm, parsed)
+                await asyncio.to_thread(sesion.cm.save)
+                raiz.set("resultado", respuesta["tipo"])
+                return dict(respuesta, sesion_id=sesion_id, trace_id=raiz.trace_id)
+
+    async def tabla(self, ref: str) -> Optional[pd.DataFrame]:
+        """Tabla completa de un resultado (las respuestas solo traen las primeras `max_filas`)."""
+        return await asyncio.to_thread(self.table_store.to_pandas, ref)
+
+    async def cerrar(self) -> None:
+        """Guarda las sesiones en memoria y cierra el pool HTTP."""
+        for sesion in list(self._sesiones.values()):
+            await asyncio.to_thread(sesion.cm.save)
+        self._sesiones.clear()
+        await self.ahttp.aclose()
+
+    # ------------------------------------------------------------
+    # Ejecución y respuestas
+    # ------------------------------------------------------------
+
+    async def _ejecutar(self, cm: ContextManager, parsed: Dict[str, Any]) -> Dict[str, Any]:
+        accion, params = parsed.get("accion"), parsed.get("parametros") or {}
+        visual = parsed.get("visualizacion_sugerida")
+        ruta = self.hyp.classify(parsed)
+
+        # Operaciones de interfaz/contexto: sin n8n
+        if ruta in ("local", "confirm") and accion:
+            local = await asyncio.to_thread(self.hyp.run_local, parsed, cm)
+            df = (local.get("data") or {}).get("df")
+            if accion in ("ui_show_chart", "ui_change_chart_type"):
+                df = await asyncio.to_thread(cm.get_last_table)
+                visual = params.get("tipo") or visual
+            return self._respuesta("local", accion, bool(local.get("ok")), visual,
+                                   mensaje=local.get("mensaje") or local.get("texto"),
+                                   df=df, ref=cm.get("ultima_tabla_ref"))
+
+        result = None
+        if ruta == "engine":
+            result = await asyncio.to_thread(self.hyp.run_engine, accion, params)
+        if result is None or not result.get("ok"):
+            result = await self.orquestador.execute(accion, params)
+
+        if not result.get("ok"):
+            return self._respuesta("error", accion, False, visual,
+                                   mensaje="No se pudo ejecutar la acción solicitada.",
+                                   error=result.get("error"))
+
+        data = result.get("data")
+        if isinstance(data, dict) and data.get("tabla_ref"):
+            # Resultado recibido por lotes: ya está en el table store; solo se lee la primera página
+            ref = cm.set_last_table_ref(data["tabla_ref"])
+            df = await asyncio.to_thread(self._primeras_filas, ref)
+            respuesta = self._respuesta("resultado", accion, True, visual, df=df, ref=ref,
+                                        total_filas=data.get("total_filas"))
+        elif isinstance(data, dict) and "tabla" in data:
+            df = pd.DataFrame(data["tabla"])
+            ref = await asyncio.to_thread(cm.set_last_table, df)
+            respuesta = self._respuesta("resultado", accion, True, visual, df=df, ref=ref)
+        else:
+            respuesta = self._respuesta("resultado", accion, True, visual, texto=data)
+        cm.update_last_action(accion)
+        return respuesta
+
+    def _primeras_filas(self, ref: str) -> Optional[pd.DataFrame]:
+        tabla = self.table_store.get(ref)
+        return tabla.slice(0, self.max_filas).to_pandas() if tabla is not None else None
+
+    def _aclaracion(self, cm: ContextManager, tipo: str, clar: Dict[str, Any]) -> Dict[str, Any]:
+        q = clar.get("clarification_question")
+        if q and tipo == "clarificacion":
+            cm.update("clarificacion_pendiente", q)
+        return dict(self._respuesta(tipo, None, True, None, mensaje=q), clarificacion=clar)
+
+    def _respuesta(self, tipo: str, accion: Optional[str], ok: bool, visual: Optional[str],
+                   mensaje: Optional[str] = None, df: Optional[pd.DataFrame] = None,
+                   ref: Optional[str] = None, texto: Any = None, error: Any = None,
+                   total_filas: Optional[int] = None) -> Dict[str, Any]:
+        """
+        Sobre común de respuesta. La tabla viaja recortada a `max_filas` (registros
+        JSON); la completa se pide por su referencia al table store. `total_filas`
+        se indica cuando `df` ya es solo la primera página.
+        """
+        tabla = None
+        if df is not None:
+            parcial = df.head(self.max_filas)
+            total = int(total_filas if total_filas is not None else len(df))
+            tabla = {
+                "ref": ref,
+                "columnas": [str(c) for c in df.columns],
+                "filas": json.loads(parcial.to_json(orient="records", date_format="iso", force_ascii=False)),
+                "total_filas": total,
+                "truncada": total > len(parcial),
+            }
+        return {
+            "tipo": tipo,
+            "ok": ok,
+            "accion": accion,
+            "visualizacion": visual,
+            "mensaje": mensaje,
+            "tabla": tabla,
+            "texto": texto if texto is None or isinstance(texto, (str, list, dict)) else str(texto),
+            "error": None if error is None else str(error),
+        }
@@ -0,0 +1,225 @@
+# ============================================================
+#  core/aggregates_v1.py
+#  Agregados materializados de ventas y compras (rollups)
+#  Autor: Eduardo Sánchez Santana
+#  Fecha: 2025-11-05
+# ============================================================
+
+from typing import Dict, List, Optional
+
+import pandas as pd
+
+# Dimensiones de tiempo y desde qué granularidad pueden derivarse.
+_DIM_TIEMPO = {"fecha": 0, "mes": 1, "trimestre": 2}
+_ATRIBUTOS_CLIENTE = ["id_cliente", "ciudad", "tipo_cliente"]
+
+# hecho -> rollup -> dimensiones del grano
+ROLLUPS = {
+    "ventas": {
+        "ventas_dia": ["fecha"],
+        "ventas_mes": ["mes"],
+        "ventas_trimestre": ["trimestre"],
+        "ventas_producto": ["id_producto"],
+        "ventas_cliente": _ATRIBUTOS_CLIENTE,
+        "ventas_ciudad": ["ciudad"],
+        "ventas_dia_producto": ["fecha", "id_producto"],
+        "ventas_mes_producto": ["mes", "id_producto"],
+        "ventas_dia_cliente": ["fecha"] + _ATRIBUTOS_CLIENTE,
+        "ventas_mes_cliente": ["mes"] + _ATRIBUTOS_CLIENTE,
+    },
+    "compras": {
+        "compras_dia": ["fecha"],
+        "compras_mes": ["mes"],
+        "compras_trimestre": ["trimestre"],
+        "compras_proveedor": ["id_proveedor"],
+        "compras_producto": ["id_producto"],
+        "compras_dia_proveedor": ["fecha", "id_proveedor"],
+        "compras_mes_proveedor": ["mes", "id_proveedor"],
+        "compras_dia_producto": ["fecha", "id_producto"],
+        "compras_mes_producto": ["mes", "id_producto"],
+    },
+}
+
+# Medidas aditivas sobre las líneas (medida -> columna; None = conteo de líneas).
+MEDIDAS = {
+    "ventas": {"unidades": "cantidad", "monto": "subtotal", "n_lineas": None},
+    "compras": {"unidades": "cantidad", "monto": "costo", "n_lineas": None},
+}
+# Conteo de documentos, tomado de las cabeceras (hay ventas sin líneas de detalle).
+# Solo es aditivo en granos sin producto: una venta con varias líneas cae en varios productos.
+CONTEO_DOCUMENTOS = {"ventas": "n_ventas", "compras": "n_compras"}
+
+
+class MaterializedAggregatesV1:
+    """
+    Capa de agregados materializados sobre las líneas de venta y compra.
+    - Rollups por día, mes, trimestre, producto, cliente, ciudad y proveedor
+      (y sus cruces con día/mes), construidos una vez con groupby vectorizado.
+    - Actualización incremental: las filas nuevas se agregan por separado y se
+      suman a los rollups existentes, sin volver a recorrer el histórico.
+    - consultar() responde desde el rollup más pequeño que cubre la consulta
+      (dimensiones pedidas + granularidad del filtro de fechas).
+    """
+
+    def __init__(self, tablas: Dict[str, pd.DataFrame]):
+        self.rollups: Dict[str, pd.DataFrame] = {}
+        self._clientes = tablas["clientes"][_ATRIBUTOS_CLIENTE]
+        self._ventas_header = self._cabeceras_ventas(tablas["ventas"])
+        self._compras_header = self._cabeceras_compras(tablas["compras"])
+        self._materializar("ventas", self._hechos_ventas(tablas["detalle_ventas"]), self._ventas_header)
+        self._materializar("compras", self._hechos_compras(tablas["detalle_compras"]), self._compras_header)
+
+    # ------------------------------------------------------------
+    # Construcción
+    # ------------------------------------------------------------
+
+    @staticmethod
+    def _agregar_tiempo(df: pd.DataFrame, columna: str) -> pd.DataFrame:
+        fecha = pd.to_datetime(df[columna]).dt.normalize()
+        return df.assign(
+            fecha=fecha,
+            mes=fecha.dt.to_period("M").dt.start_time,
+            trimestre=fecha.dt.to_period("Q").dt.start_time,
+        )
+
+    def _cabeceras_ventas(self, ventas: pd.DataFrame) -> pd.DataFrame:
+        cab = ventas[["id_venta", "fecha_venta", "id_cliente"]].merge(self._clientes, on="id_cliente", how="left")
+        for c in ("id_cliente", "ciudad", "tipo_cliente"):
+            cab[c] = cab[c].astype("string")
+        return self._agregar_tiempo(cab, "fecha_venta")
+
+    def _cabeceras_compras(self, compras: pd.DataFrame) -> pd.DataFrame:
+        cab = compras[["id_compra", "fecha_compra", "id_proveedor"]].copy()
+        cab["id_proveedor"] = cab["id_proveedor"].astype("string")
+        return self._agregar_tiempo(cab, "fecha_compra")
+
+    def _hechos_ventas(self, detalle: pd.DataFrame) -> pd.DataFrame:
+        cab = self._ventas_header.drop(columns=["fecha_venta"])
+        lineas = detalle.merge(cab, on="id_venta", how="inner")
+        lineas["id_producto"] = lineas["id_producto"].astype("string")
+        return lineas
+
+    def _hechos_compras(self, detalle: pd.DataFrame) -> pd.DataFrame:
+        cab = self._compras_header.drop(columns=["fecha_compra"])
+        lineas = detalle.merge(cab, on="id_compra", how="inner")
+        lineas["id_producto"] = lineas["id_producto"].astype("string")
+        return lineas.assign(costo=lineas["cantidad"] * lineas["precio_compra_unitario"])
+
+    @staticmethod
+    def _medidas_de(hecho: str, dims: List[str]) -> List[str]:
+        medidas = list(MEDIDAS[hecho])
+        if "id_producto" not in dims:
+            medidas.append(CONTEO_DOCUMENTOS[hecho])
+        return medidas
+
+    def _agrupar(self, hecho: str, lineas: pd.DataFrame, cabeceras: pd.DataFrame, dims: List[str]) -> pd.DataFrame:
+        aggs = {}
+        for medida, columna in MEDIDAS[hecho].items():
+            if columna is None:
+                aggs[medida] = pd.NamedAgg(column=lineas.columns[0], aggfunc="size")
+            else:
+                aggs[medida] = pd.NamedAgg(column=columna, aggfunc="sum")
+        agg = lineas.groupby(dims, dropna=False, observed=True).agg(**aggs)
+        if "id_producto" not in dims:
+            docs = cabeceras.groupby(dims, dropna=False, observed=True).size().rename(CONTEO_DOCUMENTOS[hecho])
+            agg = agg.join(docs, how="outer")
+        agg = agg.fillna(0)
+        enteras = [c for c in agg.columns if c != "monto"]
+        agg[enteras] = agg[enteras].astype("int64")
+        return agg.reset_index()
+
+    def _materializar(self, hecho: str, lineas: pd.DataFrame, cabeceras: pd.DataFrame) -> None:
+        for nombre, dims in ROLLUPS[hecho].items():
+            self.rollups[nombre] = self._agrupar(hecho, lineas, cabeceras, dims)
+
+    def _fusionar(self, hecho: str, lineas: pd.DataFrame, cabeceras: pd.DataFrame) -> None:
+        """Suma el agregado parcial de las filas nuevas a cada rollup existente."""
+        for nombre, dims in ROLLUPS[hecho].items():
+            parcial = self._agrupar(hecho, lineas, cabeceras, dims)
+            medidas = [c for c in parcial.columns if c not in dims]
+            combinado = pd.concat([self.rollups[nombre], parcial], ignore_index=True)
+            self.rollups[nombre] = (combinado.groupby(dims, dropna=False, observed=True)[medidas]
+                                             .sum().reset_index())
+
+    # ------------------------------------------------------------
+    # Actualización incremental (solo filas agregadas al final)
+    # ------------------------------------------------------------
+
+    def append_ventas(self, ventas_nuevas: pd.DataFrame, detalle_nuevo: pd.DataFrame) -> None:
+        """Incorpora ventas nuevas (cabeceras y líneas) sin recalcular el histórico."""
+        cabeceras = self._cabeceras_ventas(ventas_nuevas)
+        self._ventas_header = pd.concat([self._ventas_header, cabeceras], ignore_index=True)
+        self._fusionar("ventas", self._hechos_ventas(detalle_nuevo), cabeceras)
+
+    def append_compras(self, compras_nuevas: pd.DataFrame, detalle_nuevo: pd.DataFrame) -> None:
+        """Incorpora compras nuevas (cabeceras y líneas) sin recalcular el histórico."""
+        cabeceras = self._cabeceras_compras(compras_nuevas)
+        self._compras_header = pd.concat([self._compras_header, cabeceras], ignore_index=True)
+        self._fusionar("compras", self._hechos_compras(detalle_nuevo), cabeceras)
+
+    # ------------------------------------------------------------
+    # Consulta
+    # ------------------------------------------------------------
+
+    @staticmethod
+    def _granularidad_filtro(desde: Optional[pd.Timestamp], hasta: Optional[pd.Timestamp]) -> int:
+        """Granularidad de tiempo más gruesa que respeta los límites del filtro."""
+        nivel = 2
+        if desde is not None:
+            if desde != desde.to_period("Q").start_time:
+                nivel = min(nivel, 1)
+            if desde != desde.to_period("M").start_time:
+                nivel = 0
+        if hasta is not None:
+            if hasta.normalize() != hasta.to_period("Q").end_time.normalize():
+                nivel = min(nivel, 1)
+            if hasta.normalize() != hasta.to_period("M").end_time.normalize():
+                nivel = 0
+        return nivel
+
+    def elegir_rollup(self, hecho: str, dimensiones: List[str], medidas: List[str],
+                      desde: Optional[pd.Timestamp] = None, hasta: Optional[pd.Timestamp] = None) -> str:
+        """Nombre del rollup con menos filas capaz de responder la consulta."""
+        filtra = desde is not None or hasta is not None
+        nivel_filtro = self._granularidad_filtro(desde, hasta) if filtra else None
+        candidatos = []
+        for nombre, dims in ROLLUPS[hecho].items():
+            tiempo = [d for d in dims if d in _DIM_TIEMPO]
+            nivel = _DIM_TIEMPO[tiempo[0]] if tiempo else None
+            # Dimensiones no temporales: deben estar en el grano
+            if any(d not in dims for d in dimensiones if d not in _DIM_TIEMPO):
+                continue
+            # Dimensiones temporales: derivables desde un grano igual o más fino
+            pedidas = [_DIM_TIEMPO[d] for d in dimensiones if d in _DIM_TIEMPO]
+            if pedidas and (nivel is None or nivel > min(pedidas)):
+                continue
+            if filtra and (nivel is None or nivel > nivel_filtro):
+                continue
+            if any(m not in self._medidas_de(hecho, dims) for m in medidas):
+                continue
+            candidatos.append((len(self.rollups[nombre]), nombre))
+        if not candidatos:
+            raise ValueError(f"Ningún rollup de '{hecho}' cubre {dimensiones} / {medidas}")
+        return min(candidatos)[1]
+
+    def consultar(self, hecho: str, dimensiones: List[str], medidas: List[str],
+                  desde: Optional[pd.Timestamp] = None, hasta: Optional[pd.Timestamp] = None) -> pd.DataFrame:
+        """
+        Agrega `medidas` por `dimensiones` en [desde, hasta] usando el rollup más pequeño.
+        Las dimensiones de tiempo posibles son "fecha", "mes" y "trimestre".
+        """
+        nombre = self.elegir_rollup(hecho, dimensiones, medidas, desde, hasta)
+        df = self.rollups[nombre]
+        tiempo = next((d for d in ROLLUPS[hecho][nombre] if d in _DIM_TIEMPO), None)
+        if tiempo is not None:
+            if desde is not None:
+                df = df[df[tiempo] >= desde]
+            if hasta is not None:
+                df = df[df[tiempo] <= hasta]
+            if "mes" in dimensiones and tiempo == "fecha":
+                df = df.assign(mes=df["fecha"].dt.to_period("M").dt.start_time)
+            if "trimestre" in dimensiones and tiempo != "trimestre":
+                df = df.assign(trimestre=df[tiempo].dt.to_period("Q").dt.start_time)
+        if not dimensiones:
+            return df[medidas].sum().to_frame().T
+        return df.groupby(dimensiones, dropna=False, observed=True)[medidas].sum().reset_index()
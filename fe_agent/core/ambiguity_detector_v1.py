@@ -0,0 +1,198 @@
+# ============================================================
+#  core/ambiguity_detector_v1.py
+#  Detector compilado de conceptos y términos vagos (una pasada)
+#  Autor: Eduardo Sánchez Santana
+#  Fecha: 2025-11-06
+# ============================================================
+
+import re
+from typing import Any, Dict, Iterable, List, Optional, Set
+
+from core.assets_v1 import cargar_json
+from core.text_normalizer import quitar_acentos
+
+# Conceptos del diccionario que no bastan por sí solos para considerar la
+# pregunta dentro del dominio comercial ("este mes" no habla de la ferretería).
+CONCEPTOS_NO_DOMINIO = {"periodo"}
+
+
+class AmbiguityDetectorV1:
+    """
+    Reconoce en una sola pasada, con una única regex compilada:
+      - conceptos de dominio (nombre + sinónimos de FE_diccionario_conceptos_v3.json
+        y términos de dominio adicionales), con plegado de acentos y plurales simples,
+      - términos vagos ("esto", "datos", "resultado", ...),
+      - signos "?" y conjunciones "o"/"y" para la heurística de ambigüedad.
+    Un término vago nunca cuenta como evidencia de dominio, aunque también sea
+    sinónimo de un concepto (p. ej. "resultado" -> margen).
+    """
+
+    def __init__(self,
+                 conceptos_path: Optional[str] = "data/FE_diccionario_conceptos_v3.json",
+                 terminos_vagos: Iterable[str] = (),
+                 terminos_dominio: Iterable[str] = ()):
+        self._roles: Dict[str, Dict[str, Any]] = {}
+        for termino in terminos_dominio:
+            self._registrar(termino, concepto=self._normalizar(termino))
+        for concepto, sinonimos in self._cargar_conceptos(conceptos_path).items():
+            self._registrar(concepto, concepto=concepto)
+            for s in sinonimos:
+                self._registrar(s, concepto=concepto)
+        for termino in terminos_vagos:
+            self._registrar(termino, vago=True)
+        self._regex = self._compilar()
+
+    # ------------------------------------------------------------
+    # Construcción
+    # ------------------------------------------------------------
+
+    @staticmethod
+    def _normalizar(texto: str) -> str:
+        return " ".join(quitar_acentos(texto.lower()).split())
+
+    @staticmethod
+    def _cargar_conceptos(path: Optional[str]) -> Dict[str, List[str]]:
+        if not path:
+            return {}
+        try:
+            data = cargar_json(path)
+        except Exception as e:
+            print(f"[AmbiguityDetectorV1] Error cargando {path}: {e}")
+            return {}
+        conceptos = {}
+        for c in data.get("conceptos", []):
+            nombre = AmbiguityDetectorV1._normalizar(c.get("concepto", ""))
+            if nombre:
+                conceptos[nombre] = c.get("sinonimos", [])
+        return conceptos
+
+    @staticmethod
+    def _variantes(forma: str) -> Set[str]:
+        """Singular/plural simples de la última palabra ("ventas" <-> "venta", "proveedores" <-> "proveedor")."""
+        palabras = forma.split(" ")
+        ultima = palabras[-1]
+        if len(ultima) < 5:
+            return {forma}
+        if ultima.endswith("es"):
+            finales = {ultima, ultima[:-1], ultima[:-2]}
+        elif ultima.endswith("s"):
+            finales = {ultima, ultima[:-1]}
+        else:
+            finales = {ultima, ultima + "s", ultima + "es"}
+        return {" ".join(palabras[:-1] + [f]) for f in finales}
+
+    def _registrar(self, termino: str, concepto: Optional[str] = None, vago: bool = False) -> None:
+        forma = self._normalizar(termino)
+        if not forma:
+            return
+        variantes = {forma} if vago else self._variantes(forma)
+        for v in variantes:
+            rol = self._roles.setdefault(v, {"conceptos": set(), "vago": False, "forma": forma})
+            if concepto:
+                rol["conceptos"].add(concepto)
+            rol["vago"] = rol["vago"] or vago
+
+    @staticmethod
+    def _trie_a_regex(nodo: Dict[str, Any]) -> str:
+        """
+        Convierte un trie de términos en una regex con prefijos compartidos:
+        el motor descarta cada posición con un solo carácter en vez de probar
+        cientos de alternativas. Las ramas más largas se prueban primero.
+        """
+        fin = "" in nodo
+        ramas = []
+        for car in sorted(k for k in nodo if k):
+            sub = AmbiguityDetectorV1._trie_a_regex(nodo[car])
+            ramas.append((r"\s+" if car == " " else re.escape(car)) + sub)
+        if not ramas:
+            return ""
+        cuerpo = ramas[0] if len(ramas) == 1 else "(?:" + "|".join(ramas) + ")"
+        if fin:
+            return "(?:" + cuerpo + ")?"
+        return cuerpo
+
+    def _compilar(self) -> re.Pattern:
+        trie: Dict[str, Any] = {}
+        for termino in self._roles:
+            nodo = trie
+            for car in termino:
+                nodo = nodo.setdefault(car, {})
+            nodo[""] = True
+        terminos = self._trie_a_regex(trie) or r"(?!)"
+        return re.compile(
+            r"(?P<termino>\b(?:" + terminos + r")\b)"
+            r"|(?P<conjuncion>\b[oy]\b)"
+            r"|(?P<interrogacion>\?)"
+        )
+
+    # ------------------------------------------------------------
+    # API pública
+    # ------------------------------------------------------------
+
+    def detectar(self, texto: str) -> Dict[str, Any]:
+        """
+        Recorre el texto una vez. Devuelve:
+          terminos: [{texto, forma, conceptos, vago, inicio, fin}] (offsets sobre el texto en minúsculas),
+          conceptos: conceptos únicos en orden de aparición,
+          vagos: términos vagos encontrados,
+          en_dominio, n_palabras, n_interrogaciones, tiene_o, tiene_y.
+        """
+        texto = (texto or "").lower()
+        plegado = quitar_acentos(texto)
+        terminos, conceptos, vagos = [], [], []
+        n_interrogaciones = 0
+        tiene_o = tiene_y = en_dominio = False
+        for m in self._regex.finditer(plegado):
+            tipo = m.lastgroup
+            encontrado = m.group(0)
+            if tipo == "interrogacion":
+                n_interrogaciones += 1
+                continue
+            if tipo == "conjuncion":
+                tiene_o = tiene_o or encontrado == "o"
+                tiene_y = tiene_y or encontrado == "y"
+                continue
+            rol = self._roles[" ".join(encontrado.split())]
+            terminos.append({
+                "texto": texto[m.start():m.end()],
+                "forma": rol["forma"],
+                "conceptos": sorted(rol["conceptos"]),
+                "vago": rol["vago"],
+                "inicio": m.start(),
+                "fin": m.end(),
+            })
+            if rol["vago"]:
+                vagos.append(rol["forma"])
+                continue
+            for c in sorted(rol["conceptos"]):
+                if c not in conceptos:
+                    conceptos.append(c)
+                en_dominio = en_dominio or c not in CONCEPTOS_NO_DOMINIO
+        return {
+            "terminos": terminos,
+            "conceptos": conceptos,
+            "vagos": vagos,
+            "en_dominio": en_dominio,
+            "n_palabras": len(texto.split()),
+            "n_interrogaciones": n_interrogaciones,
+            "tiene_o": tiene_o,
+            "tiene_y": tiene_y,
+        }
+
+
+def marcas_ambiguedad(coincidencias: Dict[str, Any]) -> List[str]:
+    """
+    Señales de pregunta vaga o múltiple en la salida de detectar():
+    "vaga" (términos vagos), "corta" (3 palabras o menos), "multiple" (más de
+    un "?") y "compuesta" ("o" junto a "y"). Lista vacía: nada que aclarar.
+    """
+    marcas = []
+    if coincidencias.get("vagos"):
+        marcas.append("vaga")
+    if coincidencias.get("n_palabras", 0) <= 3:
+        marcas.append("corta")
+    if coincidencias.get("n_interrogaciones", 0) > 1:
+        marcas.append("multiple")
+    if coincidencias.get("tiene_o") and coincidencias.get("tiene_y"):
+        marcas.append("compuesta")
+    return marcas
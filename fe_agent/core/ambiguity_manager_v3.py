@@ -5,8 +5,10 @@
 #  Fecha: 2025-10-31
 # ============================================================
 
-import re
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Optional
+
+from core.ambiguity_detector_v1 import AmbiguityDetectorV1, marcas_ambiguedad
+from core.tracing_v1 import get_tracer
 
 FERRETERIA_DOMINIOS = [
     "ventas", "compras", "productos", "clientes", "proveedores",
@@ -18,56 +20,69 @@ class AmbiguityManagerV3:
     """
     Detección de ambigüedades con:
       - detección fuerte por heurística
-      - filtro de fuera de dominio
+      - filtro de fuera de dominio (conceptos y sinónimos del diccionario conceptual)
       - integración con DisambiguationManagerV2
+    Todo se resuelve con una sola pasada del AmbiguityDetectorV1; las coincidencias
+    se devuelven en "coincidencias" para que las etapas siguientes no re-escaneen.
     """
 
-    def __init__(self):
-        self.patterns_vagos = [
-            r"\besto\b", r"\baquello\b", r"\ballo\b", r"\bcosas\b",
-            r"\bdatos\b", r"\binformación\b", r"\bresultado\b"
-        ]
-        self.pat_question = re.compile(r"\?$")
+    TERMINOS_VAGOS = ["esto", "aquello", "allo", "cosas", "datos", "información", "resultado"]
+
+    def __init__(self, conceptos_path: Optional[str] = "data/FE_diccionario_conceptos_v3.json"):
+        self.detector = AmbiguityDetectorV1(
+            conceptos_path=conceptos_path,
+            terminos_vagos=self.TERMINOS_VAGOS,
+            terminos_dominio=FERRETERIA_DOMINIOS,
+        )
 
     # ------------------------------------------------------------
     # MÉTODO PRINCIPAL
     # ------------------------------------------------------------
     def procesar_input(self, texto: str) -> Dict[str, Any]:
+        with get_tracer().span("ambiguedad.procesar_input") as span:
+            resultado = self._procesar(texto)
+            span.set("tipo", resultado.get("tipo"))
+            return resultado
+
+    def _procesar(self, texto: str) -> Dict[str, Any]:
         texto = (texto or "").strip().lower()
 
         if not texto or len(texto) < 5:
             return self._respuesta("clarify", "La pregunta parece incompleta o muy corta.")
 
-        if self._fuera_de_dominio(texto):
-            return self._respuesta("out_of_scope", "La pregunta parece estar fuera del dominio comercial de la ferretería.")
+        coincidencias = self.detector.detectar(texto)
 
-        if any(re.search(p, texto) for p in self.patterns_vagos):
-            return self._respuesta("clarify", "La pregunta es demasiado general, necesito más detalle.")
+        if not coincidencias["en_dominio"]:
+            return self._respuesta("out_of_scope", "La pregunta parece estar fuera del dominio comercial de la ferretería.",
+                                   coincidencias)
 
-        if self.detectar_ambigüedad_fuerte(texto):
-            return self._respuesta("clarify", "Parece una pregunta ambigua o múltiple.")
+        if coincidencias["vagos"]:
+            return self._respuesta("clarify", "La pregunta es demasiado general, necesito más detalle.", coincidencias)
 
-        return {"requiere_clarificacion": False, "motivo": None}
+        if self._ambigüedad_fuerte(coincidencias):
+            return self._respuesta("clarify", "Parece una pregunta ambigua o múltiple.", coincidencias)
+
+        return {"requiere_clarificacion": False, "motivo": None, "coincidencias": coincidencias}
 
     # ------------------------------------------------------------
     # FUNCIONES AUXILIARES
     # ------------------------------------------------------------
     def detectar_ambigüedad_fuerte(self, texto: str) -> bool:
-        # Corto, doble pregunta, o términos opuestos
-        if len(texto.split()) <= 3:
-            return True
-        if texto.count("?") > 1:
-            return True
-        if " o " in texto and "y" in texto:
-            return True
-        return False
+        return self._ambigüedad_fuerte(self.detector.detectar(texto))
+
+    def _ambigüedad_fuerte(self, coincidencias: Dict[str, Any]) -> bool:
+        # Corto, doble pregunta, o términos opuestos ("o" junto a "y")
+        return bool(set(marcas_ambiguedad(coincidencias)) & {"corta", "multiple", "compuesta"})
 
     def _fuera_de_dominio(self, texto: str) -> bool:
-        return not any(d in texto for d in FERRETERIA_DOMINIOS)
+        return not self.detector.detectar(texto)["en_dominio"]
 
-    def _respuesta(self, tipo: str, mensaje: str) -> Dict[str, Any]:
-        return {
+    def _respuesta(self, tipo: str, mensaje: str, coincidencias: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        respuesta = {
             "requiere_clarificacion": True,
             "tipo": tipo,
             "mensaje": mensaje
         }
+        if coincidencias is not None:
+            respuesta["coincidencias"] = coincidencias
+        return respuesta
@@ -0,0 +1,39 @@
+# ============================================================
+#  core/assets_v1.py
+#  Archivos JSON de configuración compartidos por proceso
+#  Autor: Eduardo Sánchez Santana
+#  Fecha: 2025-11-08
+# ============================================================
+
+import json
+import os
+import threading
+from typing import Any, Dict, Tuple
+
+# ruta absoluta -> ((mtime_ns, tamaño), datos)
+_JSON: Dict[str, Tuple[Tuple[int, int], Any]] = {}
+_JSON_LOCK = threading.Lock()
+
+
+def cargar_json(path: str) -> Any:
+    """
+    Devuelve el JSON de `path` parseado una sola vez por proceso: prompt,
+    diccionarios y preguntas se comparten entre sesiones y componentes.
+    Si el archivo cambia en disco (mtime o tamaño) se vuelve a leer.
+    El resultado es compartido: tratarlo como solo lectura.
+    Propaga los errores de lectura/parseo (cada llamador decide su fallback).
+    """
+    clave = os.path.abspath(path)
+    st = os.stat(clave)
+    firma = (st.st_mtime_ns, st.st_size)
+    cacheado = _JSON.get(clave)
+    if cacheado is not None and cacheado[0] == firma:
+        return cacheado[1]
+    with _JSON_LOCK:
+        cacheado = _JSON.get(clave)
+        if cacheado is not None and cacheado[0] == firma:
+            return cacheado[1]
+        with open(clave, "r", encoding="utf-8") as f:
+            datos = json.load(f)
+        _JSON[clave] = (firma, datos)
+        return datos
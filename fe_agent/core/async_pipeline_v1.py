@@ -0,0 +1,308 @@
+# ============================================================
+#  core/async_pipeline_v1.py
+#  Pipeline asíncrono: aclaración e interpretación concurrentes
+#  Autor: Eduardo Sánchez Santana
+#  Fecha: 2025-11-04
+# ============================================================
+
+import asyncio
+import json
+from typing import Any, Dict, List, Optional, Tuple
+
+from core.ambiguity_manager_v3 import AmbiguityManagerV3
+from core.disambiguation_manager_v2 import DisambiguationManagerV2
+from core.http_transport import AsyncHTTPTransport, get_async_transport
+from core.llm_interpreter_v3 import LLMInterpreterV3, _JSONStreamScanner
+from core.n8n_connector_v3 import N8NConnectorV3, _cursor_siguiente, _es_ndjson
+from core.tracing_v1 import atributos_ollama, atributos_stream_cortado, get_tracer
+
+
+class AsyncLLMInterpreterV3(LLMInterpreterV3):
+    """
+    Variante asíncrona de LLMInterpreterV3.
+    Reutiliza la construcción de prompt, la caché y el parseo de la versión síncrona;
+    solo cambia la llamada HTTP (httpx.AsyncClient vía AsyncHTTPTransport).
+    """
+
+    def __init__(self, *args, async_transport: Optional[AsyncHTTPTransport] = None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.ahttp = async_transport or get_async_transport()
+
+    async def _query_llm_async(self, prompt: str, system: Optional[str] = None) -> str:
+        payload = self._build_payload(prompt, system, stream=False)
+        with get_tracer().span("llm.generate", **{"llm.model": self.model, "llm.stream": False}) as span:
+            try:
+                response = await self.ahttp.post(self.llm_url, json=payload, timeout=600)
+                response.raise_for_status()
+                result = response.json()
+                span.update(**atributos_ollama(result))
+                return result.get("response", "").strip()
+            except Exception as e:
+                raise RuntimeError(f"Error al comunicarse con el modelo LLM: {e}")
+
+    async def _query_llm_stream_async(self, prompt: str, system: Optional[str] = None) -> str:
+        payload = self._build_payload(prompt, system, stream=True)
+        scanner = _JSONStreamScanner()
+        with get_tracer().span("llm.generate", **{"llm.model": self.model, "llm.stream": True}) as span:
+            try:
+                response = await self.ahttp.post_stream(self.llm_url, json=payload, timeout=600)
+                try:
+                    response.raise_for_status()
+                    n = 0
+                    primer_token_ms = None
+                    async for line in response.aiter_lines():
+                        if not line:
+                            continue
+                        chunk = json.loads(line)
+                        n += 1
+                        if n == 1:
+                            primer_token_ms = round(span.duracion_parcial_ms(), 3)
+                            span.set("llm.primer_token_ms", primer_token_ms)
+                        span.set("llm.chunks", n)
+                        encontrado = scanner.feed(chunk.get("response", ""))
+                        if encontrado is not None:
+                            span.set("llm.cortado", True)
+                            span.update(**atributos_stream_cortado(n, primer_token_ms, span.duracion_parcial_ms()))
+                            return encontrado
+                        if chunk.get("done"):
+                            span.update(**atributos_ollama(chunk))
+                            break
+                finally:
+                    # Cerrar la respuesta corta la conexión y Ollama aborta la generación.
+                    await response.aclose()
+                return scanner.text.strip()
+            except Exception as e:
+                raise RuntimeError(f"Error al comunicarse con el modelo LLM: {e}")
+
+    async def interpret_async(self, user_input: str, context: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """Versión asíncrona de interpret (cancelable)."""
+        with get_tracer().span("llm.interpret") as span:
+            cacheado = self._from_cache(user_input, context)
+            span.set("cache_hit", cacheado is not None)
+            if cacheado is not None:
+                span.set("accion", cacheado.get("accion"))
+                return cacheado
+
+            prompt, system = self._build_request(user_input, context)
+            query = self._query_llm_stream_async if self.stream else self._query_llm_async
+            llm_output = await query(prompt, system=system)
+            parsed = self._parse_output(user_input, context, llm_output)
+            span.set("accion", parsed.get("accion"))
+            return parsed
+
+
+class AsyncDisambiguationManagerV2(DisambiguationManagerV2):
+    """Variante asíncrona de DisambiguationManagerV2 (mismo prompt y normalización)."""
+
+    def __init__(self, *args, async_transport: Optional[AsyncHTTPTransport] = None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.ahttp = async_transport or get_async_transport()
+
+    async def clarify_async(self, user_input: str, context: Dict[str, Any],
+                            coincidencias: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        with get_tracer().span("desambiguacion.clarify") as span:
+            local = self.clarify_local(user_input, coincidencias)
+            if local is not None:
+                span.update(origen=local["origen"], status=local["status"])
+                return local
+            payload = self._build_payload(user_input, context)
+            try:
+                with get_tracer().span("llm.generate", **{"llm.model": self.model, "llm.stream": False}) as gen:
+                    res = await self.ahttp.post(self.llm_url, json=payload, timeout=60)
+                    res.raise_for_status()
+                    cuerpo = res.json()
+                    gen.update(**atributos_ollama(cuerpo))
+                resultado = self._normalize(self._safe_json(cuerpo.get("response", "")))
+            except Exception as e:
+                resultado = self._error_response(e)
+            span.update(origen=resultado.get("origen", "llm"), status=resultado.get("status"))
+            return resultado
+
+
+class AsyncN8NConnectorV3(N8NConnectorV3):
+    """
+    Variante asíncrona de N8NConnectorV3.
+    Comparte resolución de acciones, caché, fallback y logs con la versión síncrona.
+    """
+
+    def __init__(self, *args, async_transport: Optional[AsyncHTTPTransport] = None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.ahttp = async_transport or get_async_transport()
+
+    async def _recibir_ndjson_async(self, response, on_progreso, span) -> Dict[str, Any]:
+        # Parseo y escritura a disco en un hilo: el event loop sigue atendiendo a otros usuarios
+        receptor = self._receptor(on_progreso)
+        try:
+            async for chunk in response.aiter_bytes(chunk_size=256 * 1024):
+                await asyncio.to_thread(receptor.feed, chunk)
+            data = await asyncio.to_thread(receptor.cerrar)
+        except BaseException:
+            receptor.abortar()
+            raise
+        self._resumen_stream(span, "ndjson", receptor)
+        return data
+
+    async def _recibir_paginas_async(self, endpoint: str, parametros: Dict[str, Any],
+                                     primera: Dict[str, Any], on_progreso, span) -> Dict[str, Any]:
+        receptor = self._receptor(on_progreso)
+        pagina, vistos = primera, set()
+        try:
+            while True:
+                await asyncio.to_thread(receptor.agregar_registros, pagina["tabla"])
+                cursor = _cursor_siguiente(pagina)
+                if cursor is None or cursor in vistos or len(vistos) >= self.max_paginas:
+                    break
+                vistos.add(cursor)
+                response = await self.ahttp.post(endpoint, json=dict(parametros or {}, cursor=cursor),
+                                                 timeout=self.default_timeout)
+                response.raise_for_status()
+                pagina = response.json()
+            cierre = await asyncio.to_thread(receptor.cerrar)
+        except BaseException:
+            receptor.abortar()
+            raise
+        data = self._metadatos_pagina(primera)
+        data.update(cierre)
+        self._resumen_stream(span, "paginas", receptor)
+        return data
+
+    async def execute_async(self, accion: str, parametros: Dict[str, Any],
+                            on_progreso=None) -> Dict[str, Any]:
+        with get_tracer().span("n8n.execute", accion=accion) as span:
+            resultado, endpoint, ttl = self._prepare(accion, parametros)
+            if endpoint is None:
+                span.update(cache_hit=bool(resultado.get("ok")), ok=bool(resultado.get("ok")))
+                return resultado
+
+            try:
+                response = await self.ahttp.post_stream(endpoint, json=parametros, timeout=self.default_timeout)
+                try:
+                    response.raise_for_status()
+                    content_type = response.headers.get("Content-Type", "")
+                    if _es_ndjson(content_type):
+                        data = await self._recibir_ndjson_async(response, on_progreso, span)
+                    else:
+                        await response.aread()
+                        data = response.json() if "json" in content_type else {"texto": response.text}
+                finally:
+                    await response.aclose()
+                if _cursor_siguiente(data) is not None:
+                    data = await self._recibir_paginas_async(endpoint, parametros, data, on_progreso, span)
+                resultado = self._on_success(resultado, parametros, data, ttl)
+            except Exception as e:
+                resultado = self._on_error(resultado, parametros, e)
+            span.update(cache_hit=False, ok=bool(resultado.get("ok")))
+            return resultado
+
+    async def execute_many_async(self, llamadas: List[Tuple[str, Dict[str, Any]]]) -> List[Dict[str, Any]]:
+        """Ejecuta llamadas independientes en paralelo; el tiempo total es el de la más lenta."""
+        return await asyncio.gather(*(self.execute_async(a, p) for a, p in llamadas))
+
+
+class AgentOrchestratorV1:
+    """
+    Orquesta un turno completo del agente sobre los componentes asíncronos:
+      0. atajo determinista (IntentMatcherV1), si está disponible,
+      1. detección de ambigüedad,
+      2. aclaración (LLM) y, en casos limítrofes, interpretación especulativa en paralelo,
+      3. ejecución en n8n (sub-acciones de combinar_resultados en paralelo).
+    Devuelve un dict con "tipo": "clarificacion" | "fuera_de_dominio" | "resultado".
+    """
+
+    def __init__(self,
+                 llm: AsyncLLMInterpreterV3,
+                 dis: AsyncDisambiguationManagerV2,
+                 n8n: AsyncN8NConnectorV3,
+                 amb: Optional[AmbiguityManagerV3] = None,
+                 fast=None):
+        self.llm = llm
+        self.dis = dis
+        self.n8n = n8n
+        self.amb = amb or AmbiguityManagerV3()
+        self.fast = fast
+
+    # ------------------------------------------------------------
+    # Interpretación con aclaración especulativa
+    # ------------------------------------------------------------
+    async def resolve(self, user_input: str, context: Dict[str, Any]) -> Dict[str, Any]:
+        """Devuelve {"tipo": "accion", "parsed": ...} o la respuesta de aclaración."""
+        parsed = self.fast.match(user_input) if self.fast is not None else None
+        if parsed is not None:
+            return {"tipo": "accion", "parsed": parsed}
+
+        amb_eval = self.amb.procesar_input(user_input)
+        tipo = amb_eval.get("tipo")
+        if not amb_eval.get("requiere_clarificacion") or tipo not in ("clarify", "out_of_scope"):
+            return {"tipo": "accion", "parsed": await self.llm.interpret_async(user_input, context)}
+
+        clar_task = asyncio.create_task(
+            self.dis.clarify_async(user_input, context, amb_eval.get("coincidencias"))
+        )
+        # Caso limítrofe ("clarify"): se interpreta en paralelo por si la aclaración
+        # concluye que la pregunta está en alcance. Fuera de dominio no se especula.
+        interp_task = None
+        if tipo == "clarify":
+            interp_task = asyncio.create_task(self.llm.interpret_async(user_input, context))
+
+        try:
+            clar = await clar_task
+        except BaseException:
+            if interp_task is not None:
+                interp_task.cancel()
+            raise
+
+        if clar.get("status") == "in_scope" and not clar.get("clarification_question"):
+            if interp_task is None:
+                interp_task = asyncio.create_task(self.llm.interpret_async(user_input, context))
+            return {"tipo": "accion", "parsed": await interp_task}
+
+        # La aclaración gana: se descarta la interpretación especulativa.
+        if interp_task is not None:
+            interp_task.cancel()
+            await asyncio.gather(interp_task, return_exceptions=True)
+
+        if clar.get("status") == "out_of_scope":
+            return {"tipo": "fuera_de_dominio", "clarificacion": clar}
+        return {"tipo": "clarificacion", "clarificacion": clar}
+
+    # ------------------------------------------------------------
+    # Ejecución
+    # ------------------------------------------------------------
+    async def execute(self, accion: str, parametros: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Ejecuta la acción. Para combinar_resultados, las sub-acciones (accion_1, accion_2, ...)
+        se lanzan en paralelo con sus "parametros_N" o los parámetros comunes; cada
+        resultado queda en data["resultados"]["accion_N"].
+        """
+        parametros = parametros or {}
+        if accion != "combinar_resultados":
+            return await self.n8n.execute_async(accion, parametros)
+
+        comunes = parametros.get("parametros", {})
+        llamadas = []
+        i = 1
+        while f"accion_{i}" in parametros:
+            llamadas.append((parametros[f"accion_{i}"], parametros.get(f"parametros_{i}", comunes)))
+            i += 1
+        if not llamadas:
+            return await self.n8n.execute_async(accion, parametros)
+
+        resultados = await self.n8n.execute_many_async(llamadas)
+        return {
+            "ok": all(r.get("ok") for r in resultados),
+            "accion": accion,
+            # Por índice de sub-llamada: la misma acción puede repetirse con otros parámetros
+            "data": {"resultados": {f"accion_{i}": {"accion": r.get("accion"), "ok": r.get("ok"),
+                                                    "data": r.get("data")}
+                                    for i, r in enumerate(resultados, start=1)}},
+            "error": next((r.get("error") for r in resultados if r.get("error")), None),
+        }
+
+    async def run_turn(self, user_input: str, context: Dict[str, Any]) -> Dict[str, Any]:
+        """Turno completo: interpretación (o aclaración) + ejecución."""
+        resuelto = await self.resolve(user_input, context)
+        if resuelto["tipo"] != "accion":
+            return resuelto
+        parsed = resuelto["parsed"]
+        result = await self.execute(parsed.get("accion"), parsed.get("parametros") or {})
+        return {"tipo": "resultado", "parsed": parsed, "resultado": result}
@@ -10,7 +10,12 @@ import streamlit as st
 import json
 import os
 from datetime import datetime
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, List, MutableMapping, Optional, TYPE_CHECKING
+
+if TYPE_CHECKING:
+    import pandas as pd
+    from core.session_store_v1 import SessionStoreV1
+    from core.table_store_v1 import ResultTableStoreV1
 
 DEFAULT_SESSION_PATH = "data/session_log.json"
 CONTEXT_KEY = "context"
@@ -21,20 +26,39 @@ class ContextManager:
     - Memoria de sesión (historial breve y campos "últimos")
     - Preferencias del usuario (p.ej., visualización)
     - Estado conversacional (gráfico pendiente, aclaraciones)
-    - Persistencia local (save/load)
+    - Persistencia local (save/load): archivo JSON completo o, con un
+      SessionStoreV1, deltas por sesión (solo claves modificadas e historial nuevo)
+    - Con un ResultTableStoreV1, la última tabla vive fuera del contexto y aquí
+      solo se guarda su referencia ("ultima_tabla_ref")
+    - Fuera de Streamlit (servicio, benchmarks) `state` reemplaza a
+      st.session_state: un dict propio por sesión
     - Exposición de un snapshot compacto para el FT simulado (to_llm_context)
     """
 
     def __init__(self,
                  persist_path: str = DEFAULT_SESSION_PATH,
-                 max_historial: int = 30):
+                 max_historial: int = 30,
+                 store: Optional["SessionStoreV1"] = None,
+                 session_id: Optional[str] = None,
+                 table_store: Optional["ResultTableStoreV1"] = None,
+                 state: Optional[MutableMapping[str, Any]] = None):
         self.persist_path = persist_path
         self.max_historial = max_historial
+        self.store = store
+        self.table_store = table_store
+        self.session_id = session_id or "default"
+        self._state = st.session_state if state is None else state
+        # Deltas pendientes de persistir (solo con store)
+        self._claves_modificadas: set = set()
+        self._entradas_nuevas: List[Dict[str, Any]] = []
 
-        if CONTEXT_KEY not in st.session_state:
-            st.session_state[CONTEXT_KEY] = self._crear_contexto_base()
+        if CONTEXT_KEY not in self._state:
+            self._state[CONTEXT_KEY] = self._crear_contexto_base()
         # Cargar si existe persistencia previa
-        self.load_from_file(self.persist_path)
+        if self.store is not None:
+            self.load_from_store()
+        else:
+            self.load_from_file(self.persist_path)
 
         # Compatibilidad hacia atrás: asegurar claves v3
         self._ensure_keys()
@@ -55,6 +79,7 @@ class ContextManager:
             "ultima_accion": None,           # Acción ejecutada más reciente (para LLM FT-sim)
             # Visualización / tablas
             "ultima_tabla": None,            # Última tabla (lista de dicts) para graficar
+            "ultima_tabla_ref": None,        # Referencia en ResultTableStoreV1 (si se usa)
             "grafico_pendiente": False,      # ¿Hay una pregunta abierta para mostrar gráfico?
             "solicita_grafico": False,       # ¿El usuario pidió explícitamente gráfico?
             "preferencia_visual": "auto",    # "auto" | "siempre" | "nunca"
@@ -66,18 +91,19 @@ class ContextManager:
 
     def _ensure_keys(self) -> None:
         """Garantiza que existan campos nuevos en sesiones antiguas."""
-        ctx = st.session_state[CONTEXT_KEY]
+        ctx = self._state[CONTEXT_KEY]
         defaults = self._crear_contexto_base()
         for k, v in defaults.items():
             if k not in ctx:
                 ctx[k] = v
+                self._claves_modificadas.add(k)
 
     # ------------------------------------------------------------
     #  GETTERS / SETTERS SENCILLOS
     # ------------------------------------------------------------
     @property
     def context(self) -> Dict[str, Any]:
-        return st.session_state[CONTEXT_KEY]
+        return self._state[CONTEXT_KEY]
 
     def get(self, key: str, default: Any = None) -> Any:
         return self.context.get(key, default)
@@ -94,6 +120,7 @@ class ContextManager:
         if key is not None:
             self.context[key] = value
             self.context["timestamp_ultima_actualizacion"] = ts
+            self._claves_modificadas.update((key, "timestamp_ultima_actualizacion"))
             return
 
         # Registro de interacción en historial
@@ -105,6 +132,7 @@ class ContextManager:
                 "timestamp": ts
             }
             self.context["historial"].append(entry)
+            self._entradas_nuevas.append(entry)
             # Rotar historial si excede
             if len(self.context["historial"]) > self.max_historial:
                 self.context["historial"] = self.context["historial"][-self.max_historial:]
@@ -112,6 +140,7 @@ class ContextManager:
             self.context["ultima_pregunta"] = metadata["pregunta"]
             self.context["ultima_respuesta"] = metadata["respuesta"]
             self.context["timestamp_ultima_actualizacion"] = ts
+            self._claves_modificadas.update(("ultima_pregunta", "ultima_respuesta", "timestamp_ultima_actualizacion"))
 
     def update_last_action(self, accion: Optional[str]) -> None:
         """Guarda la última acción ejecutada (para FT-sim y trazabilidad)."""
@@ -123,9 +152,45 @@ class ContextManager:
     # ------------------------------------------------------------
     #  VISUALIZACIÓN: flujo conversacional de gráficos
     # ------------------------------------------------------------
-    def mark_graph_pending(self, ultima_tabla: Optional[List[Dict[str, Any]]]) -> None:
+    def set_last_table(self, tabla: Any) -> Optional[str]:
+        """
+        Registra la última tabla mostrada (DataFrame o lista de dicts).
+        Con table_store se guarda fuera del contexto y se devuelve su referencia.
+        """
+        if self.table_store is None:
+            if hasattr(tabla, "to_dict"):
+                tabla = tabla.to_dict(orient="records")
+            self.update("ultima_tabla", tabla or [])
+            return None
+        ref = self.table_store.put(tabla if tabla is not None else [])
+        if self.context.get("ultima_tabla") is not None:
+            self.update("ultima_tabla", None)
+        self.update("ultima_tabla_ref", ref)
+        return ref
+
+    def set_last_table_ref(self, ref: str) -> str:
+        """Registra como última tabla una que ya está en el table_store (p.ej. recibida por lotes desde n8n)."""
+        if self.context.get("ultima_tabla") is not None:
+            self.update("ultima_tabla", None)
+        self.update("ultima_tabla_ref", ref)
+        return ref
+
+    def get_last_table(self) -> Optional["pd.DataFrame"]:
+        """Última tabla como DataFrame (desde el table_store o, en sesiones antiguas, del contexto)."""
+        ref = self.context.get("ultima_tabla_ref")
+        if ref and self.table_store is not None:
+            df = self.table_store.to_pandas(ref)
+            if df is not None:
+                return df
+        tabla = self.context.get("ultima_tabla")
+        if not tabla:
+            return None
+        import pandas as pd
+        return pd.DataFrame(tabla)
+
+    def mark_graph_pending(self, ultima_tabla: Any) -> None:
         """Marca que hay un gráfico pendiente de confirmación y guarda la última tabla."""
-        self.update("ultima_tabla", ultima_tabla or [])
+        self.set_last_table(ultima_tabla)
         self.update("grafico_pendiente", True)
 
     def clear_graph_pending(self) -> None:
@@ -203,6 +268,37 @@ class ContextManager:
     # ------------------------------------------------------------
     #  PERSISTENCIA LOCAL
     # ------------------------------------------------------------
+    def save(self) -> None:
+        """
+        Persiste el contexto: con store, solo los deltas desde el último guardado
+        (costo constante por turno); sin store, el archivo JSON completo.
+        """
+        if self.store is None:
+            self.save_to_file()
+            return
+        try:
+            cambios = {k: self.context[k] for k in self._claves_modificadas
+                       if k in self.context and k != "historial"}
+            self.store.guardar(self.session_id, cambios, self._entradas_nuevas)
+            self._claves_modificadas.clear()
+            self._entradas_nuevas = []
+        except Exception as e:
+            print(f"[ContextManager v3] Error al guardar contexto: {e}")
+
+    def load_from_store(self) -> None:
+        """Carga la sesión `session_id` desde el store; si no existe, la base se guardará completa."""
+        try:
+            loaded = self.store.cargar(self.session_id, self.max_historial)
+        except Exception as e:
+            print(f"[ContextManager v3] Error al cargar contexto: {e}")
+            loaded = None
+        base = self._crear_contexto_base()
+        if isinstance(loaded, dict):
+            base.update(loaded)
+        else:
+            self._claves_modificadas.update(k for k in base if k != "historial")
+        self._state[CONTEXT_KEY] = base
+
     def save_to_file(self, filepath: Optional[str] = None) -> None:
         """Guarda el contexto completo en un archivo JSON."""
         path = filepath or self.persist_path
@@ -232,17 +328,24 @@ class ContextManager:
                 # Merge suave para mantener compatibilidad y nuevos campos
                 base = self._crear_contexto_base()
                 base.update(loaded)
-                st.session_state[CONTEXT_KEY] = base
+                self._state[CONTEXT_KEY] = base
             else:
-                st.session_state[CONTEXT_KEY] = self._crear_contexto_base()
+                self._state[CONTEXT_KEY] = self._crear_contexto_base()
         except Exception as e:
             print(f"[ContextManager v3] Error al cargar contexto: {e}")
-            st.session_state[CONTEXT_KEY] = self._crear_contexto_base()
+            self._state[CONTEXT_KEY] = self._crear_contexto_base()
 
     # ------------------------------------------------------------
     #  LIMPIEZA Y REINICIO
     # ------------------------------------------------------------
     def clear(self) -> None:
         """Reinicia completamente el contexto y borra historial."""
-        st.session_state[CONTEXT_KEY] = self._crear_contexto_base()
+        self._state[CONTEXT_KEY] = self._crear_contexto_base()
+        if self.store is not None:
+            try:
+                self.store.borrar(self.session_id)
+            except Exception as e:
+                print(f"[ContextManager v3] Error al borrar sesión: {e}")
+            self._claves_modificadas = {k for k in self.context if k != "historial"}
+            self._entradas_nuevas = []
 
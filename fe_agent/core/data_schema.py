@@ -0,0 +1,47 @@
+# ============================================================
+#  core/data_schema.py
+#  Esquema tipado de las tablas comerciales del agente FE
+#  Autor: Eduardo Sánchez Santana
+#  Fecha: 2025-11-05
+# ============================================================
+
+# Esquema tipado de las tablas comerciales (CSV en data/).
+# "category" se guarda como columna diccionario (índices int32 + valores únicos).
+TABLAS = {
+    "ventas": {
+        "archivo": "FE_ventas_v2.csv",
+        "fechas": ["fecha_venta"],
+        "tipos": {"id_venta": "string", "id_cliente": "string", "total": "float64"},
+    },
+    "detalle_ventas": {
+        "archivo": "FE_detalle_ventas_v2.csv",
+        "tipos": {"id_detalle_venta": "string", "id_venta": "string", "id_producto": "string",
+                  "cantidad": "int64", "precio_venta_unitario": "float64", "subtotal": "float64"},
+    },
+    "compras": {
+        "archivo": "FE_compras_v2.csv",
+        "fechas": ["fecha_compra"],
+        "tipos": {"id_compra": "string", "id_proveedor": "string", "total": "float64"},
+    },
+    "detalle_compras": {
+        "archivo": "FE_detalle_compras_v2.csv",
+        "tipos": {"id_detalle_compra": "string", "id_compra": "string", "id_producto": "string",
+                  "cantidad": "int64", "precio_compra_unitario": "float64"},
+    },
+    "productos": {
+        "archivo": "FE_productos_v2.csv",
+        "fechas": ["fecha_creacion"],
+        "tipos": {"id_producto": "string", "nombre": "string", "descripcion": "string",
+                  "precio_unitario": "float64", "stock": "int64"},
+    },
+    "clientes": {
+        "archivo": "FE_clientes_v2.csv",
+        "tipos": {"id_cliente": "string", "nombre_cliente": "string", "tipo_cliente": "category",
+                  "telefono": "string", "ciudad": "category"},
+    },
+    "proveedores": {
+        "archivo": "FE_proveedores_v2.csv",
+        "tipos": {"id_proveedor": "string", "nombre_proveedor": "string", "contacto": "string",
+                  "telefono": "string", "ciudad": "category"},
+    },
+}
@@ -0,0 +1,212 @@
+# ============================================================
+#  core/data_store_v1.py
+#  Almacén columnar: snapshots Arrow/Parquet de los CSV comerciales
+#  Autor: Eduardo Sánchez Santana
+#  Fecha: 2025-11-05
+# ============================================================
+
+import hashlib
+import io
+import json
+import os
+import threading
+from typing import Any, Dict, List, Optional
+
+import pyarrow as pa
+import pyarrow.csv as pacsv
+import pyarrow.ipc as ipc
+import pyarrow.parquet as pq
+
+from core.data_schema import TABLAS
+
+_TIPOS_ARROW = {
+    "string": pa.string(),
+    "category": pa.dictionary(pa.int32(), pa.string()),
+    "int64": pa.int64(),
+    "float64": pa.float64(),
+}
+
+# Bytes finales del CSV que se comparan para confirmar que el archivo solo creció por el final.
+_COLA_FIRMA = 4096
+
+
+class ColumnarDataStoreV1:
+    """
+    Convierte los CSV comerciales en snapshots columnares tipados y los sirve
+    con memory mapping (sin re-parsear CSV en cada arranque).
+    - formato "arrow": archivo Arrow IPC, lectura zero-copy vía pa.memory_map.
+    - formato "parquet": archivo Parquet comprimido, lectura con memory_map=True.
+    - Refresco por mtime/tamaño del CSV: si el archivo solo creció (filas agregadas
+      al final) se parsea únicamente la cola nueva y se anexa al snapshot; ante
+      cualquier otro cambio se reconstruye completo.
+    """
+
+    def __init__(self,
+                 data_dir: str = "data",
+                 snapshot_dir: str = "data/snapshots",
+                 formato: str = "arrow",
+                 tablas: Optional[Dict[str, Dict[str, Any]]] = None):
+        if formato not in ("arrow", "parquet"):
+            raise ValueError(f"Formato de snapshot no soportado: {formato}")
+        self.data_dir = data_dir
+        self.snapshot_dir = snapshot_dir
+        self.formato = formato
+        self.specs = tablas or TABLAS
+        self._lock = threading.Lock()
+        self._tablas: Dict[str, pa.Table] = {}
+        os.makedirs(self.snapshot_dir, exist_ok=True)
+        self._manifest_path = os.path.join(self.snapshot_dir, "manifest.json")
+        self.manifest = self._load_manifest()
+
+    # ------------------------------------------------------------
+    # Utilidades internas
+    # ------------------------------------------------------------
+
+    def _load_manifest(self) -> Dict[str, Any]:
+        try:
+            with open(self._manifest_path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+        except Exception as e:
+            print(f"[ColumnarDataStoreV1] Manifest ilegible, se reconstruirán snapshots: {e}")
+            return {}
+
+    def _save_manifest(self) -> None:
+        tmp = self._manifest_path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self.manifest, f, ensure_ascii=False, indent=2)
+        os.replace(tmp, self._manifest_path)
+
+    def _csv_path(self, nombre: str) -> str:
+        return os.path.join(self.data_dir, self.specs[nombre]["archivo"])
+
+    def _snapshot_path(self, nombre: str) -> str:
+        ext = "arrow" if self.formato == "arrow" else "parquet"
+        return os.path.join(self.snapshot_dir, f"{nombre}.{ext}")
+
+    def _schema(self, nombre: str) -> pa.Schema:
+        spec = self.specs[nombre]
+        campos = [pa.field(c, _TIPOS_ARROW[t]) for c, t in spec.get("tipos", {}).items()]
+        campos += [pa.field(c, pa.timestamp("ms")) for c in spec.get("fechas", [])]
+        return pa.schema(campos)
+
+    @staticmethod
+    def _firma_cola(path: str, hasta: int) -> str:
+        """sha1 de los últimos bytes del archivo hasta la posición indicada."""
+        with open(path, "rb") as f:
+            f.seek(max(0, hasta - _COLA_FIRMA))
+            return hashlib.sha1(f.read(min(hasta, _COLA_FIRMA))).hexdigest()
+
+    def _parse_csv(self, nombre: str, fuente) -> pa.Table:
+        schema = self._schema(nombre)
+        tabla = pacsv.read_csv(
+            fuente,
+            convert_options=pacsv.ConvertOptions(column_types=schema),
+        )
+        # Reordena/castea al esquema declarado (columnas diccionario incluidas)
+        columnas = [c for c in tabla.column_names if c in schema.names]
+        return tabla.select(columnas).cast(pa.schema([schema.field(c) for c in columnas]))
+
+    def _write_snapshot(self, nombre: str, tabla: pa.Table) -> None:
+        destino = self._snapshot_path(nombre)
+        tmp = destino + ".tmp"
+        if self.formato == "arrow":
+            with pa.OSFile(tmp, "wb") as sink:
+                with ipc.new_file(sink, tabla.schema) as writer:
+                    writer.write_table(tabla)
+        else:
+            pq.write_table(tabla, tmp, compression="zstd")
+        # Reemplazo atómico: los lectores con el archivo mapeado conservan la versión previa.
+        os.replace(tmp, destino)
+
+    def _read_snapshot(self, nombre: str) -> pa.Table:
+        path = self._snapshot_path(nombre)
+        if self.formato == "arrow":
+            return ipc.open_file(pa.memory_map(path, "r")).read_all()
+        return pq.read_table(path, memory_map=True)
+
+    def _estado(self, nombre: str) -> str:
+        """'vigente' | 'anexar' | 'reconstruir' según el CSV y el manifest."""
+        meta = self.manifest.get(nombre)
+        path = self._csv_path(nombre)
+        if not meta or not os.path.exists(self._snapshot_path(nombre)) or meta.get("formato") != self.formato:
+            return "reconstruir"
+        st = os.stat(path)
+        if st.st_mtime_ns == meta["mtime_ns"] and st.st_size == meta["size"]:
+            return "vigente"
+        if (st.st_size > meta["size"] and meta.get("termina_en_salto")
+                and self._firma_cola(path, meta["size"]) == meta["firma_cola"]):
+            return "anexar"
+        return "reconstruir"
+
+    def _actualizar_manifest(self, nombre: str, filas: int) -> None:
+        path = self._csv_path(nombre)
+        st = os.stat(path)
+        with open(path, "rb") as f:
+            f.seek(max(0, st.st_size - 1))
+            termina_en_salto = f.read(1) == b"\n"
+        self.manifest[nombre] = {
+            "mtime_ns": st.st_mtime_ns,
+            "size": st.st_size,
+            "firma_cola": self._firma_cola(path, st.st_size),
+            "termina_en_salto": termina_en_salto,
+            "filas": filas,
+            "formato": self.formato,
+        }
+
+    def _refresh_tabla(self, nombre: str) -> str:
+        estado = self._estado(nombre)
+        if estado == "vigente":
+            if nombre not in self._tablas:
+                self._tablas[nombre] = self._read_snapshot(nombre)
+            return estado
+
+        path = self._csv_path(nombre)
+        if estado == "anexar":
+            with open(path, "rb") as f:
+                encabezado = f.readline()
+                f.seek(self.manifest[nombre]["size"])
+                cola = f.read()
+            nuevas = self._parse_csv(nombre, io.BytesIO(encabezado + cola))
+            # El formato IPC admite un único diccionario por columna: se unifican.
+            tabla = pa.concat_tables([self._read_snapshot(nombre), nuevas]).unify_dictionaries().combine_chunks()
+        else:
+            tabla = self._parse_csv(nombre, path)
+
+        self._write_snapshot(nombre, tabla)
+        self._actualizar_manifest(nombre, tabla.num_rows)
+        self._tablas[nombre] = self._read_snapshot(nombre)
+        return estado
+
+    # ------------------------------------------------------------
+    # API pública
+    # ------------------------------------------------------------
+
+    def refresh(self, nombres: Optional[List[str]] = None) -> Dict[str, str]:
+        """
+        Sincroniza los snapshots con los CSV. Devuelve, por tabla, la operación
+        realizada: 'vigente', 'anexar' o 'reconstruir'.
+        """
+        resultado = {}
+        with self._lock:
+            for nombre in nombres or list(self.specs):
+                try:
+                    resultado[nombre] = self._refresh_tabla(nombre)
+                except Exception as e:
+                    print(f"[ColumnarDataStoreV1] Error actualizando '{nombre}': {e}")
+                    resultado[nombre] = "error"
+            self._save_manifest()
+        return resultado
+
+    def table(self, nombre: str) -> pa.Table:
+        """Tabla Arrow mapeada en memoria (refresca si el CSV cambió)."""
+        with self._lock:
+            if self._estado(nombre) != "vigente" or nombre not in self._tablas:
+                self._refresh_tabla(nombre)
+                self._save_manifest()
+            return self._tablas[nombre]
+
+    def to_pandas(self, nombre: str):
+        """DataFrame tipado (fechas datetime64, diccionarios como category)."""
+        return self.table(nombre).to_pandas()
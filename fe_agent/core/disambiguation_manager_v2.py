@@ -6,51 +6,140 @@
 # ============================================================
 
 import json
-import requests
 from typing import Dict, Any, List, Optional
 
+from core.ambiguity_detector_v1 import marcas_ambiguedad
+from core.http_transport import HTTPTransport, get_transport
+from core.intent_classifier_v1 import IntentClassifierV1
+from core.tracing_v1 import atributos_ollama, get_tracer
+
 
 class DisambiguationManagerV2:
     """
     Invoca al LLM para clarificar preguntas ambiguas o fuera de dominio.
     Propone contra-preguntas empáticas e hipótesis clasificadas.
+    Con un clasificador local (IntentClassifierV1) resuelve primero los casos
+    comunes en CPU y solo consulta al LLM cuando la confianza calibrada no alcanza.
+    El clasificador no conoce las intenciones de interfaz/contexto (ui_*, ctx_*,
+    confirm_previous), así que nunca declara "fuera de dominio" por su cuenta:
+    una confianza baja siempre se decide con el LLM. Tampoco da por resuelta
+    una pregunta vaga o compuesta (marcas_ambiguedad), por alta que sea la confianza.
     """
 
     def __init__(self,
                  llm_url: str = "http://localhost:11434/api/generate",
                  model: str = "gemma:2b",
-                 temperature: float = 0.3):
+                 temperature: float = 0.3,
+                 transport: Optional[HTTPTransport] = None,
+                 classifier: Optional[IntentClassifierV1] = None,
+                 umbral_confianza: float = 0.5,
+                 umbral_alternativas: float = 0.25):
         self.llm_url = llm_url
         self.model = model
         self.temperature = temperature
+        self.http = transport or get_transport()
+        self.classifier = classifier
+        self.umbral_confianza = umbral_confianza
+        self.umbral_alternativas = umbral_alternativas
         self.scope_domains = [
             "ventas", "compras", "margen", "productos", "clientes",
             "proveedores", "stock", "rotación", "categorías"
         ]
 
     # ------------------------------------------------------------
-    def clarify(self, user_input: str, context: Dict[str, Any]) -> Dict[str, Any]:
-        prompt = self._build_prompt(user_input, context)
-        payload = {
+    def clarify(self, user_input: str, context: Dict[str, Any],
+                coincidencias: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        with get_tracer().span("desambiguacion.clarify") as span:
+            local = self.clarify_local(user_input, coincidencias)
+            if local is not None:
+                span.update(origen=local["origen"], status=local["status"])
+                return local
+            payload = self._build_payload(user_input, context)
+            try:
+                with get_tracer().span("llm.generate", **{"llm.model": self.model, "llm.stream": False}) as gen:
+                    res = self.http.post(self.llm_url, json=payload, timeout=60)
+                    res.raise_for_status()
+                    cuerpo = res.json()
+                    gen.update(**atributos_ollama(cuerpo))
+                resultado = self._normalize(self._safe_json(cuerpo.get("response", "")))
+            except Exception as e:
+                resultado = self._error_response(e)
+            span.update(origen=resultado.get("origen", "llm"), status=resultado.get("status"))
+            return resultado
+
+    # ------------------------------------------------------------
+    def clarify_local(self, user_input: str,
+                      coincidencias: Optional[Dict[str, Any]] = None) -> Optional[Dict[str, Any]]:
+        """
+        Aclaración sin LLM, con el mismo esquema que _normalize (+ "origen").
+        `coincidencias` es la salida de AmbiguityDetectorV1 (la trae procesar_input)
+        y evita volver a recorrer el texto. Devuelve None si hay que consultar al LLM.
+        """
+        if self.classifier is None:
+            return None
+        try:
+            candidatos = self.classifier.predecir(user_input, top_k=3, coincidencias=coincidencias)
+            if coincidencias is None:
+                coincidencias = self.classifier.detector.detectar(user_input)
+        except Exception as e:
+            print(f"[DisambiguationManagerV2] Error en clasificador local: {e}")
+            return None
+        if not candidatos:
+            return None
+
+        for c in candidatos:
+            c["parametros"] = {}
+        top = candidatos[0]
+        # Sin conceptos del negocio ("repite eso", "exporta a csv") decide el LLM
+        if not coincidencias.get("en_dominio", False):
+            return None
+
+        if top["confidence"] >= self.umbral_confianza and not marcas_ambiguedad(coincidencias):
+            return self._normalize({
+                "status": "in_scope",
+                "reason": f"Intención reconocida localmente ({top['accion']}, {top['confidence']:.2f}).",
+                "candidate_intents": candidatos,
+                "origen": "clasificador_local",
+            })
+
+        alternativas = [c for c in candidatos[:2] if c["confidence"] >= self.umbral_alternativas]
+        if len(alternativas) == 2:
+            a, b = (self.classifier.canonicas.get(c["accion"], c["accion"]) for c in alternativas)
+            return self._normalize({
+                "status": "clarify",
+                "reason": "Dos intenciones probables con confianza similar.",
+                "clarification_question": f"¿Te refieres a «{a}» o a «{b}»?",
+                "rephrased_question": a,
+                "candidate_intents": candidatos,
+                "origen": "clasificador_local",
+            })
+        return None
+
+    @staticmethod
+    def resuelta_sin_dudas(clar: Dict[str, Any]) -> bool:
+        """
+        True solo si el clasificador local reconoció la intención sin preguntas:
+        es el único caso en que una pregunta marcada por el AmbiguityManager
+        sigue a la interpretación; cualquier otra aclaración detiene el turno.
+        """
+        return (clar.get("origen") == "clasificador_local" and clar.get("status") == "in_scope"
+                and not clar.get("clarification_question") and not clar.get("rephrased_question"))
+
+    def _build_payload(self, user_input: str, context: Dict[str, Any]) -> Dict[str, Any]:
+        return {
             "model": self.model,
-            "prompt": prompt,
+            "prompt": self._build_prompt(user_input, context),
             "stream": False,
             "options": {"temperature": self.temperature}
         }
 
-        try:
-            res = requests.post(self.llm_url, json=payload, timeout=60)
-            res.raise_for_status()
-            raw = res.json().get("response", "")
-            parsed = self._safe_json(raw)
-            return self._normalize(parsed)
-        except Exception as e:
-            return {
-                "status": "clarify",
-                "reason": f"Error al procesar aclaración: {e}",
-                "clarification_question": "¿Podrías precisar si te refieres a ventas, compras o margen?",
-                "candidate_intents": []
-            }
+    def _error_response(self, e: Exception) -> Dict[str, Any]:
+        return {
+            "status": "clarify",
+            "reason": f"Error al procesar aclaración: {e}",
+            "clarification_question": "¿Podrías precisar si te refieres a ventas, compras o margen?",
+            "candidate_intents": []
+        }
 
     # ------------------------------------------------------------
     def _build_prompt(self, user_input: str, context: Dict[str, Any]) -> str:
@@ -112,6 +201,7 @@ Pregunta actual:
         data.setdefault("clarification_question", None)
         data.setdefault("rephrased_question", None)
         data.setdefault("candidate_intents", [])
+        data.setdefault("origen", "llm")
         for c in data["candidate_intents"]:
             c.setdefault("confidence", 0.0)
             c["confidence"] = float(c["confidence"])
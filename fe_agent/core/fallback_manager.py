@@ -18,20 +18,23 @@ Casos gestionados:
 ---------------------------------
 """
 
-import json
 import datetime
 import os
 from typing import Dict, Any, Optional
 
+from core.fallback_store_v1 import get_fallback_store
+
 
 class FallbackManager:
     def __init__(self, log_file: str = "data/fallback_log.jsonl"):
         """
         Inicializa el gestor de fallback y crea el archivo de log si no existe.
-        Cada evento se registra como una línea JSON independiente.
+        Cada evento se registra como una línea JSON independiente, escrita en
+        segundo plano por el almacén compartido del archivo (FallbackEventStoreV1).
         """
         self.log_file = log_file
         os.makedirs(os.path.dirname(log_file), exist_ok=True)
+        self.store = get_fallback_store(log_file)
 
     # ---------------------------------------------------
     # 🧩 MÉTODO PRINCIPAL
@@ -120,32 +123,33 @@ class FallbackManager:
     # ---------------------------------------------------
 
     def _registrar_evento(self, evento: Dict[str, Any]) -> None:
-        """Guarda el evento de fallback en formato JSONL."""
-        try:
-            with open(self.log_file, "a", encoding="utf-8") as f:
-                f.write(json.dumps(evento, ensure_ascii=False) + "\n")
-        except Exception as e:
-            print(f"[FallbackManager] Error al registrar log: {e}")
+        """Encola el evento de fallback para escritura JSONL diferida."""
+        if not self.store.registrar(evento):
+            print("[FallbackManager] Error al registrar log: evento descartado")
 
     # ---------------------------------------------------
     # 📜 UTILIDADES
     # ---------------------------------------------------
 
     def leer_log(self, max_registros: int = 10) -> list:
-        """Devuelve los últimos registros de fallback."""
-        if not os.path.exists(self.log_file):
-            return []
+        """Devuelve los últimos registros de fallback (lectura inversa, sin cargar el archivo)."""
         try:
-            with open(self.log_file, "r", encoding="utf-8") as f:
-                lineas = f.readlines()[-max_registros:]
-                return [json.loads(l) for l in lineas]
+            return self.store.ultimos(max_registros)
         except Exception as e:
             print(f"[FallbackManager] Error al leer log: {e}")
             return []
 
+    def resumen(self) -> Dict[str, Any]:
+        """Conteos acumulados por tipo, por acción y por hora (actualizados incrementalmente)."""
+        try:
+            return self.store.agregados()
+        except Exception as e:
+            print(f"[FallbackManager] Error al resumir log: {e}")
+            return {}
+
     def limpiar_log(self) -> None:
-        """Vacía el archivo de log."""
+        """Vacía el archivo de log y sus agregados."""
         try:
-            open(self.log_file, "w", encoding="utf-8").close()
+            self.store.limpiar()
         except Exception as e:
             print(f"[FallbackManager] Error al limpiar log: {e}")
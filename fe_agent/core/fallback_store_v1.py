@@ -0,0 +1,200 @@
+# ============================================================
+#  core/fallback_store_v1.py
+#  Almacén de eventos de fallback: escritura diferida, tail y agregados
+#  Autor: Eduardo Sánchez Santana
+#  Fecha: 2025-11-05
+# ============================================================
+
+import json
+import os
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+from core.jsonl_log_v1 import JSONLLogV1, get_log
+
+
+class FallbackEventStoreV1:
+    """
+    Persistencia de los eventos del FallbackManager sobre un log JSONL.
+    - Escritura asíncrona por lotes (JSONLLogV1): registrar() no toca disco.
+    - ultimos(k): lectura inversa desde el final del archivo, O(k).
+    - Agregados incrementales (por tipo, por acción y por hora) guardados en un
+      archivo lateral junto con el offset ya procesado: cada consulta solo lee
+      los bytes nuevos desde la anterior, incluidos los archivos rotados
+      (se siguen por inodo, que se conserva al renombrar).
+    """
+
+    def __init__(self,
+                 log_file: str = "data/fallback_log.jsonl",
+                 agregados_file: Optional[str] = None,
+                 log: Optional[JSONLLogV1] = None):
+        self.log_file = log_file
+        self.agregados_file = agregados_file or os.path.splitext(log_file)[0] + "_agregados.json"
+        self.log = log or get_log(log_file, max_bytes=20 * 1024 * 1024, rotar_cada_segundos=None, max_archivos=10)
+        self._lock = threading.Lock()
+        self._agg = self._cargar_agregados()
+
+    # ------------------------------------------------------------
+    # Agregados: persistencia
+    # ------------------------------------------------------------
+
+    @staticmethod
+    def _agregados_vacios() -> Dict[str, Any]:
+        return {"inodo": None, "offset": 0, "total": 0, "por_tipo": {}, "por_accion": {}, "por_hora": {}}
+
+    def _cargar_agregados(self) -> Dict[str, Any]:
+        try:
+            with open(self.agregados_file, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return self._agregados_vacios()
+        except Exception as e:
+            print(f"[FallbackEventStoreV1] Agregados ilegibles, se recalcularán: {e}")
+            return self._agregados_vacios()
+
+    def _guardar_agregados(self) -> None:
+        tmp = self.agregados_file + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self._agg, f, ensure_ascii=False)
+        os.replace(tmp, self.agregados_file)
+
+    # ------------------------------------------------------------
+    # Agregados: actualización incremental
+    # ------------------------------------------------------------
+
+    def _cadena_archivos(self) -> List[Tuple[str, int]]:
+        """(ruta, inodo) del archivo más antiguo al actual."""
+        rutas = [f"{self.log_file}.{i}" for i in range(self.log.max_archivos, 0, -1)] + [self.log_file]
+        cadena = []
+        for ruta in rutas:
+            try:
+                cadena.append((ruta, os.stat(ruta).st_ino))
+            except FileNotFoundError:
+                continue
+        return cadena
+
+    def _contar(self, evento: Dict[str, Any]) -> None:
+        agg = self._agg
+        tipo = evento.get("tipo") or "general"
+        accion = evento.get("accion") or "no_definida"
+        hora = str(evento.get("timestamp", ""))[:13]
+        agg["total"] += 1
+        agg["por_tipo"][tipo] = agg["por_tipo"].get(tipo, 0) + 1
+        agg["por_accion"][accion] = agg["por_accion"].get(accion, 0) + 1
+        celda = agg["por_hora"].setdefault(hora, {})
+        celda[tipo] = celda.get(tipo, 0) + 1
+
+    def _procesar_desde(self, ruta: str, offset: int) -> int:
+        """Cuenta las líneas completas de `ruta` a partir de `offset`; devuelve el nuevo offset."""
+        with open(ruta, "rb") as f:
+            f.seek(offset)
+            datos = f.read()
+        fin = datos.rfind(b"\n")
+        if fin < 0:
+            return offset
+        for linea in datos[:fin].split(b"\n"):
+            if not linea.strip():
+                continue
+            try:
+                self._contar(json.loads(linea))
+            except ValueError:
+                continue
+        return offset + fin + 1
+
+    def _actualizar(self) -> None:
+        cadena = self._cadena_archivos()
+        inodos = [ino for _, ino in cadena]
+        agg = self._agg
+        if agg["inodo"] in inodos:
+            inicio = inodos.index(agg["inodo"])
+            offset = agg["offset"]
+        else:
+            # El archivo procesado ya no existe: todo lo presente es posterior.
+            inicio, offset = 0, 0
+        for ruta, ino in cadena[inicio:]:
+            try:
+                agg["offset"] = self._procesar_desde(ruta, offset)
+                agg["inodo"] = ino
+            except FileNotFoundError:
+                pass
+            offset = 0
+
+    # ------------------------------------------------------------
+    # API pública
+    # ------------------------------------------------------------
+
+    def registrar(self, evento: Dict[str, Any]) -> bool:
+        """Encola el evento para escritura diferida."""
+        return self.log.append(evento)
+
+    def ultimos(self, k: int = 10) -> List[Dict[str, Any]]:
+        """Últimos k eventos (del más antiguo al más reciente)."""
+        self.log.flush(timeout=1.0)
+        return self.log.tail(k)
+
+    def agregados(self) -> Dict[str, Any]:
+        """Agregados acumulados, actualizados solo con los eventos nuevos."""
+        self.log.flush(timeout=1.0)
+        with self._lock:
+            antes = (self._agg["inodo"], self._agg["offset"])
+            try:
+                self._actualizar()
+            except Exception as e:
+                print(f"[FallbackEventStoreV1] Error actualizando agregados: {e}")
+            if (self._agg["inodo"], self._agg["offset"]) != antes:
+                self._guardar_agregados()
+            return json.loads(json.dumps(self._agg))
+
+    def conteo_por(self, campo: str) -> Dict[str, int]:
+        """Conteos por "tipo" o por "accion", de mayor a menor."""
+        clave = {"tipo": "por_tipo", "accion": "por_accion"}[campo]
+        conteos = self.agregados()[clave]
+        return dict(sorted(conteos.items(), key=lambda kv: kv[1], reverse=True))
+
+    def serie_horaria(self, tipo: Optional[str] = None,
+                      desde: Optional[str] = None, hasta: Optional[str] = None) -> List[Dict[str, Any]]:
+        """
+        Eventos por hora ("YYYY-MM-DDTHH"), opcionalmente de un tipo y en [desde, hasta]
+        (mismos prefijos ISO, p. ej. "2025-11-01" o "2025-11-01T08").
+        """
+        serie = []
+        for hora, celda in sorted(self.agregados()["por_hora"].items()):
+            if desde and hora < desde[:13]:
+                continue
+            if hasta and hora[:len(hasta)] > hasta[:13]:
+                continue
+            n = celda.get(tipo, 0) if tipo else sum(celda.values())
+            if n:
+                serie.append({"hora": hora, "eventos": n})
+        return serie
+
+    def limpiar(self) -> None:
+        """Vacía el log (y sus rotaciones) y reinicia los agregados."""
+        self.log.flush(timeout=2.0)
+        with self._lock:
+            open(self.log_file, "w", encoding="utf-8").close()
+            for i in range(1, self.log.max_archivos + 1):
+                try:
+                    os.remove(f"{self.log_file}.{i}")
+                except FileNotFoundError:
+                    pass
+            self._agg = self._agregados_vacios()
+            self._guardar_agregados()
+
+
+# ------------------------------------------------------------
+# Un almacén por archivo y por proceso
+# ------------------------------------------------------------
+_STORES: Dict[str, FallbackEventStoreV1] = {}
+_STORES_LOCK = threading.Lock()
+
+
+def get_fallback_store(log_file: str = "data/fallback_log.jsonl") -> FallbackEventStoreV1:
+    """Devuelve el almacén compartido para `log_file` (varios FallbackManager, un solo escritor)."""
+    clave = os.path.abspath(log_file)
+    with _STORES_LOCK:
+        store = _STORES.get(clave)
+        if store is None:
+            store = FallbackEventStoreV1(log_file)
+            _STORES[clave] = store
+        return store
@@ -0,0 +1,109 @@
+# ============================================================
+#  core/figure_cache_v1.py
+#  Caché LRU de figuras renderizadas y pool de construcción
+#  Autor: Eduardo Sánchez Santana
+#  Fecha: 2025-11-08
+# ============================================================
+
+import contextvars
+import hashlib
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import TYPE_CHECKING, Any, Callable, Dict, Optional, Tuple, Union
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+Figura = Union[bytes, str]          # PNG (matplotlib) o JSON de Plotly
+ClaveFigura = Tuple[str, str, str]  # (huella de la tabla, tipo de gráfico, backend)
+
+
+def huella_tabla(df: "pd.DataFrame") -> str:
+    """Hash del contenido de la tabla (valores, columnas y tipos; no el índice)."""
+    import pandas as pd
+    h = hashlib.sha1()
+    h.update(repr([(str(c), str(t)) for c, t in df.dtypes.items()]).encode("utf-8"))
+    h.update(pd.util.hash_pandas_object(df, index=False).values.tobytes())
+    return h.hexdigest()
+
+
+class FigureCacheV1:
+    """
+    Figuras ya renderizadas, por (huella de tabla, tipo, backend):
+      - LRU acotado por cantidad y por bytes; se guarda el resultado final
+        (PNG o JSON), nunca el objeto Figure, así no queda memoria retenida,
+      - la construcción corre en un pool de hilos; pedir una figura que ya se
+        está construyendo devuelve el mismo Future (sin trabajo duplicado),
+      - las tareas heredan el contexto (contextvars): sus spans caen en la
+        traza del turno que las pidió.
+    """
+
+    def __init__(self, max_entradas: int = 64, max_bytes: int = 64 * 1024 * 1024, workers: int = 2):
+        self.max_entradas = max_entradas
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._figuras: "OrderedDict[ClaveFigura, Figura]" = OrderedDict()
+        self._en_curso: Dict[ClaveFigura, Future] = {}
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="fe-figuras")
+
+    def obtener(self, clave: ClaveFigura, construir: Callable[[], Optional[Figura]]) -> Future:
+        """Future con la figura: resuelto al instante si está en caché; si no, se construye en el pool."""
+        with self._lock:
+            figura = self._figuras.get(clave)
+            if figura is not None:
+                self._figuras.move_to_end(clave)
+                self.hits += 1
+                listo: Future = Future()
+                listo.set_result(figura)
+                return listo
+            futuro = self._en_curso.get(clave)
+            if futuro is not None:
+                self.hits += 1
+                return futuro
+            self.misses += 1
+            futuro = self._pool.submit(contextvars.copy_context().run, construir)
+            self._en_curso[clave] = futuro
+        futuro.add_done_callback(lambda f, c=clave: self._terminar(c, f))
+        return futuro
+
+    def _terminar(self, clave: ClaveFigura, futuro: Future) -> None:
+        with self._lock:
+            self._en_curso.pop(clave, None)
+            if futuro.cancelled() or futuro.exception() is not None:
+                return
+            figura = futuro.result()
+            if figura is None or len(figura) > self.max_bytes:
+                return
+            self._figuras[clave] = figura
+            self._bytes += len(figura)
+            while len(self._figuras) > self.max_entradas or self._bytes > self.max_bytes:
+                _, vieja = self._figuras.popitem(last=False)
+                self._bytes -= len(vieja)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"figuras": len(self._figuras), "bytes": self._bytes,
+                    "en_curso": len(self._en_curso), "hits": self.hits, "misses": self.misses}
+
+    def close(self) -> None:
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+
+# ------------------------------------------------------------
+# Caché compartida por proceso
+# ------------------------------------------------------------
+_CACHE: Optional[FigureCacheV1] = None
+_CACHE_LOCK = threading.Lock()
+
+
+def get_figure_cache() -> FigureCacheV1:
+    """Devuelve la caché de figuras del proceso (un solo pool para todas las sesiones)."""
+    global _CACHE
+    with _CACHE_LOCK:
+        if _CACHE is None:
+            _CACHE = FigureCacheV1()
+        return _CACHE
@@ -0,0 +1,266 @@
+# ============================================================
+#  core/http_transport.py
+#  Transporte HTTP compartido: sesiones con pool, keep-alive y reintentos
+#  Autor: Eduardo Sánchez Santana
+#  Fecha: 2025-11-04
+# ============================================================
+
+import asyncio
+import random
+import threading
+import time
+from typing import Any, Dict, Optional, Tuple, Union
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from core.tracing_v1 import get_tracer
+
+Timeout = Union[float, Tuple[float, float], None]
+
+
+class HTTPTransport:
+    """
+    Capa de transporte para todas las llamadas salientes (Ollama y n8n).
+    - Una requests.Session por host (scheme://host:puerto) con pool de conexiones
+      y keep-alive, para no repetir el handshake TCP en cada turno.
+    - Timeouts separados de conexión y lectura.
+    - Reintentos acotados con backoff exponencial y jitter completo, solo ante
+      errores de conexión y estados transitorios (502/503/504): un POST que ya
+      llegó al servidor no se reenvía por un timeout de lectura.
+    """
+
+    def __init__(self,
+                 pool_size: int = 10,
+                 max_retries: int = 2,
+                 backoff_base: float = 0.25,
+                 backoff_max: float = 4.0,
+                 connect_timeout: float = 3.05,
+                 read_timeout: float = 60.0,
+                 retry_statuses: Tuple[int, ...] = (502, 503, 504)):
+        self.pool_size = pool_size
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.retry_statuses = set(retry_statuses)
+        self._sessions: Dict[str, requests.Session] = {}
+        self._lock = threading.Lock()
+
+    # ------------------------------------------------------------
+    # Utilidades internas
+    # ------------------------------------------------------------
+
+    def _session(self, url: str) -> requests.Session:
+        partes = urlsplit(url)
+        host = f"{partes.scheme}://{partes.netloc}"
+        with self._lock:
+            sesion = self._sessions.get(host)
+            if sesion is None:
+                sesion = requests.Session()
+                adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size, max_retries=0)
+                sesion.mount(host, adapter)
+                self._sessions[host] = sesion
+            return sesion
+
+    def _timeouts(self, timeout: Timeout) -> Tuple[float, float]:
+        if timeout is None:
+            return (self.connect_timeout, self.read_timeout)
+        if isinstance(timeout, tuple):
+            return timeout
+        return (self.connect_timeout, float(timeout))
+
+    def _backoff(self, intento: int) -> float:
+        """Backoff exponencial con jitter completo: U(0, min(max, base * 2^intento))."""
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** intento)))
+
+    # ------------------------------------------------------------
+    # API pública
+    # ------------------------------------------------------------
+
+    def post(self, url: str, json: Any = None, timeout: Timeout = None,
+             stream: bool = False, **kwargs) -> requests.Response:
+        """POST con pool y reintentos. Devuelve la respuesta (sin raise_for_status)."""
+        return self._enviar("post", url, timeout, stream, json=json, **kwargs)
+
+    def get(self, url: str, timeout: Timeout = None, stream: bool = False, **kwargs) -> requests.Response:
+        """GET con el mismo pool y política de reintentos que post()."""
+        return self._enviar("get", url, timeout, stream, **kwargs)
+
+    def _enviar(self, metodo: str, url: str, timeout: Timeout, stream: bool, **kwargs) -> requests.Response:
+        sesion = self._session(url)
+        timeouts = self._timeouts(timeout)
+        intento = 0
+        # Con stream=True el span cubre hasta recibir las cabeceras.
+        with get_tracer().span(f"http.{metodo}", **{"http.url": url, "http.stream": stream}) as span:
+            while True:
+                try:
+                    response = sesion.request(metodo, url, timeout=timeouts, stream=stream, **kwargs)
+                except (requests.exceptions.ConnectionError, requests.exceptions.ConnectTimeout):
+                    if intento >= self.max_retries:
+                        raise
+                else:
+                    if response.status_code not in self.retry_statuses or intento >= self.max_retries:
+                        span.update(**{"http.status_code": response.status_code, "http.reintentos": intento})
+                        return response
+                    response.close()
+                time.sleep(self._backoff(intento))
+                intento += 1
+
+    def close(self) -> None:
+        """Cierra todas las sesiones y sus conexiones."""
+        with self._lock:
+            for sesion in self._sessions.values():
+                sesion.close()
+            self._sessions.clear()
+
+
+class AsyncHTTPTransport:
+    """
+    Equivalente asíncrono de HTTPTransport sobre httpx.AsyncClient
+    (dependencia opcional: pip install httpx, solo para el pipeline asíncrono y la API).
+    Misma política de pool, timeouts y reintentos; hay un cliente por event loop
+    porque un AsyncClient no puede compartirse entre loops distintos. Cada loop
+    conserva el suyo (no se reemplazan entre sí); aclose() cierra el del loop en
+    curso y los de loops ya cerrados se descartan.
+    """
+
+    def __init__(self,
+                 pool_size: int = 20,
+                 max_retries: int = 2,
+                 backoff_base: float = 0.25,
+                 backoff_max: float = 4.0,
+                 connect_timeout: float = 3.05,
+                 read_timeout: float = 60.0,
+                 retry_statuses: Tuple[int, ...] = (502, 503, 504)):
+        self.pool_size = pool_size
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.retry_statuses = set(retry_statuses)
+        self._clients: Dict[asyncio.AbstractEventLoop, Any] = {}
+        self._clients_lock = threading.Lock()
+
+    def _get_client(self):
+        import httpx  # dependencia opcional: solo la necesita el pipeline asíncrono
+
+        loop = asyncio.get_running_loop()
+        with self._clients_lock:
+            client = self._clients.get(loop)
+            if client is None:
+                # Loops terminados: sus conexiones ya no pueden usarse ni cerrarse desde otro loop
+                for cerrado in [l for l in self._clients if l.is_closed()]:
+                    del self._clients[cerrado]
+                client = httpx.AsyncClient(
+                    limits=httpx.Limits(max_connections=self.pool_size,
+                                        max_keepalive_connections=self.pool_size),
+                    timeout=httpx.Timeout(self.read_timeout, connect=self.connect_timeout),
+                )
+                self._clients[loop] = client
+            return client
+
+    def _timeouts(self, timeout: Timeout):
+        import httpx
+
+        if timeout is None:
+            return httpx.Timeout(self.read_timeout, connect=self.connect_timeout)
+        if isinstance(timeout, tuple):
+            return httpx.Timeout(timeout[1], connect=timeout[0])
+        return httpx.Timeout(float(timeout), connect=self.connect_timeout)
+
+    def _backoff(self, intento: int) -> float:
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** intento)))
+
+    async def _with_retries(self, enviar):
+        import httpx
+
+        intento = 0
+        while True:
+            try:
+                response = await enviar()
+            except (httpx.ConnectError, httpx.ConnectTimeout):
+                if intento >= self.max_retries:
+                    raise
+            else:
+                if response.status_code not in self.retry_statuses or intento >= self.max_retries:
+                    return response
+                await response.aclose()
+            await asyncio.sleep(self._backoff(intento))
+            intento += 1
+
+    async def post(self, url: str, json: Any = None, timeout: Timeout = None, **kwargs):
+        """POST asíncrono con pool y reintentos (cuerpo completo en memoria)."""
+        client = self._get_client()
+        timeouts = self._timeouts(timeout)
+        with get_tracer().span("http.post", **{"http.url": url, "http.stream": False}) as span:
+            response = await self._with_retries(
+                lambda: client.post(url, json=json, timeout=timeouts, **kwargs)
+            )
+            span.set("http.status_code", response.status_code)
+            return response
+
+    async def post_stream(self, url: str, json: Any = None, timeout: Timeout = None, **kwargs):
+        """
+        POST asíncrono en modo streaming. El llamador debe cerrar la respuesta
+        (await response.aclose()) para liberar la conexión o cortar la generación.
+        """
+        client = self._get_client()
+        timeouts = self._timeouts(timeout)
+
+        async def enviar():
+            request = client.build_request("POST", url, json=json, timeout=timeouts, **kwargs)
+            return await client.send(request, stream=True)
+
+        with get_tracer().span("http.post", **{"http.url": url, "http.stream": True}) as span:
+            response = await self._with_retries(enviar)
+            span.set("http.status_code", response.status_code)
+            return response
+
+    async def aclose(self) -> None:
+        """Cierra el cliente del loop en curso (llamar antes de que el loop termine)."""
+        with self._clients_lock:
+            client = self._clients.pop(asyncio.get_running_loop(), None)
+        if client is not None:
+            await client.aclose()
+
+
+# ------------------------------------------------------------
+# Instancia compartida por proceso
+# ------------------------------------------------------------
+_TRANSPORTE: Optional[HTTPTransport] = None
+_TRANSPORTE_LOCK = threading.Lock()
+
+
+def configure_transport(**kwargs) -> HTTPTransport:
+    """Reemplaza el transporte compartido con una configuración nueva (pool, reintentos, timeouts)."""
+    global _TRANSPORTE
+    with _TRANSPORTE_LOCK:
+        if _TRANSPORTE is not None:
+            _TRANSPORTE.close()
+        _TRANSPORTE = HTTPTransport(**kwargs)
+        return _TRANSPORTE
+
+
+def get_transport() -> HTTPTransport:
+    """Devuelve el transporte compartido del proceso, creándolo si no existe."""
+    global _TRANSPORTE
+    with _TRANSPORTE_LOCK:
+        if _TRANSPORTE is None:
+            _TRANSPORTE = HTTPTransport()
+        return _TRANSPORTE
+
+
+_TRANSPORTE_ASYNC: Optional[AsyncHTTPTransport] = None
+
+
+def get_async_transport() -> AsyncHTTPTransport:
+    """Devuelve el transporte asíncrono compartido del proceso."""
+    global _TRANSPORTE_ASYNC
+    with _TRANSPORTE_LOCK:
+        if _TRANSPORTE_ASYNC is None:
+            _TRANSPORTE_ASYNC = AsyncHTTPTransport()
+        return _TRANSPORTE_ASYNC
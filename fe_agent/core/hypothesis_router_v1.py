@@ -6,15 +6,17 @@
 # ============================================================
 
 from __future__ import annotations
-from typing import Dict, Any, Optional, Tuple
+from typing import Callable, Dict, Any, Optional, Tuple
 import pandas as pd
 
 from core.fallback_manager import FallbackManager
+from core.tracing_v1 import get_tracer
 
 class HypothesisRouterV1:
     """
     Decide cómo manejar una hipótesis propuesta por el LLM:
     - n8n: acciones operativas del diccionario.
+    - engine: acciones analíticas que el motor local (pandas) resuelve sin n8n.
     - local: operaciones de interfaz/memoria/visualización simples.
     - confirm: confirmaciones o re-frases que no requieren ejecución.
     """
@@ -30,18 +32,21 @@ class HypothesisRouterV1:
         "confirm_previous": "Confirmar o validar el resultado anterior sin nueva ejecución.",
     }
 
-    def __init__(self):
-        self.fb = FallbackManager()
+    def __init__(self, local_engine=None, fallback_log: str = "data/fallback_log.jsonl"):
+        self.fb = FallbackManager(fallback_log)
+        # Motor local opcional (LocalExecutionEngineV1): evita el salto HTTP a n8n
+        self.engine = local_engine
 
     # ------------------------------------------------------------
     #  Detección de tipo
     # ------------------------------------------------------------
     def classify(self, candidate: Dict[str, Any]) -> str:
         """
-        Clasifica la hipótesis como 'n8n' | 'local' | 'confirm'.
+        Clasifica la hipótesis como 'n8n' | 'engine' | 'local' | 'confirm'.
         Reglas:
           - Si 'accion' empieza por 'ui_' o 'ctx_' -> local
           - Si 'accion' == 'confirm_previous'     -> confirm
+          - Si el motor local implementa la acción -> engine
           - Si 'accion' coincide con patrón operativo -> n8n
           - Si no hay 'accion' -> confirm (no ejecutar)
         """
@@ -52,9 +57,35 @@ class HypothesisRouterV1:
             return "local"
         if accion == "confirm_previous":
             return "confirm"
+        if self.engine is not None and self.engine.supports(accion):
+            return "engine"
         # Por defecto, suponer acción de n8n (se validará más adelante).
         return "n8n"
 
+    # ------------------------------------------------------------
+    #  Ejecución de acciones operativas (motor local o n8n)
+    # ------------------------------------------------------------
+    def execute_action(self, accion: str, parametros: Dict[str, Any], n8n_connector,
+                       on_progreso: Optional[Callable] = None) -> Dict[str, Any]:
+        """
+        Ejecuta una acción del diccionario en el motor local si la soporta;
+        en otro caso (o si el motor falla) la envía a n8n. Mismo sobre {ok, accion, data}.
+        on_progreso se pasa al conector (primera página de resultados que llegan por partes).
+        """
+        resultado = self.run_engine(accion, parametros)
+        if resultado is not None and resultado.get("ok"):
+            return resultado
+        return n8n_connector.execute(accion, parametros, on_progreso=on_progreso)
+
+    def run_engine(self, accion: str, parametros: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Ejecuta la acción en el motor local; None si el motor no la soporta."""
+        if self.classify({"accion": accion}) != "engine":
+            return None
+        with get_tracer().span("engine.execute", accion=accion) as span:
+            resultado = self.engine.execute(accion, parametros or {})
+            span.set("ok", bool(resultado.get("ok")))
+        return resultado
+
     # ------------------------------------------------------------
     #  Ejecución de operaciones locales
     # ------------------------------------------------------------
@@ -75,10 +106,11 @@ class HypothesisRouterV1:
         try:
             # ui_repeat_last: volver a mostrar la última tabla
             if accion == "ui_repeat_last":
-                tabla = context_manager.get("ultima_tabla")
-                if not tabla:
+                df = last_df if last_df is not None else context_manager.get_last_table()
+                if df is None or df.empty:
                     return {"ok": False, "tipo": "local", "mensaje": "No hay una tabla previa para repetir."}
-                return {"ok": True, "tipo": "local", "mensaje": "Repito la última tabla mostrada.", "data": {"tabla": tabla}}
+                return {"ok": True, "tipo": "local", "mensaje": "Repito la última tabla mostrada.",
+                        "data": {"df": df, "tabla_ref": context_manager.get("ultima_tabla_ref")}}
 
             # ui_show_chart / ui_change_chart_type: marcamos intención para la app
             if accion in ("ui_show_chart", "ui_change_chart_type"):
@@ -90,12 +122,15 @@ class HypothesisRouterV1:
 
             # ui_export_csv: exportamos última tabla a CSV en /data
             if accion == "ui_export_csv":
-                tabla = context_manager.get("ultima_tabla")
-                if not tabla:
-                    return {"ok": False, "tipo": "local", "mensaje": "No hay datos para exportar."}
-                df = pd.DataFrame(tabla)
                 path = "data/ultima_tabla_export.csv"
-                df.to_csv(path, index=False, encoding="utf-8")
+                ref = context_manager.get("ultima_tabla_ref")
+                store = getattr(context_manager, "table_store", None)
+                # Con referencia: Arrow -> CSV directo, sin materializar el DataFrame
+                if not (ref and store is not None and store.export_csv(ref, path)):
+                    df = last_df if last_df is not None else context_manager.get_last_table()
+                    if df is None or df.empty:
+                        return {"ok": False, "tipo": "local", "mensaje": "No hay datos para exportar."}
+                    df.to_csv(path, index=False, encoding="utf-8")
                 return {"ok": True, "tipo": "local", "mensaje": f"Exporté la última tabla a {path}.", "data": {"path": path}}
 
             # ctx_set_period: setea período por defecto en el contexto
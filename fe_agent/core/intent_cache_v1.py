@@ -0,0 +1,182 @@
+# ============================================================
+#  core/intent_cache_v1.py
+#  Caché de intenciones interpretadas (LRU + TTL + respaldo en disco)
+#  Autor: Eduardo Sánchez Santana
+#  Fecha: 2025-11-03
+# ============================================================
+
+import copy
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+from core.text_normalizer import normalizar_texto
+
+
+class IntentCacheV1:
+    """
+    Caché delante de LLMInterpreterV3.interpret.
+    - Clave: pregunta normalizada (acentos, mayúsculas, puntuación, stop words)
+      más los campos de contexto que influyen en la interpretación.
+    - Memoria: LRU acotada con expiración por TTL.
+    - Disco: tabla SQLite para sobrevivir reinicios.
+    - Invalidación automática si cambia cualquiera de los archivos vigilados
+      (prompt instruccional, diccionario operativo).
+    """
+
+    def __init__(self,
+                 archivos_vigilados: Iterable[str],
+                 persist_path: Optional[str] = "data/intent_cache.sqlite",
+                 max_entradas: int = 512,
+                 ttl_segundos: float = 24 * 3600,
+                 campos_contexto: Tuple[str, ...] = ("ultima_accion", "preferencia_visual")):
+        self.archivos_vigilados = list(archivos_vigilados)
+        self.persist_path = persist_path
+        self.max_entradas = max_entradas
+        self.ttl_segundos = ttl_segundos
+        self.campos_contexto = campos_contexto
+        self.hits = 0
+        self.misses = 0
+
+        self._lock = threading.Lock()
+        self._memoria: "OrderedDict[str, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+        self._firma = self._calcular_firma()
+        self._db = self._abrir_db()
+
+    # ------------------------------------------------------------
+    # Utilidades internas
+    # ------------------------------------------------------------
+
+    def _calcular_firma(self) -> str:
+        """Huella de versión de los archivos vigilados (ruta, mtime, tamaño)."""
+        partes = []
+        for path in self.archivos_vigilados:
+            try:
+                st = os.stat(path)
+                partes.append(f"{path}:{st.st_mtime_ns}:{st.st_size}")
+            except OSError:
+                partes.append(f"{path}:ausente")
+        return hashlib.sha1("|".join(partes).encode("utf-8")).hexdigest()
+
+    def _abrir_db(self) -> Optional[sqlite3.Connection]:
+        if not self.persist_path:
+            return None
+        try:
+            carpeta = os.path.dirname(self.persist_path)
+            if carpeta:
+                os.makedirs(carpeta, exist_ok=True)
+            db = sqlite3.connect(self.persist_path, check_same_thread=False)
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS intents ("
+                " clave TEXT PRIMARY KEY, firma TEXT NOT NULL,"
+                " resultado TEXT NOT NULL, creado REAL NOT NULL)"
+            )
+            # Entradas de versiones anteriores del prompt/diccionario ya no sirven.
+            db.execute("DELETE FROM intents WHERE firma != ?", (self._firma,))
+            db.commit()
+            return db
+        except Exception as e:
+            print(f"[IntentCacheV1] Error abriendo caché en disco: {e}")
+            return None
+
+    def _verificar_firma(self) -> None:
+        """Vacía la caché si algún archivo vigilado cambió en disco."""
+        firma = self._calcular_firma()
+        if firma != self._firma:
+            self._firma = firma
+            self._memoria.clear()
+            if self._db is not None:
+                self._db.execute("DELETE FROM intents")
+                self._db.commit()
+
+    def clave(self, pregunta: str, context: Optional[Dict[str, Any]] = None) -> str:
+        context = context or {}
+        base = {
+            "pregunta": normalizar_texto(pregunta, quitar_stopwords=True),
+            "contexto": {c: context.get(c) for c in self.campos_contexto},
+        }
+        return hashlib.sha1(json.dumps(base, sort_keys=True, ensure_ascii=False).encode("utf-8")).hexdigest()
+
+    # ------------------------------------------------------------
+    # API pública
+    # ------------------------------------------------------------
+
+    def _recortar(self) -> None:
+        """Descarta las entradas menos usadas por encima de `max_entradas`. Llamar con el lock tomado."""
+        while len(self._memoria) > self.max_entradas:
+            self._memoria.popitem(last=False)
+
+    def _buscar(self, k: str) -> Optional[Tuple[float, Dict[str, Any]]]:
+        """(creado, resultado) vigente para la clave, o None. Llamar con el lock tomado."""
+        self._verificar_firma()
+        item = self._memoria.get(k)
+        if item is None and self._db is not None:
+            row = self._db.execute(
+                "SELECT creado, resultado FROM intents WHERE clave = ? AND firma = ?",
+                (k, self._firma)
+            ).fetchone()
+            if row:
+                item = (row[0], json.loads(row[1]))
+                self._memoria[k] = item
+                self._recortar()
+        if item is not None and time.time() - item[0] > self.ttl_segundos:
+            self._memoria.pop(k, None)
+            return None
+        return item
+
+    def get(self, pregunta: str, context: Optional[Dict[str, Any]] = None) -> Optional[Dict[str, Any]]:
+        """Devuelve una copia del resultado cacheado o None."""
+        k = self.clave(pregunta, context)
+        with self._lock:
+            item = self._buscar(k)
+            if item is None:
+                self.misses += 1
+                return None
+            self._memoria.move_to_end(k)
+            self.hits += 1
+            return copy.deepcopy(item[1])
+
+    def contiene(self, pregunta: str, context: Optional[Dict[str, Any]] = None) -> bool:
+        """Si hay un resultado vigente, sin contar hit/miss ni copiarlo (para decidir antes de get)."""
+        with self._lock:
+            return self._buscar(self.clave(pregunta, context)) is not None
+
+    def set(self, pregunta: str, context: Optional[Dict[str, Any]], resultado: Dict[str, Any]) -> None:
+        """Guarda un resultado interpretado (no se cachean fallbacks)."""
+        if not resultado or resultado.get("accion") in (None, "fallback"):
+            return
+        k = self.clave(pregunta, context)
+        ahora = time.time()
+        valor = copy.deepcopy(resultado)
+        with self._lock:
+            self._memoria[k] = (ahora, valor)
+            self._memoria.move_to_end(k)
+            self._recortar()
+            if self._db is not None:
+                try:
+                    self._db.execute(
+                        "INSERT OR REPLACE INTO intents (clave, firma, resultado, creado) VALUES (?, ?, ?, ?)",
+                        (k, self._firma, json.dumps(valor, ensure_ascii=False), ahora)
+                    )
+                    self._db.execute(
+                        "DELETE FROM intents WHERE creado < ?", (ahora - self.ttl_segundos,)
+                    )
+                    self._db.commit()
+                except Exception as e:
+                    print(f"[IntentCacheV1] Error escribiendo caché en disco: {e}")
+
+    def invalidar(self) -> None:
+        """Vacía la caché en memoria y en disco."""
+        with self._lock:
+            self._memoria.clear()
+            if self._db is not None:
+                self._db.execute("DELETE FROM intents")
+                self._db.commit()
+
+    def stats(self) -> Dict[str, Any]:
+        return {"hits": self.hits, "misses": self.misses, "entradas": len(self._memoria)}
@@ -0,0 +1,311 @@
+# ============================================================
+#  core/intent_classifier_v1.py
+#  Clasificador local de intenciones (softmax sobre n-gramas)
+#  Autor: Eduardo Sánchez Santana
+#  Fecha: 2025-11-06
+# ============================================================
+
+import json
+import math
+import os
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from core.ambiguity_detector_v1 import AmbiguityDetectorV1
+from core.assets_v1 import cargar_json
+from core.text_normalizer import ngramas_caracter, normalizar_texto
+
+MODELO_PATH = "data/FE_intent_classifier_v1.npz"
+# Fuentes de entrenamiento por defecto (su firma invalida el modelo guardado)
+FUENTES = ("data/FE_preguntas_respuestas_v3.json",
+           "data/FE_prompt_instruccional_v4.json",
+           "data/FE_diccionario_operativo_integrado_v4.json",
+           "data/interacciones_etiquetadas.jsonl")
+
+
+def firma_fuentes(paths=FUENTES) -> str:
+    """(mtime_ns, tamaño) de cada fuente; un archivo inexistente también cuenta."""
+    firma = []
+    for path in paths:
+        try:
+            st = os.stat(path)
+            firma.append([path, st.st_mtime_ns, st.st_size])
+        except OSError:
+            firma.append([path, None, None])
+    return json.dumps(firma)
+
+
+def recolectar_ejemplos(preguntas_path: str = FUENTES[0],
+                        prompt_path: str = FUENTES[1],
+                        diccionario_path: str = FUENTES[2],
+                        interacciones_path: Optional[str] = FUENTES[3]
+                        ) -> Tuple[List[Tuple[str, str]], Dict[str, str]]:
+    """
+    Reúne pares (texto, accion) de las fuentes del agente:
+      - preguntas y sinónimos de FE_preguntas_respuestas_v3.json,
+      - "ejemplos" del prompt instruccional,
+      - "pregunta_modelo" del diccionario operativo,
+      - interacciones etiquetadas (JSONL con "pregunta" y "accion"), si existen.
+    Devuelve también una pregunta canónica por acción (para reformular).
+    """
+    ejemplos: List[Tuple[str, str]] = []
+    canonicas: Dict[str, str] = {}
+
+    def agregar(texto: Optional[str], accion: Optional[str], canonica: bool = False) -> None:
+        if not texto or not accion:
+            return
+        ejemplos.append((texto, accion))
+        if canonica or accion not in canonicas:
+            canonicas.setdefault(accion, texto)
+
+    def cargar(path: str) -> Dict[str, Any]:
+        try:
+            return cargar_json(path)
+        except Exception as e:
+            print(f"[IntentClassifierV1] Error cargando {path}: {e}")
+            return {}
+
+    for p in cargar(preguntas_path).get("preguntas", []):
+        agregar(p.get("pregunta"), p.get("accion"), canonica=True)
+        for s in p.get("sinonimos", []):
+            agregar(s, p.get("accion"))
+    for e in cargar(prompt_path).get("ejemplos", []):
+        agregar(e.get("pregunta"), e.get("accion"))
+    diccionario = cargar(diccionario_path)
+    for grupo in diccionario.get("contenido", diccionario).values():
+        if isinstance(grupo, dict):
+            for accion, info in grupo.items():
+                if isinstance(info, dict):
+                    agregar(info.get("pregunta_modelo"), accion)
+
+    if interacciones_path and os.path.exists(interacciones_path):
+        with open(interacciones_path, "r", encoding="utf-8") as f:
+            for linea in f:
+                try:
+                    r = json.loads(linea)
+                except ValueError:
+                    continue
+                agregar(r.get("pregunta") or r.get("entrada_usuario"), r.get("accion"))
+    return ejemplos, canonicas
+
+
+class IntentClassifierV1:
+    """
+    Clasificador de intenciones que corre en CPU, sin LLM.
+    - Rasgos: n-gramas de caracteres (3-4, estilo char_wb), palabras y conceptos
+      de dominio detectados por AmbiguityDetectorV1 (sinónimos canonizados).
+    - Modelo: regresión logística multinomial (softmax) con regularización L2,
+      entrenada offline con numpy y guardada en un .npz.
+    - Calibración: temperatura ajustada con predicciones fuera de muestra
+      (validación cruzada), para que "confidence" sea una probabilidad usable
+      como umbral.
+    - Inferencia: suma de filas de la matriz de pesos + softmax (sub-milisegundo).
+    """
+
+    def __init__(self,
+                 vocabulario: List[str],
+                 clases: List[str],
+                 pesos: np.ndarray,
+                 sesgos: np.ndarray,
+                 temperatura: float = 1.0,
+                 canonicas: Optional[Dict[str, str]] = None,
+                 detector: Optional[AmbiguityDetectorV1] = None):
+        self.vocabulario = {f: i for i, f in enumerate(vocabulario)}
+        self.clases = list(clases)
+        self.pesos = pesos
+        self.sesgos = sesgos
+        self.temperatura = temperatura
+        self.canonicas = canonicas or {}
+        self.detector = detector or AmbiguityDetectorV1()
+
+    # ------------------------------------------------------------
+    # Rasgos
+    # ------------------------------------------------------------
+
+    @staticmethod
+    def rasgos(texto: str, detector: AmbiguityDetectorV1,
+               coincidencias: Optional[Dict[str, Any]] = None) -> List[str]:
+        normal = normalizar_texto(texto, quitar_stopwords=True)
+        rasgos = ngramas_caracter(normal) + ["w:" + t for t in normal.split()]
+        coincidencias = coincidencias or detector.detectar(texto)
+        rasgos += ["c:" + c for c in coincidencias.get("conceptos", [])]
+        return rasgos
+
+    def _vector_indices(self, rasgos: List[str]) -> Tuple[np.ndarray, np.ndarray]:
+        conteo: Dict[int, int] = {}
+        for r in rasgos:
+            i = self.vocabulario.get(r)
+            if i is not None:
+                conteo[i] = conteo.get(i, 0) + 1
+        if not conteo:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        idx = np.fromiter(conteo.keys(), dtype=np.int64, count=len(conteo))
+        val = 1.0 + np.log(np.fromiter(conteo.values(), dtype=np.float32, count=len(conteo)))
+        return idx, val / np.linalg.norm(val)
+
+    # ------------------------------------------------------------
+    # Inferencia
+    # ------------------------------------------------------------
+
+    def predecir(self, texto: str, top_k: int = 3,
+                 coincidencias: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+        """Top-k intenciones con probabilidad calibrada: [{"accion", "confidence"}]."""
+        idx, val = self._vector_indices(self.rasgos(texto, self.detector, coincidencias))
+        logits = self.sesgos + (val @ self.pesos[idx] if len(idx) else 0.0)
+        z = logits / self.temperatura
+        z = z - z.max()
+        p = np.exp(z)
+        p /= p.sum()
+        orden = np.argsort(-p)[:top_k]
+        return [{"accion": self.clases[i], "confidence": round(float(p[i]), 4)} for i in orden]
+
+    # ------------------------------------------------------------
+    # Entrenamiento offline
+    # ------------------------------------------------------------
+
+    @staticmethod
+    def _ajustar(X: np.ndarray, y: np.ndarray, n_clases: int, l2: float, iteraciones: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Descenso de gradiente con momento sobre la entropía cruzada + L2."""
+        n, f = X.shape
+        W = np.zeros((f, n_clases), dtype=np.float32)
+        b = np.zeros(n_clases, dtype=np.float32)
+        vW, vb = np.zeros_like(W), np.zeros_like(b)
+        Y = np.eye(n_clases, dtype=np.float32)[y]
+        lr, momento = 2.0, 0.9
+        for _ in range(iteraciones):
+            z = X @ W + b
+            z -= z.max(axis=1, keepdims=True)
+            P = np.exp(z)
+            P /= P.sum(axis=1, keepdims=True)
+            G = (P - Y) / n
+            gW = X.T @ G + l2 * W
+            gb = G.sum(axis=0)
+            vW = momento * vW - lr * gW
+            vb = momento * vb - lr * gb
+            W += vW
+            b += vb
+        return W, b
+
+    @staticmethod
+    def _temperatura(logits: np.ndarray, y: np.ndarray) -> float:
+        """Temperatura que minimiza la log-verosimilitud negativa fuera de muestra."""
+        mejor, mejor_nll = 1.0, math.inf
+        for t in np.linspace(0.25, 5.0, 39):
+            z = logits / t
+            z = z - z.max(axis=1, keepdims=True)
+            logp = z - np.log(np.exp(z).sum(axis=1, keepdims=True))
+            nll = -float(logp[np.arange(len(y)), y].mean())
+            if nll < mejor_nll:
+                mejor, mejor_nll = float(t), nll
+        return mejor
+
+    @classmethod
+    def entrenar(cls,
+                 ejemplos: List[Tuple[str, str]],
+                 canonicas: Optional[Dict[str, str]] = None,
+                 detector: Optional[AmbiguityDetectorV1] = None,
+                 l2: float = 1e-3,
+                 iteraciones: int = 300,
+                 pliegues: int = 5,
+                 semilla: int = 7) -> "IntentClassifierV1":
+        detector = detector or AmbiguityDetectorV1()
+        clases = sorted({a for _, a in ejemplos})
+        id_clase = {c: i for i, c in enumerate(clases)}
+        listas = [cls.rasgos(t, detector) for t, _ in ejemplos]
+        vocab = sorted({r for rs in listas for r in rs})
+        modelo = cls(vocab, clases, np.zeros((len(vocab), len(clases)), dtype=np.float32),
+                     np.zeros(len(clases), dtype=np.float32), 1.0, canonicas, detector)
+
+        X = np.zeros((len(ejemplos), len(vocab)), dtype=np.float32)
+        for fila, rs in enumerate(listas):
+            idx, val = modelo._vector_indices(rs)
+            X[fila, idx] = val
+        y = np.array([id_clase[a] for _, a in ejemplos])
+
+        # Calibración: logits fuera de muestra por validación cruzada
+        rng = np.random.default_rng(semilla)
+        fold = rng.integers(0, pliegues, size=len(y))
+        oof_logits, oof_y = [], []
+        for k in range(pliegues):
+            prueba, train = fold == k, fold != k
+            if not prueba.any() or not train.any():
+                continue
+            W, b = cls._ajustar(X[train], y[train], len(clases), l2, iteraciones)
+            # Solo ejemplos cuya clase se vio en entrenamiento
+            vistas = np.isin(y[prueba], np.unique(y[train]))
+            oof_logits.append((X[prueba] @ W + b)[vistas])
+            oof_y.append(y[prueba][vistas])
+        if oof_logits:
+            modelo.temperatura = cls._temperatura(np.vstack(oof_logits), np.concatenate(oof_y))
+
+        modelo.pesos, modelo.sesgos = cls._ajustar(X, y, len(clases), l2, iteraciones)
+        return modelo
+
+    # ------------------------------------------------------------
+    # Persistencia
+    # ------------------------------------------------------------
+
+    def guardar(self, path: str = MODELO_PATH, firma: str = "") -> None:
+        vocab = [None] * len(self.vocabulario)
+        for f, i in self.vocabulario.items():
+            vocab[i] = f
+        np.savez_compressed(
+            path,
+            vocabulario=np.array(vocab, dtype=str),
+            clases=np.array(self.clases, dtype=str),
+            pesos=self.pesos,
+            sesgos=self.sesgos,
+            temperatura=np.array(self.temperatura),
+            canonicas=np.array(json.dumps(self.canonicas, ensure_ascii=False)),
+            firma=np.array(firma),
+        )
+
+    @classmethod
+    def cargar(cls, path: str = MODELO_PATH, detector: Optional[AmbiguityDetectorV1] = None) -> "IntentClassifierV1":
+        with np.load(path, allow_pickle=False) as d:
+            return cls(
+                vocabulario=d["vocabulario"].tolist(),
+                clases=d["clases"].tolist(),
+                pesos=d["pesos"],
+                sesgos=d["sesgos"],
+                temperatura=float(d["temperatura"]),
+                canonicas=json.loads(str(d["canonicas"])),
+                detector=detector,
+            )
+
+    @staticmethod
+    def firma_guardada(path: str = MODELO_PATH) -> Optional[str]:
+        """Firma de las fuentes con que se entrenó el modelo guardado (None si no hay modelo)."""
+        try:
+            with np.load(path, allow_pickle=False) as d:
+                return str(d["firma"]) if "firma" in d.files else ""
+        except (FileNotFoundError, ValueError, OSError):
+            return None
+
+    @classmethod
+    def cargar_o_entrenar(cls, path: str = MODELO_PATH) -> "IntentClassifierV1":
+        """
+        Carga el modelo si se entrenó con las fuentes actuales (misma firma de
+        mtime/tamaño); si no existe o alguna fuente cambió, lo reentrena y lo guarda.
+        El .npz es un artefacto local: no se versiona.
+        """
+        firma = firma_fuentes()
+        if cls.firma_guardada(path) == firma:
+            return cls.cargar(path)
+        ejemplos, canonicas = recolectar_ejemplos()
+        modelo = cls.entrenar(ejemplos, canonicas)
+        try:
+            modelo.guardar(path, firma)
+        except Exception as e:
+            print(f"[IntentClassifierV1] Error guardando modelo: {e}")
+        return modelo
+
+
+if __name__ == "__main__":
+    # Entrenamiento offline: python -m core.intent_classifier_v1
+    ejemplos, canonicas = recolectar_ejemplos()
+    modelo = IntentClassifierV1.entrenar(ejemplos, canonicas)
+    modelo.guardar(MODELO_PATH, firma_fuentes())
+    print(f"Modelo guardado en {MODELO_PATH}: {len(ejemplos)} ejemplos, "
+          f"{len(modelo.clases)} intenciones, {len(modelo.vocabulario)} rasgos, T={modelo.temperatura:.2f}")
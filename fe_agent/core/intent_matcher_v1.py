@@ -0,0 +1,219 @@
+# ============================================================
+#  core/intent_matcher_v1.py
+#  Atajo determinista: resuelve preguntas conocidas sin invocar al LLM
+#  Autor: Eduardo Sánchez Santana
+#  Fecha: 2025-11-03
+# ============================================================
+
+import math
+import re
+from collections import Counter, defaultdict
+from typing import Any, Dict, List, Optional, Tuple
+
+from core.action_registry_v1 import ActionRegistryV1, get_action_registry
+from core.assets_v1 import cargar_json
+from core.text_normalizer import ngramas_caracter, normalizar_texto
+
+# Palabras (normalizadas) que fijan un período: si la pregunta trae alguna que
+# la pregunta conocida no tiene, sus parámetros fijos ya no valen.
+TERMINOS_PERIODO = {
+    "hoy", "ayer", "manana", "dia", "dias", "diario", "diaria", "semana", "semanas",
+    "semanal", "mes", "meses", "mensual", "mensuales", "bimestre", "trimestre",
+    "trimestres", "trimestral", "semestre", "semestres", "semestral", "ano", "anos",
+    "anio", "anual", "anuales", "pasado", "pasada", "anterior", "actual", "ultimo",
+    "ultima", "ultimos", "ultimas", "proximo", "historico", "historicamente",
+    "enero", "febrero", "marzo", "abril", "mayo", "junio", "julio", "agosto",
+    "septiembre", "setiembre", "octubre", "noviembre", "diciembre",
+}
+_RE_NUMERO = re.compile(r"^\d+$")
+
+
+class IntentMatcherV1:
+    """
+    Índice TF-IDF de n-gramas de caracteres sobre las preguntas conocidas del agente:
+    - preguntas canónicas y sinónimos de FE_preguntas_respuestas_v3.json,
+    - "pregunta_modelo" de cada acción del diccionario operativo,
+    - sinónimos de FE_diccionario_conceptos_v3.json (se canonizan al concepto).
+    Si la mejor coincidencia supera el umbral de confianza, devuelve directamente
+    la acción en el mismo formato que LLMInterpreterV3.interpret.
+    Solo se indexan acciones que existen en el registro (ActionRegistryV1), y el
+    atajo se descarta cuando la pregunta agrega un período o un filtro que la
+    pregunta conocida no tiene (sus parámetros son fijos): eso lo resuelve el LLM.
+    """
+
+    def __init__(self,
+                 preguntas_path: str = "data/FE_preguntas_respuestas_v3.json",
+                 conceptos_path: str = "data/FE_diccionario_conceptos_v3.json",
+                 diccionario_path: str = "data/FE_diccionario_operativo_integrado_v4.json",
+                 umbral: float = 0.72,
+                 margen_minimo: float = 0.05,
+                 registro: Optional[ActionRegistryV1] = None):
+        self.umbral = umbral
+        self.margen_minimo = margen_minimo
+        self.registro = registro or get_action_registry(diccionario_path)
+        self._re_conceptos, self._sinonimo_a_concepto = self._compilar_conceptos(
+            self._load_json(conceptos_path)
+        )
+        self.documentos: List[Dict[str, Any]] = []
+        self._cargar_preguntas(self._load_json(preguntas_path))
+        self._cargar_diccionario(self._load_json(diccionario_path))
+        self._construir_indice()
+
+    # ------------------------------------------------------------
+    # Carga de fuentes
+    # ------------------------------------------------------------
+
+    def _load_json(self, path: str) -> Dict[str, Any]:
+        try:
+            return cargar_json(path)
+        except Exception as e:
+            print(f"[IntentMatcherV1] Error cargando {path}: {e}")
+            return {}
+
+    def _compilar_conceptos(self, data: Dict[str, Any]) -> Tuple[Optional[re.Pattern], Dict[str, str]]:
+        """Compila una única regex que reemplaza cada sinónimo por su concepto canónico."""
+        mapa = {}
+        for c in data.get("conceptos", []):
+            concepto = normalizar_texto(c.get("concepto", ""))
+            for s in c.get("sinonimos", []):
+                s_norm = normalizar_texto(s)
+                if s_norm and s_norm != concepto:
+                    mapa[s_norm] = concepto
+        if not mapa:
+            return None, {}
+        alternativas = sorted(mapa, key=len, reverse=True)
+        patron = re.compile(r"\b(" + "|".join(re.escape(a) for a in alternativas) + r")\b")
+        return patron, mapa
+
+    def _agregar(self, texto: str, accion: str, parametros: Dict[str, Any],
+                 visualizacion: Optional[str], origen: str) -> None:
+        if not texto or not accion or accion not in self.registro:
+            return
+        self.documentos.append({
+            "texto": texto,
+            "accion": accion,
+            "parametros": parametros or {},
+            "visualizacion_sugerida": visualizacion,
+            "origen": origen,
+        })
+
+    def _cargar_preguntas(self, data: Dict[str, Any]) -> None:
+        for p in data.get("preguntas", []):
+            args = (p.get("accion"), p.get("parametros", {}), p.get("visualizacion_sugerida"), p.get("id", ""))
+            self._agregar(p.get("pregunta", ""), *args)
+            for s in p.get("sinonimos", []):
+                self._agregar(s, *args)
+
+    def _cargar_diccionario(self, data: Dict[str, Any]) -> None:
+        grupos = data.get("contenido", data)
+        for grupo in grupos.values():
+            if not isinstance(grupo, dict):
+                continue
+            for accion, info in grupo.items():
+                if isinstance(info, dict) and info.get("pregunta_modelo"):
+                    self._agregar(info["pregunta_modelo"], accion, {}, None, "diccionario_operativo")
+
+    # ------------------------------------------------------------
+    # Índice invertido TF-IDF
+    # ------------------------------------------------------------
+
+    def _canonizar(self, texto: str) -> str:
+        """Normaliza y sustituye sinónimos de dominio por su concepto."""
+        texto = normalizar_texto(texto, quitar_stopwords=True)
+        if self._re_conceptos is not None:
+            texto = self._re_conceptos.sub(lambda m: self._sinonimo_a_concepto[m.group(1)], texto)
+        return texto
+
+    def _vectorizar(self, texto: str) -> Dict[str, float]:
+        """TF sublineal * IDF, normalizado L2. Ignora n-gramas fuera del vocabulario."""
+        tf = Counter(ngramas_caracter(self._canonizar(texto)))
+        vec = {g: (1.0 + math.log(c)) * self.idf[g] for g, c in tf.items() if g in self.idf}
+        norma = math.sqrt(sum(v * v for v in vec.values()))
+        if norma == 0:
+            return {}
+        return {g: v / norma for g, v in vec.items()}
+
+    def _construir_indice(self) -> None:
+        df = Counter()
+        ngramas_docs = []
+        self.vocabulario = set()
+        for d in self.documentos:
+            canonico = self._canonizar(d["texto"])
+            d["palabras"] = frozenset(canonico.split())
+            self.vocabulario.update(d["palabras"])
+            tf = Counter(ngramas_caracter(canonico))
+            ngramas_docs.append(tf)
+            df.update(tf.keys())
+
+        self._raices_vocabulario = {self._raiz(p) for p in self.vocabulario}
+        n = len(self.documentos)
+        self.idf = {g: math.log((1 + n) / (1 + c)) + 1.0 for g, c in df.items()}
+
+        self.postings: Dict[str, List[Tuple[int, float]]] = defaultdict(list)
+        for doc_id, tf in enumerate(ngramas_docs):
+            vec = {g: (1.0 + math.log(c)) * self.idf[g] for g, c in tf.items()}
+            norma = math.sqrt(sum(v * v for v in vec.values())) or 1.0
+            for g, v in vec.items():
+                self.postings[g].append((doc_id, v / norma))
+
+    # ------------------------------------------------------------
+    # Consulta
+    # ------------------------------------------------------------
+
+    def buscar(self, texto: str, top_k: int = 3) -> List[Tuple[float, Dict[str, Any]]]:
+        """Devuelve las mejores coincidencias (similitud coseno, documento)."""
+        puntajes: Dict[int, float] = defaultdict(float)
+        for g, qv in self._vectorizar(texto).items():
+            for doc_id, dv in self.postings.get(g, ()):
+                puntajes[doc_id] += qv * dv
+        mejores = sorted(puntajes.items(), key=lambda x: x[1], reverse=True)[:top_k]
+        return [(score, self.documentos[doc_id]) for doc_id, score in mejores]
+
+    @staticmethod
+    def _raiz(palabra: str) -> str:
+        """Singular aproximado ("ventas" -> "venta", "martillos" -> "martillo")."""
+        if len(palabra) > 4 and palabra.endswith("es"):
+            return palabra[:-2]
+        return palabra[:-1] if len(palabra) > 3 and palabra.endswith("s") else palabra
+
+    def _agrega_modificadores(self, texto: str, doc: Dict[str, Any]) -> bool:
+        """
+        ¿La pregunta trae un período o un filtro que la pregunta conocida no tiene?
+          - período: palabra de TERMINOS_PERIODO o número (año, cantidad de días...),
+          - filtro: palabra que no aparece en ninguna pregunta conocida (p.ej. un
+            producto o cliente concreto); las reformulaciones usan vocabulario conocido.
+        """
+        raices_doc = {self._raiz(p) for p in doc["palabras"]}
+        for palabra in self._canonizar(texto).split():
+            if palabra in doc["palabras"] or self._raiz(palabra) in raices_doc:
+                continue
+            if palabra in TERMINOS_PERIODO or _RE_NUMERO.match(palabra):
+                return True
+            if self._raiz(palabra) not in self._raices_vocabulario:
+                return True
+        return False
+
+    def match(self, texto: str) -> Optional[Dict[str, Any]]:
+        """
+        Devuelve la acción si la coincidencia es confiable; None para delegar al LLM.
+        Exige además un margen sobre la mejor alternativa con una acción distinta.
+        """
+        candidatos = self.buscar(texto, top_k=10)
+        if not candidatos:
+            return None
+        score, doc = candidatos[0]
+        if score < self.umbral:
+            return None
+        rival = next((s for s, d in candidatos[1:] if d["accion"] != doc["accion"]), 0.0)
+        if score - rival < self.margen_minimo:
+            return None
+        if self._agrega_modificadores(texto, doc):
+            return None
+        return {
+            "accion": doc["accion"],
+            "parametros": dict(doc["parametros"]),
+            "visualizacion_sugerida": doc["visualizacion_sugerida"],
+            "origen": "fast_path",
+            "confianza": round(score, 4),
+            "pregunta_coincidente": doc["texto"],
+        }
@@ -0,0 +1,280 @@
+# ============================================================
+#  core/jsonl_log_v1.py
+#  Log JSONL de solo anexado, con escritura en segundo plano
+#  Autor: Eduardo Sánchez Santana
+#  Fecha: 2025-11-05
+# ============================================================
+
+import atexit
+import json
+import os
+import queue
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+# Tamaño de bloque para leer el archivo desde el final en tail().
+_BLOQUE_TAIL = 8192
+
+
+class JSONLLogV1:
+    """
+    Log de trazabilidad en formato JSONL (una línea JSON por registro).
+    - append() solo serializa y encola: nunca toca disco en el hilo del llamador.
+    - Un hilo escritor vacía la cola por lotes con un único write por lote
+      (archivo abierto en O_APPEND) y hace fsync como máximo cada `fsync_cada` s.
+    - Cola acotada: si se llena, el registro se descarta y se contabiliza
+      (la trazabilidad no debe frenar la respuesta al usuario).
+    - Rotación por tamaño y por antigüedad: log.jsonl -> log.jsonl.1 -> ... -> .N
+    - tail(n) lee desde el final del archivo por bloques, sin cargarlo completo,
+      continuando con los archivos rotados si hace falta.
+    """
+
+    def __init__(self,
+                 path: str,
+                 max_cola: int = 10000,
+                 lote_max: int = 256,
+                 intervalo_flush: float = 0.5,
+                 fsync_cada: float = 2.0,
+                 max_bytes: int = 5 * 1024 * 1024,
+                 rotar_cada_segundos: Optional[float] = 24 * 3600,
+                 max_archivos: int = 5):
+        self.path = path
+        self.lote_max = lote_max
+        self.intervalo_flush = intervalo_flush
+        self.fsync_cada = fsync_cada
+        self.max_bytes = max_bytes
+        self.rotar_cada_segundos = rotar_cada_segundos
+        self.max_archivos = max_archivos
+        self.escritos = 0
+        self.descartados = 0
+        self._cola: "queue.Queue" = queue.Queue(maxsize=max_cola)
+        self._fd: Optional[int] = None
+        self._abierto_en = 0.0
+        self._ultimo_fsync = time.monotonic()
+        self._pendiente_fsync = False
+        self._rotacion_lock = threading.Lock()
+        directorio = os.path.dirname(path)
+        if directorio:
+            os.makedirs(directorio, exist_ok=True)
+        self._hilo = threading.Thread(target=self._escritor, name=f"jsonl-log:{os.path.basename(path)}", daemon=True)
+        self._hilo.start()
+
+    # ------------------------------------------------------------
+    # Hilo escritor
+    # ------------------------------------------------------------
+
+    def _abrir(self) -> None:
+        self._fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        self._abierto_en = time.time()
+
+    def _cerrar_fd(self) -> None:
+        if self._fd is not None:
+            if self._pendiente_fsync:
+                os.fsync(self._fd)
+                self._pendiente_fsync = False
+            os.close(self._fd)
+            self._fd = None
+
+    def _debe_rotar(self, bytes_lote: int) -> bool:
+        tamano = os.fstat(self._fd).st_size
+        if tamano and tamano + bytes_lote > self.max_bytes:
+            return True
+        return bool(self.rotar_cada_segundos and tamano
+                    and time.time() - self._abierto_en >= self.rotar_cada_segundos)
+
+    def _rotar(self) -> None:
+        with self._rotacion_lock:
+            self._cerrar_fd()
+            for i in range(self.max_archivos - 1, 0, -1):
+                origen = f"{self.path}.{i}"
+                if os.path.exists(origen):
+                    os.replace(origen, f"{self.path}.{i + 1}")
+            if os.path.exists(self.path):
+                os.replace(self.path, f"{self.path}.1")
+            sobrante = f"{self.path}.{self.max_archivos + 1}"
+            if os.path.exists(sobrante):
+                os.remove(sobrante)
+            self._abrir()
+
+    def _escribir_lote(self, lineas: List[str]) -> None:
+        datos = "".join(lineas).encode("utf-8")
+        if self._fd is None:
+            self._abrir()
+        if self._debe_rotar(len(datos)):
+            self._rotar()
+        os.write(self._fd, datos)
+        self.escritos += len(lineas)
+        self._pendiente_fsync = True
+
+    def _fsync(self, forzar: bool = False) -> None:
+        if self._fd is None or not self._pendiente_fsync:
+            return
+        if forzar or time.monotonic() - self._ultimo_fsync >= self.fsync_cada:
+            os.fsync(self._fd)
+            self._ultimo_fsync = time.monotonic()
+            self._pendiente_fsync = False
+
+    def _escritor(self) -> None:
+        while True:
+            try:
+                item = self._cola.get(timeout=self.intervalo_flush)
+            except queue.Empty:
+                self._fsync_seguro()
+                continue
+
+            lote: List[str] = []
+            marcas: List[threading.Event] = []
+            terminar = False
+            while True:
+                if item is None:
+                    terminar = True
+                elif isinstance(item, threading.Event):
+                    marcas.append(item)
+                else:
+                    lote.append(item)
+                if terminar or len(lote) >= self.lote_max:
+                    break
+                try:
+                    item = self._cola.get_nowait()
+                except queue.Empty:
+                    break
+
+            if lote:
+                try:
+                    self._escribir_lote(lote)
+                except Exception as e:
+                    print(f"[JSONLLogV1] Error escribiendo {self.path}: {e}")
+            self._fsync_seguro(forzar=bool(marcas) or terminar)
+            for marca in marcas:
+                marca.set()
+            if terminar:
+                try:
+                    self._cerrar_fd()
+                except Exception as e:
+                    print(f"[JSONLLogV1] Error cerrando {self.path}: {e}")
+                return
+
+    def _fsync_seguro(self, forzar: bool = False) -> None:
+        try:
+            self._fsync(forzar)
+        except Exception as e:
+            print(f"[JSONLLogV1] Error en fsync de {self.path}: {e}")
+
+    # ------------------------------------------------------------
+    # API pública
+    # ------------------------------------------------------------
+
+    def append(self, registro: Dict[str, Any]) -> bool:
+        """Encola un registro (se serializa ya, para fijar su contenido). False si se descartó."""
+        if not self._hilo.is_alive():
+            self.descartados += 1
+            return False
+        try:
+            linea = json.dumps(registro, ensure_ascii=False, default=str) + "\n"
+            self._cola.put_nowait(linea)
+            return True
+        except queue.Full:
+            self.descartados += 1
+            return False
+        except Exception as e:
+            print(f"[JSONLLogV1] Registro no serializable: {e}")
+            return False
+
+    def flush(self, timeout: float = 5.0) -> bool:
+        """Espera a que todo lo encolado hasta ahora esté escrito y sincronizado en disco."""
+        if not self._hilo.is_alive():
+            return False
+        marca = threading.Event()
+        try:
+            self._cola.put(marca, timeout=timeout)
+        except queue.Full:
+            return False
+        return marca.wait(timeout)
+
+    def close(self, timeout: float = 5.0) -> None:
+        """Vacía la cola, sincroniza y detiene el hilo escritor."""
+        if self._hilo.is_alive():
+            try:
+                self._cola.put(None, timeout=timeout)
+            except queue.Full:
+                print(f"[JSONLLogV1] Cola llena al cerrar {self.path}")
+                return
+            self._hilo.join(timeout)
+
+    def tail(self, n: int = 10) -> List[Dict[str, Any]]:
+        """
+        Últimos n registros (del más antiguo al más reciente), leyendo desde el final
+        de cada archivo. Los registros aún en cola (< intervalo_flush) no se incluyen.
+        """
+        if n <= 0:
+            return []
+        lineas: List[bytes] = []
+        with self._rotacion_lock:
+            archivos = [self.path] + [f"{self.path}.{i}" for i in range(1, self.max_archivos + 1)]
+            for archivo in archivos:
+                faltan = n - len(lineas)
+                if faltan <= 0:
+                    break
+                try:
+                    lineas = self._tail_archivo(archivo, faltan) + lineas
+                except FileNotFoundError:
+                    continue
+        registros = []
+        for linea in lineas:
+            try:
+                registros.append(json.loads(linea))
+            except ValueError:
+                continue  # línea truncada por una escritura interrumpida
+        return registros
+
+    @staticmethod
+    def _tail_archivo(archivo: str, n: int) -> List[bytes]:
+        with open(archivo, "rb") as f:
+            f.seek(0, os.SEEK_END)
+            pos = f.tell()
+            buffer = b""
+            # n+1 saltos garantizan n líneas completas (la primera puede estar partida)
+            while pos > 0 and buffer.count(b"\n") <= n:
+                leer = min(_BLOQUE_TAIL, pos)
+                pos -= leer
+                f.seek(pos)
+                buffer = f.read(leer) + buffer
+        lineas = [l for l in buffer.split(b"\n") if l.strip()]
+        return lineas[-n:]
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "path": self.path,
+            "escritos": self.escritos,
+            "descartados": self.descartados,
+            "en_cola": self._cola.qsize(),
+        }
+
+
+# ------------------------------------------------------------
+# Un escritor por archivo y por proceso
+# ------------------------------------------------------------
+_LOGS: Dict[str, JSONLLogV1] = {}
+_LOGS_LOCK = threading.Lock()
+
+
+def get_log(path: str, **kwargs) -> JSONLLogV1:
+    """
+    Devuelve el log compartido para `path`, creándolo si no existe.
+    Varias sesiones (y componentes) escriben así a través de un único hilo y descriptor.
+    """
+    clave = os.path.abspath(path)
+    with _LOGS_LOCK:
+        log = _LOGS.get(clave)
+        if log is None:
+            log = JSONLLogV1(path, **kwargs)
+            _LOGS[clave] = log
+        return log
+
+
+@atexit.register
+def _cerrar_logs() -> None:
+    with _LOGS_LOCK:
+        for log in _LOGS.values():
+            log.close(timeout=2.0)
@@ -5,9 +5,98 @@
 # ============================================================
 
 import json
-import requests
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
 from datetime import datetime
-from typing import Dict, Any, Optional
+from typing import Deque, Dict, Any, Iterable, Iterator, List, Optional, Tuple, Union, TYPE_CHECKING
+
+from core.assets_v1 import cargar_json
+from core.http_transport import HTTPTransport, get_transport
+from core.tracing_v1 import atributos_ollama, atributos_stream_cortado, get_tracer
+
+if TYPE_CHECKING:
+    from core.intent_cache_v1 import IntentCacheV1
+
+
+class _JSONStreamScanner:
+    """
+    Escáner incremental de texto generado token a token.
+    Detecta el primer objeto JSON de nivel superior balanceado que contenga "accion",
+    respetando strings y caracteres escapados, sin re-analizar lo ya recibido.
+    """
+
+    def __init__(self):
+        self.text = ""
+        self._pos = 0
+        self._depth = 0
+        self._start: Optional[int] = None
+        self._in_string = False
+        self._escape = False
+
+    def feed(self, chunk: str) -> Optional[str]:
+        """Agrega un fragmento y devuelve el JSON completo si ya está disponible."""
+        self.text += chunk
+        while self._pos < len(self.text):
+            ch = self.text[self._pos]
+            i = self._pos
+            self._pos += 1
+
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+                continue
+
+            if ch == '"' and self._start is not None:
+                self._in_string = True
+            elif ch == "{":
+                if self._depth == 0:
+                    self._start = i
+                self._depth += 1
+            elif ch == "}" and self._depth > 0:
+                self._depth -= 1
+                if self._depth == 0 and self._start is not None:
+                    candidato = self.text[self._start:i + 1]
+                    self._start = None
+                    try:
+                        obj = json.loads(candidato)
+                    except json.JSONDecodeError:
+                        continue
+                    if isinstance(obj, dict) and "accion" in obj:
+                        return candidato
+        return None
+
+
+class _LimitadorTasa:
+    """Token bucket compartido entre hilos: como máximo `por_segundo` peticiones por segundo (ráfagas de hasta `capacidad`)."""
+
+    def __init__(self, por_segundo: float, capacidad: Optional[float] = None):
+        self.por_segundo = por_segundo
+        self.capacidad = capacidad or 1.0
+        self._fichas = self.capacidad
+        self._ultimo = time.monotonic()
+        self._lock = threading.Lock()
+
+    def adquirir(self) -> None:
+        while True:
+            with self._lock:
+                ahora = time.monotonic()
+                self._fichas = min(self.capacidad, self._fichas + (ahora - self._ultimo) * self.por_segundo)
+                self._ultimo = ahora
+                if self._fichas >= 1.0:
+                    self._fichas -= 1.0
+                    return
+                espera = (1.0 - self._fichas) / self.por_segundo
+            time.sleep(espera)
+
+
+EntradaLote = Union[str, Tuple[str, Optional[Dict[str, Any]]], Dict[str, Any]]
 
 
 class LLMInterpreterV3:
@@ -20,12 +109,29 @@ class LLMInterpreterV3:
     def __init__(self,
                  llm_url: str = "http://localhost:11434/api/generate",
                  model: str = "gemma:2b",
-                 prompt_file: str = "FE_prompt_instruccional_v2.json"):
+                 prompt_file: str = "FE_prompt_instruccional_v2.json",
+                 prefix_cache: bool = False,
+                 keep_alive: str = "30m",
+                 stream: bool = False,
+                 cache: Optional["IntentCacheV1"] = None,
+                 transport: Optional[HTTPTransport] = None):
         self.llm_url = llm_url
         self.model = model
         self.prompt_file = prompt_file
+        # Modo streaming: corta la generación apenas el JSON con "accion" está completo.
+        self.stream = stream
+        # Caché opcional de intenciones (ver core/intent_cache_v1.py)
+        self.cache = cache
+        self.http = transport or get_transport()
+        # Modo prefijo estático: el preámbulo viaja por el canal "system" de Ollama
+        # y se mantiene idéntico entre turnos para reutilizar la caché KV del modelo.
+        self.prefix_cache = prefix_cache
+        self.keep_alive = keep_alive
         self.prompt_data = self._load_prompt_file()
-        self.session_history = []
+        self._prompt_firma = self._firma_prompt_file()
+        self._static_prefix: Optional[str] = None
+        # Diagnóstico acotado: la instancia puede compartirse entre sesiones
+        self.session_history: Deque[Dict[str, Any]] = deque(maxlen=100)
 
     # ------------------------------------------------------------
     # Utilidades
@@ -34,11 +140,18 @@ class LLMInterpreterV3:
     def _load_prompt_file(self) -> Dict[str, Any]:
         """Carga el archivo JSON que define el comportamiento del intérprete"""
         try:
-            with open(self.prompt_file, "r", encoding="utf-8") as f:
-                return json.load(f)
+            return cargar_json(self.prompt_file)
         except Exception as e:
             raise RuntimeError(f"Error al cargar el archivo de prompt: {e}")
 
+    def _firma_prompt_file(self) -> Tuple[int, int]:
+        """Identifica la versión en disco del archivo de prompt (mtime, tamaño)."""
+        try:
+            st = os.stat(self.prompt_file)
+            return (st.st_mtime_ns, st.st_size)
+        except OSError:
+            return (0, 0)
+
     def _load_examples(self, limit: int = 5) -> str:
         """Selecciona ejemplos representativos para el FT-simulado"""
         ejemplos = self.prompt_data.get("ejemplos", [])[:limit]
@@ -62,12 +175,33 @@ class LLMInterpreterV3:
     # ------------------------------------------------------------
 
     def _build_prompt(self, user_input: str, context: Optional[Dict[str, Any]] = None) -> str:
-        """Construye el prompt completo combinando ontología semántica, contexto y ejemplos"""
-        p = self.prompt_data
-        ejemplos = self._load_examples(limit=6)
-        contexto = self._get_context_summary(context)
+        """
+        Prompt completo en un solo mensaje (sin canal system): el mismo preámbulo
+        estático del modo prefijo seguido de la parte variable del turno.
+        """
+        return f"{self._get_static_prefix()}\n\n{self._build_dynamic_prompt(user_input, context)}"
 
-        prompt = f"""
+    # ------------------------------------------------------------
+    # Modo prefijo estático (reutilización de caché KV)
+    # ------------------------------------------------------------
+
+    def _get_static_prefix(self) -> str:
+        """
+        Devuelve el preámbulo estático (rol, entorno, estructura, ejemplos, instrucciones).
+        Se construye una sola vez por versión del archivo de prompt: si el archivo cambia
+        en disco, se recarga y se regenera; en otro caso se reutiliza el mismo string,
+        byte a byte, para que Ollama reconozca el prefijo y evite re-procesarlo.
+        """
+        firma = self._firma_prompt_file()
+        if firma != self._prompt_firma:
+            self.prompt_data = self._load_prompt_file()
+            self._prompt_firma = firma
+            self._static_prefix = None
+
+        if self._static_prefix is None:
+            p = self.prompt_data
+            ejemplos = self._load_examples(limit=6)
+            prefix = f"""
 ROL Y DESCRIPCIÓN:
 {p["rol"]} — {p["descripcion"]}
 
@@ -86,21 +220,28 @@ INSTRUCCIÓN DE VISUALIZACIÓN:
 EJEMPLOS DE PREGUNTA Y ACCIÓN (Finetuning Simulado):
 {ejemplos}
 
-CONTEXTO DE SESIÓN:
-{contexto}
-
 INSTRUCCIÓN GENERAL:
 {p.get("instruccion_general", "")}
 
-PREGUNTA DEL USUARIO:
-\"{user_input}\"
-
 Tu respuesta debe ser ÚNICAMENTE un JSON válido con el formato:
 {{
   "accion": "string",
   "parametros": {{"clave": "valor"}},
   "visualizacion_sugerida": "string (opcional)"
 }}
+"""
+            self._static_prefix = prefix.strip()
+        return self._static_prefix
+
+    def _build_dynamic_prompt(self, user_input: str, context: Optional[Dict[str, Any]] = None) -> str:
+        """Construye solo la parte variable del turno: contexto de sesión y pregunta."""
+        contexto = self._get_context_summary(context)
+        prompt = f"""
+CONTEXTO DE SESIÓN:
+{contexto}
+
+PREGUNTA DEL USUARIO:
+\"{user_input}\"
 """
         return prompt.strip()
 
@@ -108,20 +249,65 @@ Tu respuesta debe ser ÚNICAMENTE un JSON válido con el formato:
     # Comunicación con el modelo LLM
     # ------------------------------------------------------------
 
-    def _query_llm(self, prompt: str) -> str:
-        """Envía el prompt al modelo y devuelve la respuesta textual"""
+    def _build_payload(self, prompt: str, system: Optional[str], stream: bool) -> Dict[str, Any]:
+        """Arma el cuerpo de la petición a /api/generate"""
         payload = {
             "model": self.model,
             "prompt": prompt,
-            "stream": False
+            "stream": stream
         }
-        try:
-            response = requests.post(self.llm_url, json=payload, timeout=600)
-            response.raise_for_status()
-            result = response.json()
-            return result.get("response", "").strip()
-        except Exception as e:
-            raise RuntimeError(f"Error al comunicarse con el modelo LLM: {e}")
+        if system is not None:
+            payload["system"] = system
+            payload["keep_alive"] = self.keep_alive
+        return payload
+
+    def _query_llm(self, prompt: str, system: Optional[str] = None) -> str:
+        """Envía el prompt al modelo y devuelve la respuesta textual"""
+        payload = self._build_payload(prompt, system, stream=False)
+        with get_tracer().span("llm.generate", **{"llm.model": self.model, "llm.stream": False}) as span:
+            try:
+                response = self.http.post(self.llm_url, json=payload, timeout=600)
+                response.raise_for_status()
+                result = response.json()
+                span.update(**atributos_ollama(result))
+                return result.get("response", "").strip()
+            except Exception as e:
+                raise RuntimeError(f"Error al comunicarse con el modelo LLM: {e}")
+
+    def _query_llm_stream(self, prompt: str, system: Optional[str] = None) -> str:
+        """
+        Variante streaming de _query_llm: lee el flujo NDJSON de Ollama token a token
+        y cierra la conexión (deteniendo la generación) en cuanto aparece un objeto JSON
+        balanceado con "accion". Si el modelo termina sin producirlo, devuelve todo el texto.
+        """
+        payload = self._build_payload(prompt, system, stream=True)
+        scanner = _JSONStreamScanner()
+        with get_tracer().span("llm.generate", **{"llm.model": self.model, "llm.stream": True}) as span:
+            try:
+                with self.http.post(self.llm_url, json=payload, timeout=600, stream=True) as response:
+                    response.raise_for_status()
+                    primer_token_ms = None
+                    for n, line in enumerate(response.iter_lines(decode_unicode=True), start=1):
+                        if not line:
+                            continue
+                        chunk = json.loads(line)
+                        if n == 1:
+                            primer_token_ms = round(span.duracion_parcial_ms(), 3)
+                            span.set("llm.primer_token_ms", primer_token_ms)
+                        span.set("llm.chunks", n)
+                        encontrado = scanner.feed(chunk.get("response", ""))
+                        if encontrado is not None:
+                            # Salir del bloque cierra la conexión y Ollama aborta la generación:
+                            # no llega el chunk `done`, se registra lo medido en el cliente.
+                            span.set("llm.cortado", True)
+                            span.update(**atributos_stream_cortado(n, primer_token_ms, span.duracion_parcial_ms()))
+                            return encontrado
+                        if chunk.get("done"):
+                            span.update(**atributos_ollama(chunk))
+                            break
+                return scanner.text.strip()
+            except Exception as e:
+                raise RuntimeError(f"Error al comunicarse con el modelo LLM: {e}")
 
     # ------------------------------------------------------------
     # Interpretación semántica principal
@@ -129,9 +315,128 @@ Tu respuesta debe ser ÚNICAMENTE un JSON válido con el formato:
 
     def interpret(self, user_input: str, context: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
         """Interpreta la pregunta del usuario en una acción JSON estandarizada"""
-        prompt = self._build_prompt(user_input, context)
-        llm_output = self._query_llm(prompt)
-
+        with get_tracer().span("llm.interpret") as span:
+            cacheado = self._from_cache(user_input, context)
+            span.set("cache_hit", cacheado is not None)
+            if cacheado is not None:
+                span.set("accion", cacheado.get("accion"))
+                return cacheado
+
+            prompt, system = self._build_request(user_input, context)
+            query = self._query_llm_stream if self.stream else self._query_llm
+            llm_output = query(prompt, system=system)
+            parsed = self._parse_output(user_input, context, llm_output)
+            span.set("accion", parsed.get("accion"))
+            return parsed
+
+    def interpret_batch(self,
+                        entradas: Iterable[EntradaLote],
+                        max_workers: int = 4,
+                        max_por_segundo: Optional[float] = None,
+                        max_en_vuelo: Optional[int] = None) -> Iterator[Dict[str, Any]]:
+        """
+        Interpreta muchas preguntas (banco de preguntas, tráfico registrado) contra el LLM.
+        - `entradas`: preguntas sueltas, tuplas (pregunta, contexto) o dicts
+          {"pregunta", "contexto"}; se consumen de forma perezosa.
+        - Pool acotado de `max_workers` hilos y, opcionalmente, un límite de
+          `max_por_segundo` peticiones al endpoint.
+        - Prompts idénticos (misma pregunta y mismos campos de contexto) se envían
+          una sola vez; los duplicados reciben el mismo resultado.
+        - Produce los resultados a medida que terminan (no en orden de entrada):
+          {"indice", "pregunta", "resultado", "error", "latencia_ms", "duplicado"}.
+        """
+        limitador = _LimitadorTasa(max_por_segundo) if max_por_segundo else None
+        max_en_vuelo = max_en_vuelo or max_workers * 2
+
+        def trabajo(pregunta: str, contexto: Optional[Dict[str, Any]]) -> Tuple[Optional[Dict[str, Any]], Optional[str], float]:
+            # contiene() no cuenta en las estadísticas: el get que cuenta es el de interpret
+            if limitador is not None and (self.cache is None or not self.cache.contiene(pregunta, contexto)):
+                limitador.adquirir()
+            t0 = time.perf_counter()
+            try:
+                resultado, error = self.interpret(pregunta, contexto), None
+            except Exception as e:
+                resultado, error = None, str(e)
+            return resultado, error, round((time.perf_counter() - t0) * 1000, 2)
+
+        def item(indice: int, pregunta: str, salida: Tuple[Optional[Dict[str, Any]], Optional[str], float],
+                 duplicado: bool) -> Dict[str, Any]:
+            resultado, error, latencia = salida
+            return {
+                "indice": indice,
+                "pregunta": pregunta,
+                "resultado": json.loads(json.dumps(resultado)) if duplicado and resultado else resultado,
+                "error": error,
+                "latencia_ms": latencia,
+                "duplicado": duplicado,
+            }
+
+        terminados: Dict[str, Tuple[Optional[Dict[str, Any]], Optional[str], float]] = {}
+        # clave -> (future, [(indice, pregunta), ...]); el primero es el original
+        en_vuelo: Dict[str, Tuple[Future, List[Tuple[int, str]]]] = {}
+
+        def cosechar(bloquear: bool) -> Iterator[Dict[str, Any]]:
+            futuros = {f: clave for clave, (f, _) in en_vuelo.items()}
+            if not futuros:
+                return
+            hechos, _ = wait(futuros, timeout=None if bloquear else 0, return_when=FIRST_COMPLETED)
+            for f in hechos:
+                clave = futuros[f]
+                _, esperando = en_vuelo.pop(clave)
+                terminados[clave] = f.result()
+                for n, (indice, pregunta) in enumerate(esperando):
+                    yield item(indice, pregunta, terminados[clave], duplicado=n > 0)
+
+        with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="llm-batch") as pool:
+            for indice, entrada in enumerate(entradas):
+                pregunta, contexto = self._entrada_lote(entrada)
+                clave = self._clave_prompt(pregunta, contexto)
+                if clave in terminados:
+                    yield item(indice, pregunta, terminados[clave], duplicado=True)
+                    continue
+                if clave in en_vuelo:
+                    en_vuelo[clave][1].append((indice, pregunta))
+                    continue
+                while len(en_vuelo) >= max_en_vuelo:
+                    yield from cosechar(bloquear=True)
+                en_vuelo[clave] = (pool.submit(trabajo, pregunta, contexto), [(indice, pregunta)])
+                yield from cosechar(bloquear=False)
+            while en_vuelo:
+                yield from cosechar(bloquear=True)
+
+    @staticmethod
+    def _entrada_lote(entrada: EntradaLote) -> Tuple[str, Optional[Dict[str, Any]]]:
+        if isinstance(entrada, str):
+            return entrada, None
+        if isinstance(entrada, dict):
+            return entrada.get("pregunta", ""), entrada.get("contexto")
+        pregunta, contexto = entrada
+        return pregunta, contexto
+
+    @staticmethod
+    def _clave_prompt(user_input: str, context: Optional[Dict[str, Any]]) -> str:
+        """Identifica el prompt que se enviaría: la pregunta y los campos de contexto que usa _get_context_summary."""
+        campos = ("ultima_accion", "ultima_respuesta", "preferencia_visual", "usuario_id")
+        context = context or {}
+        return json.dumps([user_input] + [context.get(c) for c in campos], ensure_ascii=False, default=str)
+
+    def _from_cache(self, user_input: str, context: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+        """Consulta la caché de intenciones, si está configurada"""
+        if self.cache is None:
+            return None
+        cacheado = self.cache.get(user_input, context)
+        if cacheado is not None:
+            self._registrar_en_sesion(user_input, cacheado)
+        return cacheado
+
+    def _build_request(self, user_input: str, context: Optional[Dict[str, Any]]) -> Tuple[str, Optional[str]]:
+        """Devuelve (prompt, system) según el modo de prefijo configurado"""
+        if self.prefix_cache:
+            return self._build_dynamic_prompt(user_input, context), self._get_static_prefix()
+        return self._build_prompt(user_input, context), None
+
+    def _parse_output(self, user_input: str, context: Optional[Dict[str, Any]], llm_output: str) -> Dict[str, Any]:
+        """Convierte la salida del modelo en la acción estandarizada"""
         try:
             parsed = json.loads(llm_output)
         except json.JSONDecodeError:
@@ -142,22 +447,27 @@ Tu respuesta debe ser ÚNICAMENTE un JSON válido con el formato:
         parsed.setdefault("parametros", {})
         parsed.setdefault("visualizacion_sugerida", None)
 
-        # Actualiza memoria de sesión
+        if self.cache is not None:
+            self.cache.set(user_input, context, parsed)
+
+        self._registrar_en_sesion(user_input, parsed)
+        return parsed
+
+    def _registrar_en_sesion(self, user_input: str, parsed: Dict[str, Any]) -> None:
+        """Actualiza memoria de sesión"""
         self.session_history.append({
             "pregunta": user_input,
             "resultado": parsed,
             "timestamp": datetime.now().isoformat()
         })
 
-        return parsed
-
     # ------------------------------------------------------------
     # Herramientas de diagnóstico
     # ------------------------------------------------------------
 
     def resumen_sesion(self, limit: int = 5) -> str:
         """Devuelve las últimas interacciones de la sesión"""
-        ultimos = self.session_history[-limit:]
+        ultimos = list(self.session_history)[-limit:]
         return json.dumps(ultimos, indent=2, ensure_ascii=False)
 
 
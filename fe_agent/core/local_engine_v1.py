@@ -0,0 +1,562 @@
+# ============================================================
+#  core/local_engine_v1.py
+#  Motor de ejecución local (pandas) para acciones analíticas
+#  Autor: Eduardo Sánchez Santana
+#  Fecha: 2025-11-04
+# ============================================================
+
+import json
+import os
+import re
+import threading
+import time
+from datetime import datetime
+from typing import Any, Callable, Dict, Optional, Tuple
+
+import pandas as pd
+
+from core.action_registry_v1 import get_action_registry
+from core.aggregates_v1 import MaterializedAggregatesV1
+from core.data_schema import TABLAS
+
+class LocalExecutionEngineV1:
+    """
+    Ejecuta localmente las acciones de lectura del diccionario operativo.
+    - Carga una vez las tablas comerciales como DataFrames tipados, desde los CSV
+      o desde un ColumnarDataStoreV1 (snapshots Arrow/Parquet mapeados en memoria).
+    - Implementa las "funcion_python" del diccionario como consultas vectorizadas.
+    - Devuelve el mismo sobre {ok, accion, data, error} que N8NConnectorV3.execute,
+      de modo que n8n pasa a ser opcional para analítica de solo lectura.
+    - Las consultas de totales, rankings y series de ventas/compras se responden
+      desde agregados materializados (MaterializedAggregatesV1), no desde las líneas.
+    - execute() revisa cada `intervalo_revision` segundos si los CSV cambiaron
+      (refresh): con data_store, las filas anexadas solo actualizan los agregados;
+      sin él, se compara la firma (mtime, tamaño) de los CSV y se recarga todo.
+    """
+
+    def __init__(self,
+                 data_dir: str = "data",
+                 diccionario_path: str = "data/FE_diccionario_operativo_integrado_v4.json",
+                 fecha_referencia: Optional[str] = None,
+                 data_store=None,
+                 intervalo_revision: float = 5.0):
+        self.data_dir = data_dir
+        self.data_store = data_store
+        self.intervalo_revision = intervalo_revision
+        self._proxima_revision = time.monotonic() + intervalo_revision
+        self._refresh_lock = threading.Lock()
+        self.fecha_referencia = pd.Timestamp(fecha_referencia) if fecha_referencia else None
+        self.funciones: Dict[str, Callable[[Dict[str, Any]], Dict[str, Any]]] = {
+            "get_total_ventas": self.get_total_ventas,
+            "get_total_compras": self.get_total_compras,
+            "get_margen_global": self.get_margen_global,
+            "get_top_productos_vendidos": self.get_top_productos_vendidos,
+            "get_producto_max_ingreso": self.get_producto_max_ingreso,
+            "get_top_clientes": self.get_top_clientes,
+            "get_top_proveedores": self.get_top_proveedores,
+            "get_ventas_mensuales": self.get_ventas_mensuales,
+            "get_diferencia_unidades": self.get_diferencia_unidades,
+            "get_stock_actual": self.get_stock_actual,
+            "get_margen_por_producto": self.get_margen_por_producto,
+            "get_clientes_por_ciudad": self.get_clientes_por_ciudad,
+            "get_ventas_por_tipo_cliente": self.get_ventas_por_tipo_cliente,
+            "get_ventas_por_dia": self.get_ventas_por_dia,
+            "get_diversidad_productos": self.get_diversidad_productos,
+            "get_ticket_promedio": self.get_ticket_promedio,
+            "get_clientes_inactivos": self.get_clientes_inactivos,
+            "get_margen_global_trimestral": self.get_margen_global_trimestral,
+            "comparar_ventas_trimestres": self.comparar_ventas_trimestres,
+            "analizar_tendencia_ventas_anual": self.analizar_tendencia_ventas_anual,
+            "get_rotacion_inventario": self.get_rotacion_inventario,
+            "get_productos_inmovilizados": self.get_productos_inmovilizados,
+            "get_clientes_estrategicos": self.get_clientes_estrategicos,
+            "analizar_concentracion_proveedores": self.analizar_concentracion_proveedores,
+            "analizar_tendencia_margen": self.analizar_tendencia_margen,
+            "generar_resumen_ejecutivo": self.generar_resumen_ejecutivo,
+            "generar_dashboard_resumen": self.generar_resumen_ejecutivo,
+        }
+        # accion -> funcion_python vía el registro compartido (se actualiza solo si cambia el diccionario)
+        self.registro = get_action_registry(diccionario_path)
+        self.registro.registrar_funciones_locales(self.funciones)
+        self._firma = self._firma_csv()
+        self.tablas = self._load_tables()
+        self._preparar_vistas()
+        self.agregados = self._construir_agregados()
+
+    # ------------------------------------------------------------
+    # Carga de datos
+    # ------------------------------------------------------------
+
+    def _load_tables(self) -> Dict[str, pd.DataFrame]:
+        if self.data_store is not None:
+            return {nombre: self.data_store.to_pandas(nombre) for nombre in TABLAS}
+        tablas = {}
+        for nombre, spec in TABLAS.items():
+            path = os.path.join(self.data_dir, spec["archivo"])
+            try:
+                tablas[nombre] = pd.read_csv(
+                    path,
+                    dtype=spec.get("tipos"),
+                    parse_dates=spec.get("fechas", []),
+                )
+            except Exception as e:
+                print(f"[LocalExecutionEngineV1] Error cargando {path}: {e}")
+                tablas[nombre] = pd.DataFrame(columns=list(spec.get("tipos", {})))
+        return tablas
+
+    def _firma_csv(self) -> Tuple:
+        firma = []
+        for spec in TABLAS.values():
+            try:
+                st = os.stat(os.path.join(self.data_dir, spec["archivo"]))
+                firma.append((st.st_mtime_ns, st.st_size))
+            except OSError:
+                firma.append(None)
+        return tuple(firma)
+
+    def _refrescar_si_toca(self) -> None:
+        """Llama a refresh() como mucho una vez cada `intervalo_revision` segundos."""
+        ahora = time.monotonic()
+        if ahora < self._proxima_revision:
+            return
+        with self._refresh_lock:
+            if ahora < self._proxima_revision:
+                return
+            try:
+                self.refresh()
+            except Exception as e:
+                print(f"[LocalExecutionEngineV1] Error refrescando tablas: {e}")
+            self._proxima_revision = time.monotonic() + self.intervalo_revision
+
+    def refresh(self) -> bool:
+        """Recarga las tablas si los CSV cambiaron (vía el almacén columnar o su firma)."""
+        if self.data_store is None:
+            firma = self._firma_csv()
+            if firma == self._firma:
+                return False
+            self._firma = firma
+            self.tablas = self._load_tables()
+            self._preparar_vistas()
+            self.agregados = self._construir_agregados()
+            return True
+        cambios = self.data_store.refresh()
+        if all(estado == "vigente" for estado in cambios.values()):
+            return False
+        filas_previas = {nombre: len(df) for nombre, df in self.tablas.items()}
+        self.tablas = self._load_tables()
+        self._preparar_vistas()
+        self._actualizar_agregados(cambios, filas_previas)
+        return True
+
+    def _construir_agregados(self) -> Optional[MaterializedAggregatesV1]:
+        try:
+            return MaterializedAggregatesV1(self.tablas)
+        except Exception as e:
+            print(f"[LocalExecutionEngineV1] Error construyendo agregados: {e}")
+            return None
+
+    def _actualizar_agregados(self, cambios: Dict[str, str], filas_previas: Dict[str, int]) -> None:
+        """
+        Si solo se anexaron filas a ventas/compras (y sus detalles), se agregan
+        únicamente las filas nuevas; cualquier otro cambio reconstruye los rollups.
+        """
+        anexables = {"ventas", "detalle_ventas", "compras", "detalle_compras"}
+        modificadas = {n for n, estado in cambios.items() if estado != "vigente"}
+        if (self.agregados is None or not modificadas <= anexables
+                or any(cambios[n] != "anexar" for n in modificadas)):
+            self.agregados = self._construir_agregados()
+            return
+
+        def nuevas(nombre: str) -> pd.DataFrame:
+            return self.tablas[nombre].iloc[filas_previas.get(nombre, 0):]
+
+        if modificadas & {"ventas", "detalle_ventas"}:
+            self.agregados.append_ventas(nuevas("ventas"), nuevas("detalle_ventas"))
+        if modificadas & {"compras", "detalle_compras"}:
+            self.agregados.append_compras(nuevas("compras"), nuevas("detalle_compras"))
+
+    def _preparar_vistas(self) -> None:
+        """Precalcula los joins usados por casi todas las consultas."""
+        t = self.tablas
+        self.lineas_venta = t["detalle_ventas"].merge(
+            t["ventas"][["id_venta", "fecha_venta", "id_cliente"]], on="id_venta", how="left"
+        )
+        self.lineas_compra = t["detalle_compras"].merge(
+            t["compras"][["id_compra", "fecha_compra", "id_proveedor"]], on="id_compra", how="left"
+        )
+        self.lineas_compra["costo"] = self.lineas_compra["cantidad"] * self.lineas_compra["precio_compra_unitario"]
+        self.nombres_producto = t["productos"].set_index("id_producto")["nombre"]
+
+    # ------------------------------------------------------------
+    # Resolución de parámetros
+    # ------------------------------------------------------------
+
+    def _hoy(self) -> pd.Timestamp:
+        return self.fecha_referencia if self.fecha_referencia is not None else pd.Timestamp(datetime.now().date())
+
+    def _rango_periodo(self, periodo: str) -> Tuple[Optional[pd.Timestamp], Optional[pd.Timestamp]]:
+        """
+        Traduce etiquetas como "mes_actual", "2025-Q1" o "2025-03" a [inicio, fin].
+        Un período que no se reconoce lanza ValueError: execute() devuelve ok=False
+        y la acción sigue a n8n, en vez de responder con todo el histórico.
+        """
+        p = re.sub(r"\s+", "_", str(periodo).strip().lower().replace("año", "anio"))
+        p = p.replace("pasado", "anterior")
+        if p in ("historico", "todo", "total"):
+            return None, None
+        hoy = self._hoy()
+        mes = hoy.to_period("M")
+        trimestre = hoy.to_period("Q")
+        relativos = {
+            "mes_actual": mes,
+            "mes_anterior": mes - 1,
+            "trimestre_actual": trimestre,
+            "trimestre_anterior": trimestre - 1,
+            "anio_actual": hoy.to_period("Y"),
+            "anio_anterior": hoy.to_period("Y") - 1,
+        }
+        if p in relativos:
+            per = relativos[p]
+            return per.start_time, per.end_time.normalize()
+        m = re.fullmatch(r"(\d+)_meses", p)
+        if m:
+            return (mes - int(m.group(1)) + 1).start_time, hoy
+        m = re.fullmatch(r"(\d{4})-?(t|q)([1-4])", p)
+        if m:
+            per = pd.Period(f"{m.group(1)}Q{m.group(3)}", freq="Q")
+            return per.start_time, per.end_time.normalize()
+        if re.fullmatch(r"\d{4}(-\d{2})?", p):
+            per = pd.Period(p, freq="M" if "-" in p else "Y")
+            return per.start_time, per.end_time.normalize()
+        raise ValueError(f"período no reconocido: '{periodo}'")
+
+    def _rango(self, p: Dict[str, Any]) -> Tuple[Optional[pd.Timestamp], Optional[pd.Timestamp]]:
+        """Rango de fechas desde fecha_inicio/fecha_fin, rango_fechas o periodo."""
+        inicio, fin = p.get("fecha_inicio"), p.get("fecha_fin")
+        rango = p.get("rango_fechas")
+        if isinstance(rango, dict):
+            inicio, fin = rango.get("inicio") or rango.get("fecha_inicio"), rango.get("fin") or rango.get("fecha_fin")
+        elif isinstance(rango, (list, tuple)) and len(rango) == 2:
+            inicio, fin = rango
+        elif isinstance(rango, str) and rango:
+            partes = re.split(r"\s*(?:/|\ba\b|\bal\b|,)\s*", rango)
+            if len(partes) == 2:
+                inicio, fin = partes
+            else:
+                return self._rango_periodo(rango)
+        if inicio or fin:
+            return (pd.Timestamp(inicio) if inicio else None, pd.Timestamp(fin) if fin else None)
+        if p.get("periodo"):
+            return self._rango_periodo(p["periodo"])
+        return None, None
+
+    @staticmethod
+    def _filtrar(df: pd.DataFrame, columna: str, rango: Tuple[Optional[pd.Timestamp], Optional[pd.Timestamp]]) -> pd.DataFrame:
+        inicio, fin = rango
+        mask = pd.Series(True, index=df.index)
+        if inicio is not None:
+            mask &= df[columna] >= inicio
+        if fin is not None:
+            mask &= df[columna] <= fin
+        return df[mask]
+
+    def _agregado(self, hecho: str, dimensiones, medidas, p: Dict[str, Any]) -> pd.DataFrame:
+        """Consulta el rollup más pequeño que cubre dimensiones + rango de fechas."""
+        desde, hasta = self._rango(p)
+        return self.agregados.consultar(hecho, list(dimensiones), list(medidas), desde, hasta)
+
+    @staticmethod
+    def _n_top(p: Dict[str, Any], default: int = 5) -> int:
+        try:
+            return max(1, int(p.get("n_top", default)))
+        except (TypeError, ValueError):
+            return default
+
+    @staticmethod
+    def _tabla(df: pd.DataFrame, **extra) -> Dict[str, Any]:
+        """Serializa un DataFrame al formato {"tabla": [...]} que espera la app."""
+        df = df.copy()
+        for c in df.columns:
+            if pd.api.types.is_datetime64_any_dtype(df[c]):
+                df[c] = df[c].dt.strftime("%Y-%m-%d")
+            elif isinstance(df[c].dtype, pd.CategoricalDtype):
+                df[c] = df[c].astype(str)
+        data = {"tabla": json.loads(df.to_json(orient="records", force_ascii=False))}
+        data.update(extra)
+        return data
+
+    # ------------------------------------------------------------
+    # API pública
+    # ------------------------------------------------------------
+
+    def supports(self, accion: str) -> bool:
+        return self.registro.ruta(accion) == "motor"
+
+    def execute(self, accion: str, parametros: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """Ejecuta la acción localmente con el mismo sobre que N8NConnectorV3.execute."""
+        resultado = {"ok": False, "accion": accion, "data": None, "error": None, "origen": "local"}
+        self._refrescar_si_toca()
+        entrada = self.registro.get(accion)
+        funcion = entrada["funcion_python"] if entrada is not None else None
+        if funcion not in self.funciones:
+            resultado["error"] = f"La acción '{accion}' no tiene implementación local."
+            return resultado
+        try:
+            resultado.update({"ok": True, "data": self.funciones[funcion](parametros or {})})
+        except Exception as e:
+            resultado["error"] = f"Error ejecutando '{accion}' localmente: {e}"
+        return resultado
+
+    # ------------------------------------------------------------
+    # Acciones operativas
+    # ------------------------------------------------------------
+
+    def get_total_ventas(self, p: Dict[str, Any]) -> Dict[str, Any]:
+        fila = self._agregado("ventas", [], ["monto", "n_ventas"], p).iloc[0]
+        total, n = float(fila["monto"]), int(fila["n_ventas"])
+        return {"valor": total, "n_transacciones": n,
+                "texto": f"El total de ventas del período fue ${total:,.0f} en {n} transacciones."}
+
+    def get_total_compras(self, p: Dict[str, Any]) -> Dict[str, Any]:
+        fila = self._agregado("compras", [], ["monto", "n_compras"], p).iloc[0]
+        total, n = float(fila["monto"]), int(fila["n_compras"])
+        return {"valor": total, "n_ordenes": n,
+                "texto": f"El total de compras del período fue ${total:,.0f} en {n} órdenes."}
+
+    def get_margen_global(self, p: Dict[str, Any]) -> Dict[str, Any]:
+        rango = self._rango(p)
+        ventas = float(self._filtrar(self.tablas["ventas"], "fecha_venta", rango)["total"].sum())
+        compras = float(self._filtrar(self.tablas["compras"], "fecha_compra", rango)["total"].sum())
+        margen = (ventas - compras) / ventas * 100 if ventas else 0.0
+        df = pd.DataFrame({
+            "Indicador": ["Total Ventas", "Total Compras", "Margen Global (%)"],
+            "Valor": [ventas, compras, round(margen, 2)],
+        })
+        return self._tabla(df, valor=round(margen, 2))
+
+    def get_top_productos_vendidos(self, p: Dict[str, Any]) -> Dict[str, Any]:
+        agg = (self._agregado("ventas", ["id_producto"], ["unidades", "monto"], p)
+                   .set_index("id_producto")
+                   .rename(columns={"unidades": "unidades_vendidas", "monto": "total_ventas"})
+                   .nlargest(self._n_top(p), "unidades_vendidas"))
+        agg.insert(0, "producto", self.nombres_producto.reindex(agg.index).values)
+        return self._tabla(agg.reset_index(drop=True))
+
+    def get_producto_max_ingreso(self, p: Dict[str, Any]) -> Dict[str, Any]:
+        ingresos = self._agregado("ventas", ["id_producto"], ["monto"], p).set_index("id_producto")["monto"]
+        if ingresos.empty:
+            return {"texto": "No hay ventas en el período.", "valor": None}
+        pid = ingresos.idxmax()
+        nombre = self.nombres_producto.get(pid, pid)
+        return {"producto": nombre, "valor": float(ingresos[pid]),
+                "texto": f"El producto con mayor ingreso fue '{nombre}', con ${ingresos[pid]:,.0f}."}
+
+    def get_top_clientes(self, p: Dict[str, Any]) -> Dict[str, Any]:
+        agg = (self._agregado("ventas", ["id_cliente"], ["monto", "n_ventas"], p)
+                   .set_index("id_cliente")
+                   .rename(columns={"monto": "total_compras", "n_ventas": "n_compras"})
+                   .nlargest(self._n_top(p), "total_compras"))
+        nombres = self.tablas["clientes"].set_index("id_cliente")["nombre_cliente"]
+        agg.insert(0, "cliente", nombres.reindex(agg.index).values)
+        return self._tabla(agg.reset_index(drop=True))
+
+    def get_top_proveedores(self, p: Dict[str, Any]) -> Dict[str, Any]:
+        agg = (self._agregado("compras", ["id_proveedor"], ["monto", "n_compras"], p)
+                   .set_index("id_proveedor")
+                   .rename(columns={"monto": "total_compras", "n_compras": "n_ordenes"})
+                   .nlargest(self._n_top(p), "total_compras"))
+        nombres = self.tablas["proveedores"].set_index("id_proveedor")["nombre_proveedor"]
+        agg.insert(0, "proveedor", nombres.reindex(agg.index).values)
+        return self._tabla(agg.reset_index(drop=True))
+
+    def get_ventas_mensuales(self, p: Dict[str, Any]) -> Dict[str, Any]:
+        agg = self._agregado("ventas", ["mes"], ["monto", "n_ventas"], p).rename(columns={"monto": "total_ventas"})
+        agg["mes"] = agg["mes"].dt.strftime("%Y-%m")
+        return self._tabla(agg)
+
+    def get_diferencia_unidades(self, p: Dict[str, Any]) -> Dict[str, Any]:
+        rango = self._rango(p)
+        compradas = self._filtrar(self.lineas_compra, "fecha_compra", rango).groupby("id_producto")["cantidad"].sum()
+        vendidas = self._filtrar(self.lineas_venta, "fecha_venta", rango).groupby("id_producto")["cantidad"].sum()
+        df = pd.DataFrame({"unidades_compradas": compradas, "unidades_vendidas": vendidas}).fillna(0).astype("int64")
+        df["diferencia"] = df["unidades_compradas"] - df["unidades_vendidas"]
+        df.insert(0, "producto", self.nombres_producto.reindex(df.index).values)
+        return self._tabla(df.reset_index(drop=True))
+
+    def get_stock_actual(self, p: Dict[str, Any]) -> Dict[str, Any]:
+        prod = self.tablas["productos"].set_index("id_producto")
+        df = pd.DataFrame({
+            "producto": prod["nombre"],
+            "stock": prod["stock"],
+            "unidades_compradas": self.lineas_compra.groupby("id_producto")["cantidad"].sum(),
+            "unidades_vendidas": self.lineas_venta.groupby("id_producto")["cantidad"].sum(),
+        })
+        df[["unidades_compradas", "unidades_vendidas"]] = df[["unidades_compradas", "unidades_vendidas"]].fillna(0).astype("int64")
+        return self._tabla(df.dropna(subset=["producto"]).reset_index(drop=True))
+
+    def _costo_promedio(self) -> pd.Series:
+        g = self.lineas_compra.groupby("id_producto")
+        return g["costo"].sum() / g["cantidad"].sum()
+
+    def get_margen_por_producto(self, p: Dict[str, Any]) -> Dict[str, Any]:
+        agg = (self._agregado("ventas", ["id_producto"], ["unidades", "monto"], p)
+                   .set_index("id_producto")
+                   .rename(columns={"monto": "ingresos"}))
+        agg["costo"] = agg["unidades"] * self._costo_promedio().reindex(agg.index)
+        agg["margen"] = agg["ingresos"] - agg["costo"]
+        agg["margen_pct"] = (agg["margen"] / agg["ingresos"] * 100).round(2)
+        agg.insert(0, "producto", self.nombres_producto.reindex(agg.index).values)
+        return self._tabla(agg.sort_values("margen", ascending=False).reset_index(drop=True))
+
+    def get_clientes_por_ciudad(self, p: Dict[str, Any]) -> Dict[str, Any]:
+        por_cliente = self._agregado("ventas", ["ciudad", "id_cliente"], ["monto"], p)
+        agg = (por_cliente.groupby("ciudad", observed=True)
+                          .agg(n_clientes=("id_cliente", "nunique"), total_ventas=("monto", "sum"))
+                          .sort_values("total_ventas", ascending=False))
+        return self._tabla(agg.reset_index())
+
+    def get_ventas_por_tipo_cliente(self, p: Dict[str, Any]) -> Dict[str, Any]:
+        agg = self._agregado("ventas", ["tipo_cliente"], ["monto", "n_ventas"], p)
+        return self._tabla(agg.rename(columns={"monto": "total_ventas"}))
+
+    def get_ventas_por_dia(self, p: Dict[str, Any]) -> Dict[str, Any]:
+        agg = self._agregado("ventas", ["fecha"], ["monto", "n_ventas"], p)
+        return self._tabla(agg.rename(columns={"monto": "total_ventas"}))
+
+    def get_diversidad_productos(self, p: Dict[str, Any]) -> Dict[str, Any]:
+        lv = self._filtrar(self.lineas_venta, "fecha_venta", self._rango(p))
+        mes = lv["fecha_venta"].dt.to_period("M").astype(str)
+        agg = lv.groupby(mes).agg(productos_distintos=("id_producto", "nunique"),
+                                  lineas=("id_detalle_venta", "count"),
+                                  ventas=("id_venta", "nunique"))
+        agg["productos_por_venta"] = (agg["lineas"] / agg["ventas"]).round(2)
+        return self._tabla(agg.drop(columns="lineas").rename_axis("mes").reset_index())
+
+    def get_ticket_promedio(self, p: Dict[str, Any]) -> Dict[str, Any]:
+        v = self._filtrar(self.tablas["ventas"], "fecha_venta", self._rango(p))
+        agg = v.groupby(v["fecha_venta"].dt.to_period("M").astype(str))["total"].mean().round(0)
+        promedio = float(v["total"].mean()) if len(v) else 0.0
+        return self._tabla(agg.rename("ticket_promedio").rename_axis("mes").reset_index(), valor=round(promedio, 0))
+
+    def get_clientes_inactivos(self, p: Dict[str, Any]) -> Dict[str, Any]:
+        meses = int(p.get("meses_inactividad", 3) or 3)
+        limite = self._hoy() - pd.DateOffset(months=meses)
+        ultima = self.tablas["ventas"].groupby("id_cliente")["fecha_venta"].max()
+        cli = self.tablas["clientes"].set_index("id_cliente")
+        cli = cli.assign(ultima_compra=ultima.reindex(cli.index))
+        inactivos = cli[cli["ultima_compra"].isna() | (cli["ultima_compra"] < limite)]
+        return self._tabla(inactivos[["nombre_cliente", "ciudad", "ultima_compra"]].reset_index())
+
+    # ------------------------------------------------------------
+    # Acciones gerenciales
+    # ------------------------------------------------------------
+
+    def _por_periodo(self, p: Dict[str, Any], freq: str) -> pd.DataFrame:
+        rango = self._rango(p)
+        v = self._filtrar(self.tablas["ventas"], "fecha_venta", rango)
+        c = self._filtrar(self.tablas["compras"], "fecha_compra", rango)
+        df = pd.DataFrame({
+            "ventas": v.groupby(v["fecha_venta"].dt.to_period(freq))["total"].sum(),
+            "compras": c.groupby(c["fecha_compra"].dt.to_period(freq))["total"].sum(),
+        }).fillna(0.0)
+        df["margen"] = df["ventas"] - df["compras"]
+        df["margen_pct"] = (df["margen"] / df["ventas"].where(df["ventas"] != 0) * 100).round(2)
+        df.index = df.index.astype(str)
+        return df
+
+    def get_margen_global_trimestral(self, p: Dict[str, Any]) -> Dict[str, Any]:
+        return self._tabla(self._por_periodo(p, "Q").rename_axis("trimestre").reset_index())
+
+    def analizar_tendencia_margen(self, p: Dict[str, Any]) -> Dict[str, Any]:
+        return self._tabla(self._por_periodo(p, "M").rename_axis("mes").reset_index())
+
+    def comparar_ventas_trimestres(self, p: Dict[str, Any]) -> Dict[str, Any]:
+        filas = []
+        for clave in ("periodo_1", "periodo_2"):
+            etiqueta = p.get(clave)
+            if not etiqueta:
+                continue
+            v = self._filtrar(self.tablas["ventas"], "fecha_venta", self._rango_periodo(etiqueta))
+            filas.append({"periodo": str(etiqueta), "total_ventas": float(v["total"].sum()), "n_ventas": int(len(v))})
+        df = pd.DataFrame(filas, columns=["periodo", "total_ventas", "n_ventas"])
+        extra = {}
+        if len(df) == 2 and df.loc[0, "total_ventas"]:
+            extra["variacion_pct"] = round((df.loc[1, "total_ventas"] / df.loc[0, "total_ventas"] - 1) * 100, 2)
+        return self._tabla(df, **extra)
+
+    def analizar_tendencia_ventas_anual(self, p: Dict[str, Any]) -> Dict[str, Any]:
+        anio = p.get("anio") or p.get("año")
+        rango = self._rango_periodo(str(anio)) if anio else self._rango(p)
+        v = self._filtrar(self.tablas["ventas"], "fecha_venta", rango)
+        agg = v.groupby(v["fecha_venta"].dt.to_period("M"))["total"].sum().rename("total_ventas").to_frame()
+        agg["variacion_pct"] = (agg["total_ventas"].pct_change() * 100).round(2)
+        agg.index = agg.index.astype(str)
+        return self._tabla(agg.rename_axis("mes").reset_index())
+
+    def get_rotacion_inventario(self, p: Dict[str, Any]) -> Dict[str, Any]:
+        lv = self._filtrar(self.lineas_venta, "fecha_venta", self._rango(p))
+        prod = self.tablas["productos"].set_index("id_producto")
+        vendidas = lv.groupby("id_producto")["cantidad"].sum().reindex(prod.index, fill_value=0)
+        # Stock promedio aproximado: punto medio entre stock actual y stock + unidades vendidas.
+        stock_promedio = prod["stock"] + vendidas / 2
+        df = pd.DataFrame({
+            "producto": prod["nombre"],
+            "unidades_vendidas": vendidas,
+            "stock_promedio": stock_promedio,
+            "rotacion": (vendidas / stock_promedio.where(stock_promedio > 0)).round(3),
+        })
+        return self._tabla(df.sort_values("rotacion", ascending=False).reset_index(drop=True))
+
+    def get_productos_inmovilizados(self, p: Dict[str, Any]) -> Dict[str, Any]:
+        meses = int(p.get("meses_inactividad", 3) or 3)
+        limite = self._hoy() - pd.DateOffset(months=meses)
+        ultima = self.lineas_venta.groupby("id_producto")["fecha_venta"].max()
+        prod = self.tablas["productos"].set_index("id_producto")
+        prod = prod.assign(ultima_venta=ultima.reindex(prod.index))
+        quietos = prod[prod["ultima_venta"].isna() | (prod["ultima_venta"] < limite)]
+        return self._tabla(quietos[["nombre", "stock", "ultima_venta"]].reset_index())
+
+    def get_clientes_estrategicos(self, p: Dict[str, Any]) -> Dict[str, Any]:
+        v = self._filtrar(self.tablas["ventas"], "fecha_venta", self._rango(p))
+        agg = v.groupby("id_cliente")["total"].sum().sort_values(ascending=False).rename("total_compras").to_frame()
+        total = agg["total_compras"].sum()
+        agg["participacion_pct"] = (agg["total_compras"] / total * 100).round(2) if total else 0.0
+        agg["acumulado_pct"] = agg["participacion_pct"].cumsum().round(2)
+        # Pareto: clientes que en conjunto explican el 80% de la facturación
+        agg = agg[agg["acumulado_pct"].shift(fill_value=0) < 80]
+        nombres = self.tablas["clientes"].set_index("id_cliente")["nombre_cliente"]
+        agg.insert(0, "cliente", nombres.reindex(agg.index).values)
+        return self._tabla(agg.reset_index(drop=True))
+
+    def analizar_concentracion_proveedores(self, p: Dict[str, Any]) -> Dict[str, Any]:
+        c = self._filtrar(self.tablas["compras"], "fecha_compra", self._rango(p))
+        agg = c.groupby("id_proveedor")["total"].sum().rename("total_compras").to_frame()
+        total = agg["total_compras"].sum()
+        share = agg["total_compras"] / total if total else agg["total_compras"] * 0
+        agg["participacion_pct"] = (share * 100).round(2)
+        nombres = self.tablas["proveedores"].set_index("id_proveedor")["nombre_proveedor"]
+        agg.insert(0, "proveedor", nombres.reindex(agg.index).values)
+        # Índice Herfindahl-Hirschman (0-10.000)
+        hhi = round(float((agg["participacion_pct"] ** 2).sum()), 1)
+        return self._tabla(agg.sort_values("total_compras", ascending=False).reset_index(drop=True), indice_hhi=hhi)
+
+    def generar_resumen_ejecutivo(self, p: Dict[str, Any]) -> Dict[str, Any]:
+        rango = self._rango(p)
+        v = self._filtrar(self.tablas["ventas"], "fecha_venta", rango)
+        c = self._filtrar(self.tablas["compras"], "fecha_compra", rango)
+        lv = self._filtrar(self.lineas_venta, "fecha_venta", rango)
+        ventas, compras = float(v["total"].sum()), float(c["total"].sum())
+        top = lv.groupby("id_producto")["subtotal"].sum()
+        df = pd.DataFrame({
+            "Indicador": ["Total Ventas", "Total Compras", "Margen (%)", "Ticket Promedio",
+                          "Clientes Activos", "Producto Top"],
+            "Valor": [
+                ventas, compras,
+                round((ventas - compras) / ventas * 100, 2) if ventas else 0.0,
+                round(float(v["total"].mean()), 0) if len(v) else 0.0,
+                int(v["id_cliente"].nunique()),
+                self.nombres_producto.get(top.idxmax(), "") if len(top) else "",
+            ],
+        })
+        df["Valor"] = df["Valor"].astype(str)
+        return self._tabla(df)
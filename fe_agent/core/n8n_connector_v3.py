@@ -5,82 +5,201 @@
 #  Fecha: 2025-10-29
 # ============================================================
 
-import json
-import requests
 from datetime import datetime
-from typing import Any, Dict, Optional
+from typing import TYPE_CHECKING, Any, Dict, List, Mapping, Optional, Tuple
 
+from core.action_registry_v1 import ActionRegistryV1, get_action_registry
 from core.fallback_manager import FallbackManager
+from core.http_transport import HTTPTransport, get_transport
+from core.jsonl_log_v1 import get_log
+from core.result_cache_v1 import ResultCacheV1
+from core.tracing_v1 import get_tracer
+
+if TYPE_CHECKING:
+    from core.result_stream_v1 import Progreso, ReceptorTablaV1
+    from core.table_store_v1 import ResultTableStoreV1
+
+
+def _es_ndjson(content_type: str) -> bool:
+    """Respuesta NDJSON (una fila JSON por línea): application/x-ndjson, application/jsonl..."""
+    ct = (content_type or "").lower()
+    return "ndjson" in ct or "jsonl" in ct
+
+
+def _cursor_siguiente(data: Any) -> Optional[str]:
+    """Cursor de la página siguiente en una respuesta paginada {"tabla": [...], "cursor": "..."}."""
+    if isinstance(data, dict) and isinstance(data.get("tabla"), list):
+        cursor = data.get("cursor")
+        return str(cursor) if cursor else None
+    return None
 
 
 class N8NConnectorV3:
     """
     Gestiona la comunicación entre el Agente FE y el motor n8n.
     Incluye:
-    - búsqueda de acciones en el diccionario operativo,
+    - búsqueda O(1) de acciones en el registro compartido (ActionRegistryV1:
+      diccionario operativo + router de webhooks, compilados una vez por proceso),
     - ejecución con manejo de errores controlado,
     - integración con el FallbackManager,
-    - trazabilidad completa (logs locales).
+    - caché opcional de resultados con TTL por acción,
+    - trazabilidad completa (log JSONL local, escrito en segundo plano),
+    - resultados grandes por partes: si el webhook responde NDJSON (una fila
+      por línea) o páginas {"tabla": [...], "cursor": "..."}, las filas se
+      leen por lotes a columnas Arrow y se escriben en el table store a medida
+      que llegan; `data` queda como {"tabla_ref", "total_filas", "columnas", "lotes"}
+      y on_progreso recibe la primera página apenas está disponible.
+      Las respuestas JSON completas se tratan igual que siempre.
     """
 
     def __init__(self,
                  diccionario_path: str = "data/FE_diccionario_operativo_integrado_v4.json",
                  default_url: str = "http://localhost:5678/webhook/",
                  timeout: int = 60,
-                 log_path: str = "data/n8n_logs.json"):
+                 log_path: str = "data/n8n_logs.jsonl",
+                 result_cache: Optional[ResultCacheV1] = None,
+                 transport: Optional[HTTPTransport] = None,
+                 router_path: Optional[str] = "data/FE_action_router.json",
+                 registro: Optional[ActionRegistryV1] = None,
+                 table_store: Optional["ResultTableStoreV1"] = None,
+                 tablas_path: str = "data/result_tables",
+                 max_paginas: int = 1000,
+                 fallback_log: str = "data/fallback_log.jsonl"):
         self.diccionario_path = diccionario_path
         self.default_url = default_url
         self.default_timeout = timeout
         self.log_path = log_path
-        self.fb = FallbackManager()
-        self.diccionario = self._load_diccionario()
+        self.log = get_log(log_path)
+        self.fb = FallbackManager(fallback_log)
+        self.cache = result_cache
+        self.http = transport or get_transport()
+        self.registro = registro or get_action_registry(diccionario_path, router_path, default_url)
+        self.tablas_path = tablas_path
+        self.max_paginas = max_paginas
+        self._table_store = table_store
 
     # ------------------------------------------------------------
     # UTILIDADES INTERNAS
     # ------------------------------------------------------------
 
-    def _load_diccionario(self) -> Dict[str, Any]:
-        """Carga el diccionario operativo con las acciones disponibles."""
-        try:
-            with open(self.diccionario_path, "r", encoding="utf-8") as f:
-                return json.load(f)
-        except Exception as e:
-            print(f"[N8NConnectorV3] Error cargando diccionario: {e}")
-            return {}
-
     def _log_result(self, registro: Dict[str, Any]) -> None:
-        """Guarda un log local de cada ejecución (trazabilidad cognitiva)."""
+        """Registra cada ejecución en el log JSONL (trazabilidad cognitiva), sin bloquear."""
         registro["timestamp"] = datetime.now().isoformat()
+        trace_id = get_tracer().trace_id_actual()
+        if trace_id:
+            registro["trace_id"] = trace_id
+        self.log.append(registro)
+
+    def ultimos_logs(self, n: int = 20) -> List[Dict[str, Any]]:
+        """Últimas n ejecuciones registradas, sin cargar el log completo."""
+        return self.log.tail(n)
+
+    def _find_action(self, accion: str) -> Optional[Mapping[str, Any]]:
+        """Entrada compilada de la acción (endpoint, TTL, inputs), o None si no existe."""
+        return self.registro.get(accion)
+
+    def _store(self) -> "ResultTableStoreV1":
+        # pyarrow se importa recién con el primer resultado por partes
+        if self._table_store is None:
+            from core.table_store_v1 import get_table_store
+            self._table_store = get_table_store(self.tablas_path)
+        return self._table_store
+
+    def _receptor(self, on_progreso: Optional["Progreso"]) -> "ReceptorTablaV1":
+        from core.result_stream_v1 import ReceptorTablaV1
+        return ReceptorTablaV1(self._store().escritor(), on_progreso=on_progreso)
+
+    @staticmethod
+    def _resumen_stream(span, modo: str, receptor: "ReceptorTablaV1") -> None:
+        span.update(stream=modo, filas=receptor.filas, lotes=receptor.escritor.lotes,
+                    primer_lote_ms=receptor.primer_lote_ms)
+
+    def _recibir_ndjson(self, response, on_progreso: Optional["Progreso"], span) -> Dict[str, Any]:
+        """Cuerpo NDJSON leído por bloques (nunca completo en memoria)."""
+        receptor = self._receptor(on_progreso)
         try:
-            logs = []
-            try:
-                with open(self.log_path, "r", encoding="utf-8") as f:
-                    logs = json.load(f)
-            except FileNotFoundError:
-                logs = []
-            logs.append(registro)
-            with open(self.log_path, "w", encoding="utf-8") as f:
-                json.dump(logs[-200:], f, ensure_ascii=False, indent=2)
-        except Exception as e:
-            print(f"[N8NConnectorV3] Error escribiendo log: {e}")
-
-    def _find_action(self, accion: str) -> Optional[Dict[str, Any]]:
-        """Busca una acción en el diccionario operativo."""
+            for chunk in response.iter_content(chunk_size=256 * 1024):
+                receptor.feed(chunk)
+        except Exception:
+            receptor.abortar()
+            raise
+        data = receptor.cerrar()
+        self._resumen_stream(span, "ndjson", receptor)
+        return data
+
+    def _recibir_paginas(self, endpoint: str, parametros: Dict[str, Any], primera: Dict[str, Any],
+                         on_progreso: Optional["Progreso"], span) -> Dict[str, Any]:
+        """Sigue el cursor página a página; cada página se escribe y se descarta."""
+        receptor = self._receptor(on_progreso)
+        pagina, vistos = primera, set()
         try:
-            if accion in self.diccionario.get("acciones", {}):
-                return self.diccionario["acciones"][accion]
+            while True:
+                receptor.agregar_registros(pagina["tabla"])
+                cursor = _cursor_siguiente(pagina)
+                if cursor is None or cursor in vistos or len(vistos) >= self.max_paginas:
+                    break
+                vistos.add(cursor)
+                response = self.http.post(endpoint, json=dict(parametros or {}, cursor=cursor),
+                                          timeout=self.default_timeout)
+                response.raise_for_status()
+                pagina = response.json()
         except Exception:
-            pass
-        return None
+            receptor.abortar()
+            raise
+        data = self._metadatos_pagina(primera)
+        data.update(receptor.cerrar())
+        self._resumen_stream(span, "paginas", receptor)
+        return data
+
+    @staticmethod
+    def _metadatos_pagina(primera: Dict[str, Any]) -> Dict[str, Any]:
+        """Campos de la primera página que no son filas ni cursor (ok, accion, mensaje...)."""
+        return {k: v for k, v in primera.items() if k not in ("tabla", "cursor")}
 
     # ------------------------------------------------------------
     # EJECUCIÓN PRINCIPAL
     # ------------------------------------------------------------
 
-    def execute(self, accion: str, parametros: Dict[str, Any]) -> Dict[str, Any]:
+    def execute(self, accion: str, parametros: Dict[str, Any],
+                on_progreso: Optional["Progreso"] = None) -> Dict[str, Any]:
         """
         Ejecuta una acción del diccionario a través del motor n8n.
         Devuelve respuesta estructurada lista para Streamlit.
+        on_progreso(primera_pagina, filas) se llama por cada lote de un resultado por partes.
+        """
+        with get_tracer().span("n8n.execute", accion=accion) as span:
+            resultado, endpoint, ttl = self._prepare(accion, parametros)
+            if endpoint is None:
+                span.update(cache_hit=bool(resultado.get("ok")), ok=bool(resultado.get("ok")))
+                return resultado
+
+            try:
+                response = self.http.post(endpoint, json=parametros, timeout=self.default_timeout, stream=True)
+                try:
+                    response.raise_for_status()
+                    content_type = response.headers.get("Content-Type", "")
+                    if _es_ndjson(content_type):
+                        data = self._recibir_ndjson(response, on_progreso, span)
+                    elif "json" in content_type:
+                        data = response.json()
+                    else:
+                        data = {"texto": response.text}
+                finally:
+                    response.close()
+                if _cursor_siguiente(data) is not None:
+                    data = self._recibir_paginas(endpoint, parametros, data, on_progreso, span)
+                resultado = self._on_success(resultado, parametros, data, ttl)
+
+            except Exception as e:
+                resultado = self._on_error(resultado, parametros, e)
+            span.update(cache_hit=False, ok=bool(resultado.get("ok")))
+            return resultado
+
+    def _prepare(self, accion: str, parametros: Dict[str, Any]) -> Tuple[Dict[str, Any], Optional[str], int]:
+        """
+        Resuelve la acción antes de llamar al webhook.
+        Devuelve (resultado, endpoint, ttl); endpoint es None cuando el resultado ya es
+        definitivo (acción inexistente o acierto de caché).
         """
         resultado = {"ok": False, "accion": accion, "data": None, "error": None}
         info = self._find_action(accion)
@@ -96,35 +215,46 @@ class N8NConnectorV3:
             )
             resultado.update({"error": error_msg, "data": fb})
             self._log_result(resultado)
-            return resultado
+            return resultado, None, 0
 
-        # Construir URL del webhook
-        endpoint = info.get("webhook_url") or info.get("webhook") or accion
-        if not endpoint.startswith("http"):
-            endpoint = self.default_url.rstrip("/") + f"/{endpoint.lstrip('/')}"
+        # Caché de resultados (TTL declarado por la acción en el diccionario)
+        ttl = info["cache_ttl"]
+        if self.cache is not None and ttl:
+            cacheado = self.cache.get(accion, parametros)
+            if cacheado is not None:
+                if self._tabla_vigente(cacheado):
+                    return cacheado, None, ttl
+                # La tabla referenciada se podó del table store: se ejecuta de nuevo
+                self.cache.descartar(accion, parametros)
 
-        try:
-            response = requests.post(endpoint, json=parametros, timeout=self.default_timeout)
-            response.raise_for_status()
-            content_type = response.headers.get("Content-Type", "")
-            if "json" in content_type:
-                data = response.json()
-            else:
-                data = {"texto": response.text}
-
-            resultado.update({"ok": True, "data": data})
-            self._log_result(resultado)
-            return resultado
+        # URL del webhook ya resuelta en el registro
+        return resultado, info["endpoint"], ttl
 
-        except Exception as e:
-            error_msg = f"Error ejecutando '{accion}': {e}"
-            fb = self.fb.handle(
-                user_input=f"(interno) ejecución de '{accion}'",
-                motivo=str(e),
-                tipo="n8n",
-                accion=accion,
-                parametros=parametros
-            )
-            resultado.update({"error": error_msg, "data": fb})
-            self._log_result(resultado)
-            return resultado
+    def _tabla_vigente(self, resultado: Dict[str, Any]) -> bool:
+        """Un resultado cacheado por referencia solo sirve si la tabla sigue en el table store."""
+        data = resultado.get("data")
+        if isinstance(data, dict) and data.get("tabla_ref"):
+            return self._store().contiene(data["tabla_ref"])
+        return True
+
+    def _on_success(self, resultado: Dict[str, Any], parametros: Dict[str, Any],
+                    data: Any, ttl: int) -> Dict[str, Any]:
+        resultado.update({"ok": True, "data": data})
+        self._log_result(resultado)
+        if self.cache is not None:
+            self.cache.set(resultado["accion"], parametros, resultado, ttl)
+        return resultado
+
+    def _on_error(self, resultado: Dict[str, Any], parametros: Dict[str, Any], e: Exception) -> Dict[str, Any]:
+        accion = resultado["accion"]
+        error_msg = f"Error ejecutando '{accion}': {e}"
+        fb = self.fb.handle(
+            user_input=f"(interno) ejecución de '{accion}'",
+            motivo=str(e),
+            tipo="n8n",
+            accion=accion,
+            parametros=parametros
+        )
+        resultado.update({"error": error_msg, "data": fb})
+        self._log_result(resultado)
+        return resultado
@@ -0,0 +1,190 @@
+# ============================================================
+#  core/plot_reduction_v1.py
+#  Reducción de datos antes de graficar (LTTB, min-max, tramos, top-N + "Otros")
+#  Autor: Eduardo Sánchez Santana
+#  Fecha: 2025-11-08
+# ============================================================
+
+from typing import Any, Dict, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+ETIQUETA_OTROS = "Otros"
+
+# Máximo de elementos que se envían al navegador por tipo de gráfico
+MAX_PUNTOS = 1000      # línea / área
+MAX_BARRAS = 30        # barras / columnas
+MAX_PORCIONES = 8      # torta
+# Por encima de estos puntos, las líneas de Plotly se dibujan con WebGL (scattergl)
+UMBRAL_WEBGL = 500
+
+
+def _eje_x(df: pd.DataFrame) -> np.ndarray:
+    """Primera columna como eje numérico (fechas -> ns); si no es numérica, la posición."""
+    x = df.iloc[:, 0]
+    if pd.api.types.is_datetime64_any_dtype(x):
+        return x.to_numpy(dtype="datetime64[ns]").astype(np.int64).astype(np.float64)
+    if pd.api.types.is_numeric_dtype(x):
+        return x.to_numpy(dtype=np.float64)
+    return np.arange(len(x), dtype=np.float64)
+
+
+def _serie_valor(df: pd.DataFrame) -> Optional[str]:
+    """Primera columna numérica después de la etiqueta (la que se grafica)."""
+    for col in df.columns[1:]:
+        if pd.api.types.is_numeric_dtype(df[col]):
+            return col
+    return None
+
+
+def es_secuencia(df: pd.DataFrame) -> bool:
+    """
+    True si la etiqueta es un eje ordenado (fechas, períodos "2025-01", números
+    crecientes): el orden de las filas es información y no debe reordenarse.
+    """
+    x = df.iloc[:, 0]
+    if pd.api.types.is_datetime64_any_dtype(x) or isinstance(x.dtype, pd.PeriodDtype):
+        return True
+    if pd.api.types.is_numeric_dtype(x):
+        return bool(x.is_monotonic_increasing or x.is_monotonic_decreasing)
+    if not (pd.api.types.is_object_dtype(x) or pd.api.types.is_string_dtype(x)):
+        return False
+    texto = x.dropna().astype(str)
+    if texto.empty or not texto.str.contains(r"\d", regex=True).all():
+        return False
+    fechas = pd.to_datetime(texto, errors="coerce", format="mixed")
+    return bool(fechas.notna().all() and (fechas.is_monotonic_increasing or fechas.is_monotonic_decreasing))
+
+
+def lttb(x: np.ndarray, y: np.ndarray, umbral: int) -> np.ndarray:
+    """
+    Largest-Triangle-Three-Buckets: índices de `umbral` puntos que conservan la
+    forma visual de la serie (picos incluidos). Primer y último punto se conservan.
+    """
+    n = len(y)
+    if umbral >= n or umbral < 3:
+        return np.arange(n)
+    y = np.nan_to_num(y.astype(np.float64))
+    indices = np.empty(umbral, dtype=np.int64)
+    indices[0], indices[-1] = 0, n - 1
+    limites = np.linspace(1, n - 1, umbral - 1).astype(np.int64)
+    a = 0
+    for i in range(umbral - 2):
+        ini, fin = limites[i], limites[i + 1]
+        # Punto promedio del bucket siguiente
+        sig_ini, sig_fin = fin, (limites[i + 2] if i + 2 < len(limites) else n)
+        cx, cy = x[sig_ini:sig_fin].mean(), y[sig_ini:sig_fin].mean()
+        # Área del triángulo (a, candidato, promedio siguiente) para cada candidato
+        areas = np.abs((x[a] - cx) * (y[ini:fin] - y[a]) - (x[a] - x[ini:fin]) * (cy - y[a]))
+        a = ini + int(areas.argmax())
+        indices[i + 1] = a
+    return indices
+
+
+def minmax(y: np.ndarray, buckets: int) -> np.ndarray:
+    """Índices del mínimo y el máximo de cada bucket (conserva la envolvente; 2 puntos por bucket)."""
+    n = len(y)
+    if buckets * 2 >= n or buckets < 1:
+        return np.arange(n)
+    y = np.nan_to_num(y.astype(np.float64))
+    limites = np.linspace(0, n, buckets + 1).astype(np.int64)
+    inicios = limites[:-1]
+    # reduceat sobre los valores y sus posiciones: argmin/argmax vectorizados por bucket
+    orden_min = np.minimum.reduceat(y, inicios)
+    orden_max = np.maximum.reduceat(y, inicios)
+    bucket = np.repeat(np.arange(buckets), np.diff(limites))
+    es_min = y == orden_min[bucket]
+    es_max = y == orden_max[bucket]
+    primero_min = np.full(buckets, -1, dtype=np.int64)
+    primero_max = np.full(buckets, -1, dtype=np.int64)
+    posiciones = np.arange(n)
+    # Primera aparición por bucket (recorrido inverso: la última escritura gana)
+    primero_min[bucket[es_min][::-1]] = posiciones[es_min][::-1]
+    primero_max[bucket[es_max][::-1]] = posiciones[es_max][::-1]
+    return np.unique(np.concatenate([primero_min, primero_max, [0, n - 1]]))
+
+
+def tramos(df: pd.DataFrame, n: int) -> pd.DataFrame:
+    """
+    Agrupa filas consecutivas en n tramos (re-muestreo de un eje ordenado):
+    las columnas numéricas se suman y la etiqueta es "primera – última".
+    Conserva el orden y no descarta ningún período.
+    """
+    if len(df) <= n:
+        return df
+    etiqueta = df.columns[0]
+    tramo = np.repeat(np.arange(n), np.diff(np.linspace(0, len(df), n + 1).astype(np.int64)))
+    grupos = df.groupby(tramo, sort=True)
+    numericas = [c for c in df.columns[1:] if pd.api.types.is_numeric_dtype(df[c])]
+    reducido = grupos[numericas].sum(min_count=1) if numericas else pd.DataFrame(index=range(n))
+    primeras = grupos[etiqueta].first().astype(str)
+    ultimas = grupos[etiqueta].last().astype(str)
+    reducido.insert(0, etiqueta, primeras.where(primeras == ultimas, primeras + " – " + ultimas))
+    return reducido.reset_index(drop=True)
+
+
+def top_n(df: pd.DataFrame, n: int, valor: Optional[str] = None) -> pd.DataFrame:
+    """
+    Las n-1 categorías con más valor y el resto sumado en una fila "Otros".
+    Las categorías conservadas mantienen el orden original de la tabla.
+    """
+    valor = valor or _serie_valor(df)
+    if valor is None or len(df) <= n:
+        return df
+    orden = df[valor].fillna(0).to_numpy().argsort(kind="stable")[::-1]
+    top, resto = df.iloc[np.sort(orden[:n - 1])], df.iloc[orden[n - 1:]]
+    otros = {col: None for col in df.columns}
+    otros[df.columns[0]] = f"{ETIQUETA_OTROS} ({len(resto)})"
+    for col in df.columns[1:]:
+        if pd.api.types.is_numeric_dtype(df[col]):
+            otros[col] = resto[col].sum()
+    reducido = pd.concat([top, pd.DataFrame([otros])], ignore_index=True)
+    # Etiquetas como texto: "Otros" convive con categorías numéricas (Arrow exige un tipo)
+    reducido[df.columns[0]] = reducido[df.columns[0]].astype(str)
+    return reducido
+
+
+def metodo_reduccion(tipo: Optional[str], filas: int,
+                     df: Optional[pd.DataFrame] = None) -> Optional[str]:
+    """
+    Método que se aplicará a una tabla de `filas` filas para el tipo canónico
+    (None: se grafica entera). Con `df`, las barras sobre un eje ordenado se
+    reducen por tramos en lugar de top-N.
+    """
+    if tipo == "linea" and filas > MAX_PUNTOS:
+        return "lttb"
+    if tipo == "area" and filas > MAX_PUNTOS:
+        return "minmax"
+    if tipo == "torta" and filas > MAX_PORCIONES:
+        return "top_n"
+    if tipo in ("barras", "columnas") and filas > MAX_BARRAS:
+        return "tramos" if df is not None and es_secuencia(df) else "top_n"
+    return None
+
+
+def reducir(df: pd.DataFrame, tipo: Optional[str]) -> Tuple[pd.DataFrame, Dict[str, Any]]:
+    """
+    Tabla a graficar según el tipo canónico ("linea", "area", "barras",
+    "columnas", "torta"). Nunca modifica `df`: la tabla original sigue
+    disponible (exportación, tabla mostrada). Devuelve (tabla, info).
+    """
+    info = {"filas_originales": len(df), "filas": len(df), "metodo": None}
+    metodo = metodo_reduccion(tipo, len(df), df)
+    valor = _serie_valor(df)
+    if metodo is None or valor is None:
+        return df, info
+
+    if metodo == "lttb":
+        y = df[valor].to_numpy(dtype=np.float64, na_value=np.nan)
+        reducido = df.iloc[lttb(_eje_x(df), y, MAX_PUNTOS)].reset_index(drop=True)
+    elif metodo == "minmax":
+        y = df[valor].to_numpy(dtype=np.float64, na_value=np.nan)
+        reducido = df.iloc[minmax(y, MAX_PUNTOS // 2)].reset_index(drop=True)
+    elif metodo == "tramos":
+        reducido = tramos(df, MAX_BARRAS)
+    else:
+        reducido = top_n(df, MAX_PORCIONES if tipo == "torta" else MAX_BARRAS, valor)
+
+    info.update(filas=len(reducido), metodo=metodo)
+    return reducido, info
@@ -5,24 +5,57 @@
 #  Fecha: 2025-11-01
 # ============================================================
 
+from __future__ import annotations
+
+import io
+import json
+from concurrent.futures import Future
+from typing import TYPE_CHECKING, Iterable, Optional
+
 import streamlit as st
-import pandas as pd
-import matplotlib.pyplot as plt
-import plotly.express as px
+
+from core.figure_cache_v1 import Figura, FigureCacheV1, get_figure_cache, huella_tabla
+from core.tracing_v1 import get_tracer
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+# matplotlib (~0.4 s) y plotly.express (~0.5 s) se importan recién la
+# primera vez que se usa su backend; quien grafica con Streamlit nunca los paga.
+
+_TITULOS = {"barras": "Barras", "linea": "Línea", "torta": "Torta", "columnas": "Columnas"}
 
 
 class VisualizationRenderer:
     """
     Renderiza tablas y gráficos según el tipo sugerido o preferencia del usuario.
-    Compatible con Streamlit, Matplotlib y Plotly.
+    Compatible con Streamlit, Matplotlib y Plotly (importados al primer uso).
+    - Matplotlib se usa con la API orientada a objetos sobre Agg (Figure +
+      FigureCanvasAgg, sin el estado global de pyplot) y produce un PNG;
+      Plotly produce el JSON de la figura.
+    - Las figuras se construyen en un pool de hilos y se guardan en un LRU por
+      (huella de la tabla, tipo, backend): re-mostrar un resultado o alternar
+      el tipo de gráfico ya precalentado no vuelve a construir nada.
+    - Antes de graficar, las tablas grandes se reducen (core/plot_reduction_v1):
+      LTTB / min-max en línea y área, tramos consecutivos en barras sobre un
+      eje ordenado (meses, fechas), top-N + "Otros" en torta y en el resto de
+      barras y columnas; las líneas largas de Plotly usan WebGL. La tabla original no
+      se toca (sigue siendo la que se muestra y se exporta).
     """
 
-    def __init__(self):
+    def __init__(self, cache: Optional[FigureCacheV1] = None):
         self.default_backend = "streamlit"
+        # Sin caché explícita se usa la del proceso: renderers por sesión no crean pools propios
+        self.cache = cache or get_figure_cache()
 
     # ------------------------------------------------------------
     def render(self, df: pd.DataFrame, tipo: str, backend: str = None):
         """Renderiza un gráfico a partir del tipo especificado."""
+        with get_tracer().span("render", tipo=tipo, backend=backend or self.default_backend,
+                               filas=len(df) if df is not None else 0):
+            self._render(df, tipo, backend)
+
+    def _render(self, df: pd.DataFrame, tipo: str, backend: str = None):
         tipo = (tipo or "").lower().strip()
         backend = backend or self.default_backend
 
@@ -34,6 +67,7 @@ class VisualizationRenderer:
             backend = "streamlit"
 
         # Normaliza DataFrame para gráficos
+        import pandas as pd
         if not isinstance(df, pd.DataFrame):
             df = pd.DataFrame(df)
         if len(df.columns) < 2:
@@ -41,70 +75,188 @@ class VisualizationRenderer:
             st.dataframe(df)
             return
 
-        # Enrutamiento
+        # Tablas grandes: se avisa que el gráfico es una reducción
+        from core.plot_reduction_v1 import metodo_reduccion
+        canonico = self._tipo_grafico(tipo, backend)
+        metodo = metodo_reduccion(canonico, len(df), df)
+        if metodo is not None:
+            st.caption(f"Gráfico reducido ({metodo}) a partir de {len(df):,} filas; "
+                       "la tabla completa se conserva para exportar.")
+
+        # Enrutamiento (la huella de la tabla se calcula una sola vez por render)
         if backend == "streamlit":
             self._render_streamlit(df, tipo)
         elif backend == "matplotlib":
-            self._render_matplotlib(df, tipo)
+            self._render_matplotlib(df, tipo, self._huella(df))
         elif backend == "plotly":
-            self._render_plotly(df, tipo)
+            self._render_plotly(df, tipo, self._huella(df))
+
+    def precalentar(self, df: pd.DataFrame, tipos: Iterable[str], backend: str) -> None:
+        """Encola en el pool las figuras de otros tipos para que alternarlos sea instantáneo."""
+        if backend not in ("matplotlib", "plotly") or df is None or df.empty or len(df.columns) < 2:
+            return
+        huella = self._huella(df)
+        if huella is None:
+            return
+        for tipo in tipos:
+            canonico = self._tipo_grafico((tipo or "").lower().strip(), backend)
+            if canonico is not None:
+                self._figura(df, canonico, backend, huella)
 
     # ------------------------------------------------------------
-    # Métodos internos
+    # Figuras (pool + caché)
     # ------------------------------------------------------------
-    def _render_streamlit(self, df: pd.DataFrame, tipo: str):
-        if "barra" in tipo:
-            st.bar_chart(df.set_index(df.columns[0]))
-        elif "línea" in tipo or "linea" in tipo:
-            st.line_chart(df.set_index(df.columns[0]))
-        elif "área" in tipo:
-            st.area_chart(df.set_index(df.columns[0]))
-        else:
-            st.dataframe(df)
+    @staticmethod
+    def _tipo_grafico(tipo: str, backend: str) -> Optional[str]:
+        """Tipo canónico que sabe dibujar el backend (None: se muestra la tabla)."""
+        if backend == "streamlit":
+            if "barra" in tipo:
+                return "barras"
+            if "línea" in tipo or "linea" in tipo:
+                return "linea"
+            if "área" in tipo:
+                return "area"
+            return None
+        if backend == "matplotlib":
+            if "torta" in tipo or "pie" in tipo:
+                return "torta"
+            if "columna" in tipo:
+                return "columnas"
+            return None
+        if "barras" in tipo or "bar" in tipo:
+            return "barras"
+        if "línea" in tipo or "linea" in tipo:
+            return "linea"
+        if "torta" in tipo or "pie" in tipo:
+            return "torta"
+        if "columna" in tipo:
+            return "columnas"
+        return None
 
-    def _render_matplotlib(self, df: pd.DataFrame, tipo: str):
-        fig, ax = plt.subplots(figsize=(6, 4))
+    @staticmethod
+    def _reducir(df: pd.DataFrame, tipo: str) -> pd.DataFrame:
+        from core.plot_reduction_v1 import reducir
 
-        # Gráfico de torta
-        if "torta" in tipo or "pie" in tipo:
+        with get_tracer().span("render.reduccion", tipo=tipo) as span:
+            reducido, info = reducir(df, tipo)
+            span.update(**info)
+        return reducido
+
+    @staticmethod
+    def _huella(df: pd.DataFrame) -> Optional[str]:
+        """Huella para la caché; None si la tabla no se puede hashear (celdas con listas o dicts)."""
+        try:
+            return huella_tabla(df)
+        except (TypeError, ValueError) as e:
+            print(f"[VisualizationRenderer] Tabla sin huella, se grafica sin caché: {e}")
+            return None
+
+    def _figura(self, df: pd.DataFrame, tipo: str, backend: str, huella: Optional[str]) -> Future:
+        # La clave usa la tabla original; la reducción corre dentro de la tarea del
+        # pool, así un acierto de caché no vuelve a recorrer la tabla completa.
+        construir = self._png_matplotlib if backend == "matplotlib" else self._json_plotly
+        if huella is None:
+            futuro: Future = Future()
             try:
-                df.set_index(df.columns[0])[df.columns[1]].plot.pie(
-                    autopct="%1.1f%%", ax=ax, legend=False
-                )
-                ax.set_ylabel("")
-                st.pyplot(fig)
+                futuro.set_result(construir(self._reducir(df, tipo), tipo))
             except Exception as e:
-                st.warning(f"No se pudo graficar torta: {e}")
+                futuro.set_exception(e)
+            return futuro
+        return self.cache.obtener((huella, tipo, backend), lambda: construir(self._reducir(df, tipo), tipo))
 
-        # Gráfico de columnas comparativas
-        elif "columna" in tipo or "columnas" in tipo:
-            df.plot(kind="bar", ax=ax)
-            ax.set_xlabel(df.columns[0])
-            ax.set_ylabel(df.columns[1])
-            ax.set_title("Comparación de valores")
-            st.pyplot(fig)
+    @staticmethod
+    def _png_matplotlib(df: pd.DataFrame, tipo: str) -> Figura:
+        from matplotlib.backends.backend_agg import FigureCanvasAgg
+        from matplotlib.figure import Figure
 
-        else:
-            st.dataframe(df)
+        with get_tracer().span("render.figura", backend="matplotlib", tipo=tipo):
+            fig = Figure(figsize=(6, 4))
+            FigureCanvasAgg(fig)
+            try:
+                ax = fig.subplots()
+                etiquetas = df.iloc[:, 0].astype(str)
+                if tipo == "torta":
+                    ax.pie(df.iloc[:, 1], labels=etiquetas, autopct="%1.1f%%")
+                    ax.set_ylabel("")
+                else:
+                    # Columnas comparativas: una serie por columna numérica
+                    numericas = df.iloc[:, 1:].select_dtypes("number")
+                    ancho = 0.8 / max(len(numericas.columns), 1)
+                    for i, col in enumerate(numericas.columns):
+                        posiciones = [x + i * ancho for x in range(len(df))]
+                        ax.bar(posiciones, numericas[col], width=ancho, label=str(col))
+                    ax.set_xticks([x + ancho * (len(numericas.columns) - 1) / 2 for x in range(len(df))])
+                    ax.set_xticklabels(etiquetas, rotation=90)
+                    ax.legend()
+                    ax.set_xlabel(df.columns[0])
+                    ax.set_ylabel(df.columns[1])
+                    ax.set_title("Comparación de valores")
+                buffer = io.BytesIO()
+                fig.savefig(buffer, format="png", bbox_inches="tight")
+                return buffer.getvalue()
+            finally:
+                # Liberación explícita: la figura no queda registrada en pyplot ni retenida
+                fig.clear()
 
-    def _render_plotly(self, df: pd.DataFrame, tipo: str):
-        try:
-            if "barras" in tipo or "bar" in tipo:
-                fig = px.bar(df, x=df.columns[0], y=df.columns[1], text_auto=True)
-            elif "línea" in tipo or "linea" in tipo:
-                fig = px.line(df, x=df.columns[0], y=df.columns[1], markers=True)
-            elif "torta" in tipo or "pie" in tipo:
-                fig = px.pie(df, names=df.columns[0], values=df.columns[1], hole=0.2)
-            elif "columna" in tipo or "columnas" in tipo:
-                fig = px.bar(df, x=df.columns[0], y=df.columns[1], barmode="group")
+    @staticmethod
+    def _json_plotly(df: pd.DataFrame, tipo: str) -> Figura:
+        import plotly.express as px
+
+        from core.plot_reduction_v1 import UMBRAL_WEBGL
+
+        with get_tracer().span("render.figura", backend="plotly", tipo=tipo):
+            x, y = df.columns[0], df.columns[1]
+            if tipo == "barras":
+                fig = px.bar(df, x=x, y=y, text_auto=True)
+            elif tipo == "linea":
+                # Muchos puntos: trazas WebGL (scattergl) y sin marcadores
+                webgl = len(df) > UMBRAL_WEBGL
+                fig = px.line(df, x=x, y=y, markers=not webgl,
+                              render_mode="webgl" if webgl else "auto")
+            elif tipo == "torta":
+                fig = px.pie(df, names=x, values=y, hole=0.2)
             else:
-                st.dataframe(df)
-                return
+                fig = px.bar(df, x=x, y=y, barmode="group")
             fig.update_layout(
                 template="plotly_white",
-                title=f"{tipo.title()} interactivo",
+                title=f"{_TITULOS.get(tipo, tipo.title())} interactivo",
                 margin=dict(l=20, r=20, t=40, b=20),
             )
-            st.plotly_chart(fig, use_container_width=True)
+            return fig.to_json()
+
+    # ------------------------------------------------------------
+    # Métodos internos
+    # ------------------------------------------------------------
+    def _render_streamlit(self, df: pd.DataFrame, tipo: str):
+        canonico = self._tipo_grafico(tipo, "streamlit")
+        if canonico is None:
+            st.dataframe(df)
+            return
+        datos = self._reducir(df, canonico).set_index(df.columns[0])
+        if canonico == "barras":
+            st.bar_chart(datos)
+        elif canonico == "linea":
+            st.line_chart(datos)
+        else:
+            st.area_chart(datos)
+
+    def _render_matplotlib(self, df: pd.DataFrame, tipo: str, huella: Optional[str]):
+        canonico = self._tipo_grafico(tipo, "matplotlib")
+        if canonico is None:
+            st.dataframe(df)
+            return
+        try:
+            st.image(self._figura(df, canonico, "matplotlib", huella).result())
+        except Exception as e:
+            st.warning(f"No se pudo graficar {canonico}: {e}")
+
+    def _render_plotly(self, df: pd.DataFrame, tipo: str, huella: Optional[str]):
+        canonico = self._tipo_grafico(tipo, "plotly")
+        if canonico is None:
+            st.dataframe(df)
+            return
+        try:
+            figura = json.loads(self._figura(df, canonico, "plotly", huella).result())
+            st.plotly_chart(figura, use_container_width=True)
         except Exception as e:
             st.warning(f"No se pudo generar gráfico interactivo: {e}")
@@ -0,0 +1,107 @@
+# ============================================================
+#  core/result_cache_v1.py
+#  Caché de resultados de n8n con TTL por acción
+#  Autor: Eduardo Sánchez Santana
+#  Fecha: 2025-11-03
+# ============================================================
+
+import copy
+import json
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+
+class ResultCacheV1:
+    """
+    Caché en memoria para N8NConnectorV3.execute.
+    - Clave: acción + parámetros canonizados (orden de claves, espacios).
+    - TTL: lo declara cada acción en el diccionario operativo ("cache_ttl_segundos");
+      un TTL de 0 o ausente significa que la acción no es cacheable.
+    - Solo se guardan resultados exitosos: nunca respuestas de fallback.
+    - Contadores de hits/misses para diagnóstico.
+    """
+
+    def __init__(self, max_entradas: int = 256):
+        self.max_entradas = max_entradas
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._items: "OrderedDict[str, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+
+    # ------------------------------------------------------------
+    # Utilidades internas
+    # ------------------------------------------------------------
+
+    @staticmethod
+    def _canonizar(valor: Any) -> Any:
+        if isinstance(valor, dict):
+            return {str(k): ResultCacheV1._canonizar(v) for k, v in valor.items() if v is not None}
+        if isinstance(valor, (list, tuple)):
+            return [ResultCacheV1._canonizar(v) for v in valor]
+        if isinstance(valor, str):
+            return " ".join(valor.split())
+        return valor
+
+    def clave(self, accion: str, parametros: Optional[Dict[str, Any]]) -> str:
+        canon = self._canonizar(parametros or {})
+        return accion + "|" + json.dumps(canon, sort_keys=True, ensure_ascii=False, separators=(",", ":"), default=str)
+
+    # ------------------------------------------------------------
+    # API pública
+    # ------------------------------------------------------------
+
+    def get(self, accion: str, parametros: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+        """Devuelve una copia del resultado vigente o None."""
+        k = self.clave(accion, parametros)
+        with self._lock:
+            item = self._items.get(k)
+            if item is None or item[0] < time.time():
+                if item is not None:
+                    del self._items[k]
+                self.misses += 1
+                return None
+            self._items.move_to_end(k)
+            self.hits += 1
+            return copy.deepcopy(item[1])
+
+    def set(self, accion: str, parametros: Optional[Dict[str, Any]],
+            resultado: Dict[str, Any], ttl_segundos: float) -> None:
+        """Guarda el resultado si la acción es cacheable y la ejecución fue exitosa."""
+        if not ttl_segundos or ttl_segundos <= 0 or not resultado.get("ok"):
+            return
+        k = self.clave(accion, parametros)
+        with self._lock:
+            self._items[k] = (time.time() + ttl_segundos, copy.deepcopy(resultado))
+            self._items.move_to_end(k)
+            while len(self._items) > self.max_entradas:
+                self._items.popitem(last=False)
+
+    def descartar(self, accion: str, parametros: Optional[Dict[str, Any]]) -> None:
+        """
+        Elimina una entrada que get() acaba de devolver pero no sirvió (p. ej. su
+        tabla ya no está en el table store): ese hit pasa a contarse como miss.
+        """
+        with self._lock:
+            if self._items.pop(self.clave(accion, parametros), None) is not None:
+                self.hits -= 1
+                self.misses += 1
+
+    def invalidar(self, accion: Optional[str] = None) -> None:
+        """Vacía toda la caché o solo las entradas de una acción."""
+        with self._lock:
+            if accion is None:
+                self._items.clear()
+                return
+            for k in [k for k in self._items if k.startswith(accion + "|")]:
+                del self._items[k]
+
+    def stats(self) -> Dict[str, Any]:
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 4) if total else 0.0,
+            "entradas": len(self._items),
+        }
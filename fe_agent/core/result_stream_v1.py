@@ -0,0 +1,127 @@
+# ============================================================
+#  core/result_stream_v1.py
+#  Recepción incremental de resultados de n8n en lotes columnares
+#  Autor: Eduardo Sánchez Santana
+#  Fecha: 2025-11-08
+# ============================================================
+
+import io
+import json
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+import pyarrow as pa
+import pyarrow.json as pajson
+
+from core.table_store_v1 import EscritorTablaV1, tabla_arrow
+
+# on_progreso(primeras_filas, filas_recibidas): la UI muestra la primera página
+# mientras el resto del resultado sigue llegando.
+Progreso = Callable[[pa.Table, int], None]
+
+
+class ReceptorTablaV1:
+    """
+    Arma una tabla a partir de un resultado que llega por partes, sin tener
+    nunca el cuerpo completo ni la lista de dicts en memoria:
+      - NDJSON: los bytes se acumulan hasta `lote_bytes` (el primer lote antes,
+        con `primer_lote_bytes`, para mostrar algo pronto) y cada bloque de
+        líneas completas se parsea con pyarrow.json directo a columnas,
+      - páginas con cursor: cada página (lista de registros) es un lote,
+      - cada lote se escribe en disco (EscritorTablaV1) y se descarta; solo se
+        retienen las primeras `filas_primera_pagina` filas para la UI.
+    cerrar() devuelve el `data` del resultado: {"tabla_ref", "total_filas", "columnas", "lotes"}.
+    """
+
+    def __init__(self,
+                 escritor: EscritorTablaV1,
+                 on_progreso: Optional[Progreso] = None,
+                 filas_primera_pagina: int = 200,
+                 lote_bytes: int = 4 * 1024 * 1024,
+                 primer_lote_bytes: int = 64 * 1024):
+        self.escritor = escritor
+        self.on_progreso = on_progreso
+        self.filas_primera_pagina = filas_primera_pagina
+        self.lote_bytes = lote_bytes
+        self.primer_lote_bytes = primer_lote_bytes
+        self.primera_pagina: Optional[pa.Table] = None
+        self.primer_lote_ms: Optional[float] = None
+        self._buffer = bytearray()
+        self._t0 = time.perf_counter()
+
+    @property
+    def filas(self) -> int:
+        return self.escritor.filas
+
+    # ------------------------------------------------------------
+    # Entrada
+    # ------------------------------------------------------------
+
+    def feed(self, chunk: bytes) -> None:
+        """Agrega bytes NDJSON; parsea cuando hay suficientes líneas completas."""
+        self._buffer += chunk
+        umbral = self.lote_bytes if self.escritor.lotes else self.primer_lote_bytes
+        if len(self._buffer) < umbral:
+            return
+        corte = self._buffer.rfind(b"\n")
+        if corte < 0:
+            return
+        bloque = bytes(self._buffer[:corte + 1])
+        del self._buffer[:corte + 1]
+        self._lote(self._parsear(bloque))
+
+    def agregar_registros(self, registros: List[Dict[str, Any]]) -> None:
+        """Agrega una página de registros (protocolo paginado con cursor)."""
+        if registros:
+            self._lote(tabla_arrow(registros))
+
+    @staticmethod
+    def _parsear(bloque: bytes) -> pa.Table:
+        try:
+            return pajson.read_json(io.BytesIO(bloque),
+                                    read_options=pajson.ReadOptions(block_size=max(len(bloque), 1 << 20)))
+        except pa.ArrowInvalid:
+            # Una columna cambia de tipo dentro del bloque (p.ej. número y "N/A")
+            return tabla_arrow([json.loads(linea) for linea in bloque.splitlines() if linea.strip()])
+
+    def _lote(self, tabla: pa.Table) -> None:
+        if tabla.num_rows == 0:
+            return
+        self.escritor.escribir(tabla)
+        if self.primer_lote_ms is None:
+            self.primer_lote_ms = round((time.perf_counter() - self._t0) * 1000, 3)
+        if self.primera_pagina is None or self.primera_pagina.num_rows < self.filas_primera_pagina:
+            faltan = self.filas_primera_pagina - (self.primera_pagina.num_rows if self.primera_pagina else 0)
+            nuevas = self.escritor.conformar(tabla.slice(0, faltan))
+            self.primera_pagina = nuevas if self.primera_pagina is None else pa.concat_tables(
+                [self.escritor.conformar(self.primera_pagina), nuevas])
+        if self.on_progreso is not None:
+            try:
+                self.on_progreso(self.primera_pagina, self.filas)
+            except Exception as e:
+                print(f"[ReceptorTablaV1] Error en on_progreso: {e}")
+
+    # ------------------------------------------------------------
+    # Cierre
+    # ------------------------------------------------------------
+
+    def cerrar(self) -> Dict[str, Any]:
+        """Parsea lo que quede en el buffer, cierra el archivo y devuelve el resumen del resultado."""
+        try:
+            if self._buffer.strip():
+                self._lote(self._parsear(bytes(self._buffer)))
+            self._buffer.clear()
+            ref = self.escritor.cerrar()
+        except Exception:
+            self.escritor.abortar()
+            raise
+        return {
+            "tabla_ref": ref,
+            "total_filas": self.escritor.filas,
+            "columnas": list(self.escritor.schema.names) if self.escritor.schema is not None else [],
+            "lotes": self.escritor.lotes,
+        }
+
+    def abortar(self) -> None:
+        self._buffer.clear()
+        self.escritor.abortar()
@@ -0,0 +1,166 @@
+# ============================================================
+#  core/session_store_v1.py
+#  Persistencia incremental de sesiones (SQLite en modo WAL)
+#  Autor: Eduardo Sánchez Santana
+#  Fecha: 2025-11-05
+# ============================================================
+
+import json
+import os
+import sqlite3
+import threading
+from typing import Any, Dict, Iterable, List, Optional
+
+
+class SessionStoreV1:
+    """
+    Backend de persistencia para ContextManager, una fila por campo y por sesión.
+    - Guardado por deltas: solo se escriben las claves modificadas y las entradas
+      nuevas del historial, de modo que el costo no crece con la sesión.
+    - Sesiones independientes por usuario (sesion_id): ya no se pisan entre sí.
+    - SQLite en modo WAL: lectores y un escritor concurrentes sin bloquearse.
+    - Compactación en segundo plano: recorta el historial antiguo de cada sesión
+      y hace checkpoint del WAL, fuera del camino de la respuesta.
+    """
+
+    def __init__(self,
+                 db_path: str = "data/sessions.sqlite",
+                 max_historial: int = 30,
+                 compactar_cada: float = 60.0):
+        self.db_path = db_path
+        self.max_historial = max_historial
+        self.compactar_cada = compactar_cada
+        directorio = os.path.dirname(db_path)
+        if directorio:
+            os.makedirs(directorio, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS campos (
+                sesion TEXT NOT NULL,
+                clave TEXT NOT NULL,
+                valor TEXT,
+                PRIMARY KEY (sesion, clave)
+            ) WITHOUT ROWID;
+            CREATE TABLE IF NOT EXISTS historial (
+                sesion TEXT NOT NULL,
+                seq INTEGER NOT NULL,
+                entrada TEXT NOT NULL,
+                PRIMARY KEY (sesion, seq)
+            ) WITHOUT ROWID;
+            """
+        )
+        self._conn.commit()
+        self._sesiones_sucias: set = set()
+        self._detener = threading.Event()
+        self._hilo = threading.Thread(target=self._compactador, name="session-store-compact", daemon=True)
+        self._hilo.start()
+
+    # ------------------------------------------------------------
+    # Escritura y lectura
+    # ------------------------------------------------------------
+
+    def guardar(self, sesion_id: str, cambios: Dict[str, Any],
+                nuevas_entradas: Iterable[Dict[str, Any]] = ()) -> None:
+        """Escribe en una transacción los campos modificados y las entradas nuevas del historial."""
+        filas = [(sesion_id, k, json.dumps(v, ensure_ascii=False, default=str)) for k, v in cambios.items()]
+        entradas = [json.dumps(e, ensure_ascii=False, default=str) for e in nuevas_entradas]
+        if not filas and not entradas:
+            return
+        with self._lock, self._conn:
+            if filas:
+                self._conn.executemany(
+                    "INSERT INTO campos (sesion, clave, valor) VALUES (?, ?, ?) "
+                    "ON CONFLICT (sesion, clave) DO UPDATE SET valor = excluded.valor",
+                    filas,
+                )
+            if entradas:
+                (ultimo,) = self._conn.execute(
+                    "SELECT COALESCE(MAX(seq), 0) FROM historial WHERE sesion = ?", (sesion_id,)
+                ).fetchone()
+                self._conn.executemany(
+                    "INSERT INTO historial (sesion, seq, entrada) VALUES (?, ?, ?)",
+                    [(sesion_id, ultimo + i, e) for i, e in enumerate(entradas, start=1)],
+                )
+                self._sesiones_sucias.add(sesion_id)
+
+    def cargar(self, sesion_id: str, max_historial: Optional[int] = None) -> Optional[Dict[str, Any]]:
+        """Reconstruye el contexto de la sesión, o None si no existe."""
+        limite = max_historial or self.max_historial
+        with self._lock:
+            campos = self._conn.execute(
+                "SELECT clave, valor FROM campos WHERE sesion = ?", (sesion_id,)
+            ).fetchall()
+            entradas = self._conn.execute(
+                "SELECT entrada FROM historial WHERE sesion = ? ORDER BY seq DESC LIMIT ?",
+                (sesion_id, limite),
+            ).fetchall()
+        if not campos and not entradas:
+            return None
+        contexto = {k: json.loads(v) for k, v in campos}
+        contexto["historial"] = [json.loads(e) for (e,) in reversed(entradas)]
+        return contexto
+
+    def borrar(self, sesion_id: str) -> None:
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM campos WHERE sesion = ?", (sesion_id,))
+            self._conn.execute("DELETE FROM historial WHERE sesion = ?", (sesion_id,))
+            self._sesiones_sucias.discard(sesion_id)
+
+    def sesiones(self) -> List[str]:
+        with self._lock:
+            return [s for (s,) in self._conn.execute("SELECT DISTINCT sesion FROM campos")]
+
+    # ------------------------------------------------------------
+    # Compactación
+    # ------------------------------------------------------------
+
+    def compactar(self) -> None:
+        """Recorta el historial de las sesiones modificadas y hace checkpoint del WAL."""
+        with self._lock:
+            sucias, self._sesiones_sucias = self._sesiones_sucias, set()
+            with self._conn:
+                for sesion_id in sucias:
+                    self._conn.execute(
+                        "DELETE FROM historial WHERE sesion = ? AND seq <= "
+                        "(SELECT MAX(seq) FROM historial WHERE sesion = ?) - ?",
+                        (sesion_id, sesion_id, self.max_historial),
+                    )
+            self._conn.execute("PRAGMA wal_checkpoint(PASSIVE)")
+
+    def _compactador(self) -> None:
+        while not self._detener.wait(self.compactar_cada):
+            try:
+                self.compactar()
+            except Exception as e:
+                print(f"[SessionStoreV1] Error compactando: {e}")
+
+    def close(self) -> None:
+        self._detener.set()
+        self._hilo.join(timeout=2.0)
+        try:
+            self.compactar()
+        finally:
+            with self._lock:
+                self._conn.close()
+
+
+# ------------------------------------------------------------
+# Un almacén por base de datos y por proceso
+# ------------------------------------------------------------
+_STORES: Dict[str, SessionStoreV1] = {}
+_STORES_LOCK = threading.Lock()
+
+
+def get_session_store(db_path: str = "data/sessions.sqlite", **kwargs) -> SessionStoreV1:
+    """Devuelve el almacén compartido de `db_path` (todas las sesiones de Streamlit usan el mismo)."""
+    clave = os.path.abspath(db_path)
+    with _STORES_LOCK:
+        store = _STORES.get(clave)
+        if store is None:
+            store = SessionStoreV1(db_path, **kwargs)
+            _STORES[clave] = store
+        return store
@@ -0,0 +1,92 @@
+# ============================================================
+#  core/startup_v1.py
+#  Recursos compartidos por proceso con carga diferida y perfil de arranque
+#  Autor: Eduardo Sánchez Santana
+#  Fecha: 2025-11-08
+# ============================================================
+
+import importlib
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+from core.tracing_v1 import TracerV1, get_tracer
+
+
+class RecursosCompartidosV1:
+    """
+    Componentes sin estado de usuario (intérprete, conectores, motor local,
+    clasificador...) creados una sola vez por proceso y compartidos por todas
+    las sesiones:
+      - cada recurso se declara con una fábrica y se construye la primera vez
+        que se pide (get); las importaciones pesadas van dentro de la fábrica,
+        así la página inicial no las espera,
+      - precargar() importa módulos y construye recursos en un hilo de fondo
+        mientras el usuario ve la página; get() espera solo si su recurso
+        todavía se está construyendo,
+      - cada importación y construcción queda medida en el perfil de arranque
+        (spans "import.*" / "init.*" de la traza "arranque").
+    """
+
+    def __init__(self, fabricas: Dict[str, Callable[[], Any]], tracer: Optional[TracerV1] = None):
+        self.fabricas = dict(fabricas)
+        self.tracer = tracer or get_tracer()
+        self._recursos: Dict[str, Any] = {}
+        self._locks = {nombre: threading.Lock() for nombre in self.fabricas}
+        self._perfil: List[Dict[str, Any]] = []
+        self._t0 = time.perf_counter()
+        self.listo_ms: Optional[float] = None
+
+    def _medir(self, etapa: str, nombre: str, funcion: Callable[[], Any]) -> Any:
+        t0 = time.perf_counter()
+        with self.tracer.span(f"{etapa}.{nombre}", hilo=threading.current_thread().name):
+            resultado = funcion()
+        self._perfil.append({"etapa": etapa, "nombre": nombre,
+                             "ms": round((time.perf_counter() - t0) * 1000, 2),
+                             "hilo": threading.current_thread().name})
+        return resultado
+
+    def get(self, nombre: str) -> Any:
+        """Recurso `nombre`; lo construye (o espera a que termine su construcción) si aún no existe."""
+        recurso = self._recursos.get(nombre)
+        if recurso is not None:
+            return recurso
+        with self._locks[nombre]:
+            if nombre not in self._recursos:
+                self._recursos[nombre] = self._medir("init", nombre, self.fabricas[nombre])
+            return self._recursos[nombre]
+
+    def listo(self, nombre: str) -> bool:
+        return nombre in self._recursos
+
+    def importar(self, modulo: str) -> None:
+        """Importa `modulo` midiendo su costo (solo la primera vez cuenta)."""
+        self._medir("import", modulo, lambda: importlib.import_module(modulo))
+
+    def precargar(self, modulos: Iterable[str] = (), nombres: Optional[Iterable[str]] = None) -> threading.Thread:
+        """Importa `modulos` y construye `nombres` (por defecto, todos) en un hilo daemon."""
+        modulos = list(modulos)
+        nombres = list(nombres if nombres is not None else self.fabricas)
+
+        def trabajar() -> None:
+            with self.tracer.traza("arranque", recursos=len(nombres)):
+                for modulo in modulos:
+                    try:
+                        self.importar(modulo)
+                    except Exception as e:
+                        print(f"[RecursosCompartidosV1] Error importando {modulo}: {e}")
+                for nombre in nombres:
+                    try:
+                        self.get(nombre)
+                    except Exception as e:
+                        # Se reintentará (y el error se verá) en el primer get() del turno
+                        print(f"[RecursosCompartidosV1] Error creando {nombre}: {e}")
+            self.listo_ms = round((time.perf_counter() - self._t0) * 1000, 2)
+
+        hilo = threading.Thread(target=trabajar, name="fe-precarga", daemon=True)
+        hilo.start()
+        return hilo
+
+    def perfil(self) -> List[Dict[str, Any]]:
+        """Importaciones y construcciones medidas, en orden."""
+        return list(self._perfil)
@@ -0,0 +1,348 @@
+# ============================================================
+#  core/table_store_v1.py
+#  Almacén de tablas de resultado (Arrow) direccionado por contenido
+#  Autor: Eduardo Sánchez Santana
+#  Fecha: 2025-11-06
+# ============================================================
+
+import hashlib
+import os
+import threading
+import uuid
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Union
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.csv as pacsv
+import pyarrow.ipc as ipc
+
+TablaEntrada = Union[pd.DataFrame, pa.Table, List[Dict[str, Any]]]
+
+PREFIJO_REF = "tbl:"
+
+
+def texto_en_columnas_mixtas(df: pd.DataFrame) -> pd.DataFrame:
+    """Copia de `df` con las columnas object de tipos mezclados convertidas a texto (los nulos se mantienen)."""
+    df = df.copy()
+    for col in df.columns:
+        serie = df[col]
+        if serie.dtype == object and serie.dropna().map(type).nunique() > 1:
+            df[col] = serie.where(serie.isna(), serie.astype(str))
+    return df
+
+
+def tabla_arrow(tabla: TablaEntrada) -> pa.Table:
+    """DataFrame / lista de dicts -> pa.Table; las columnas de tipos mezclados quedan como texto."""
+    if isinstance(tabla, pa.Table):
+        return tabla
+    if not isinstance(tabla, pd.DataFrame):
+        registros = list(tabla or [])
+        try:
+            return pa.Table.from_pylist(registros)
+        except (pa.ArrowInvalid, pa.ArrowTypeError):
+            tabla = pd.DataFrame(registros)
+    try:
+        return pa.Table.from_pandas(tabla, preserve_index=False)
+    except (pa.ArrowInvalid, pa.ArrowTypeError):
+        # Columnas con tipos mezclados (p.ej. "Valor": 45200.0 y "Taladro"): como texto
+        return pa.Table.from_pandas(texto_en_columnas_mixtas(tabla), preserve_index=False)
+
+
+def unificar_esquemas(a: pa.Schema, b: pa.Schema) -> pa.Schema:
+    """
+    Unión permisiva de dos esquemas; si una columna trae tipos incompatibles
+    (p.ej. int64 y luego "N/A"), esa columna se ensancha a texto.
+    """
+    try:
+        return pa.unify_schemas([a, b], promote_options="permissive")
+    except (pa.ArrowInvalid, pa.ArrowTypeError):
+        pass
+    campos = []
+    for campo in a:
+        idx = b.get_field_index(campo.name)
+        if idx < 0:
+            campos.append(campo)
+            continue
+        try:
+            campos.append(pa.unify_schemas([pa.schema([campo]), pa.schema([b.field(idx)])],
+                                           promote_options="permissive").field(0))
+        except (pa.ArrowInvalid, pa.ArrowTypeError):
+            campos.append(pa.field(campo.name, pa.string()))
+    campos.extend(f for f in b if a.get_field_index(f.name) < 0)
+    return pa.schema(campos)
+
+
+class ResultTableStoreV1:
+    """
+    Guarda las tablas de resultado fuera del contexto de sesión.
+    - Cada tabla se serializa una vez a Arrow IPC y se identifica por el sha1 de
+      esos bytes: la misma tabla produce siempre la misma referencia ("tbl:<hash>").
+    - Nivel en memoria: LRU de pa.Table acotado en bytes.
+    - Nivel en disco: un archivo .arrow por hash, leído con memory mapping
+      (repetir, exportar o volver a graficar no re-serializa listas de dicts).
+    - El contexto solo guarda la referencia.
+    - Las tablas grandes que llegan por lotes (NDJSON o páginas de n8n) se
+      escriben directo a disco con escritor(), sin armarlas en memoria.
+    """
+
+    def __init__(self,
+                 directorio: str = "data/result_tables",
+                 max_bytes_memoria: int = 64 * 1024 * 1024,
+                 max_archivos_disco: int = 500):
+        self.directorio = directorio
+        self.max_bytes_memoria = max_bytes_memoria
+        self.max_archivos_disco = max_archivos_disco
+        os.makedirs(self.directorio, exist_ok=True)
+        self._lock = threading.Lock()
+        self._memoria: "OrderedDict[str, pa.Table]" = OrderedDict()
+        self._bytes_memoria = 0
+        self.hits_memoria = 0
+        self.hits_disco = 0
+
+    # ------------------------------------------------------------
+    # Utilidades internas
+    # ------------------------------------------------------------
+
+    @staticmethod
+    def _a_arrow(tabla: TablaEntrada) -> pa.Table:
+        return tabla_arrow(tabla)
+
+    @staticmethod
+    def _serializar(tabla: pa.Table) -> pa.Buffer:
+        sink = pa.BufferOutputStream()
+        with ipc.new_file(sink, tabla.schema) as writer:
+            writer.write_table(tabla)
+        return sink.getvalue()
+
+    def _path(self, clave: str) -> str:
+        return os.path.join(self.directorio, f"{clave}.arrow")
+
+    @staticmethod
+    def _clave(ref: str) -> str:
+        return ref[len(PREFIJO_REF):] if ref.startswith(PREFIJO_REF) else ref
+
+    def _recordar(self, clave: str, tabla: pa.Table) -> None:
+        """Inserta en el LRU de memoria y expulsa lo menos usado si se excede el límite."""
+        if clave in self._memoria:
+            self._memoria.move_to_end(clave)
+            return
+        self._memoria[clave] = tabla
+        self._bytes_memoria += tabla.nbytes
+        while self._bytes_memoria > self.max_bytes_memoria and len(self._memoria) > 1:
+            _, expulsada = self._memoria.popitem(last=False)
+            self._bytes_memoria -= expulsada.nbytes
+
+    def _podar_disco(self) -> None:
+        archivos = [os.path.join(self.directorio, a) for a in os.listdir(self.directorio) if a.endswith(".arrow")]
+        sobrantes = len(archivos) - self.max_archivos_disco
+        if sobrantes <= 0:
+            return
+        for path in sorted(archivos, key=os.path.getmtime)[:sobrantes]:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    # ------------------------------------------------------------
+    # API pública
+    # ------------------------------------------------------------
+
+    def put(self, tabla: TablaEntrada) -> str:
+        """Guarda la tabla (si no existía) y devuelve su referencia."""
+        arrow = self._a_arrow(tabla)
+        datos = self._serializar(arrow)
+        clave = hashlib.sha1(memoryview(datos)).hexdigest()
+        path = self._path(clave)
+        with self._lock:
+            if os.path.exists(path):
+                os.utime(path)
+            else:
+                tmp = path + ".tmp"
+                with open(tmp, "wb") as f:
+                    f.write(memoryview(datos))
+                os.replace(tmp, path)
+                self._podar_disco()
+            self._recordar(clave, arrow)
+        return PREFIJO_REF + clave
+
+    def escritor(self) -> "EscritorTablaV1":
+        """Escritor por lotes: la tabla va a disco a medida que llega y al cerrar se obtiene su referencia."""
+        return EscritorTablaV1(self)
+
+    def _registrar_archivo(self, tmp: str) -> str:
+        """Mueve un archivo .arrow ya escrito a su ruta definitiva (sha1 de sus bytes) y devuelve la referencia."""
+        h = hashlib.sha1()
+        with open(tmp, "rb") as f:
+            for bloque in iter(lambda: f.read(1024 * 1024), b""):
+                h.update(bloque)
+        clave = h.hexdigest()
+        path = self._path(clave)
+        with self._lock:
+            if os.path.exists(path):
+                os.remove(tmp)
+                os.utime(path)
+            else:
+                os.replace(tmp, path)
+                self._podar_disco()
+        # No entra al LRU de memoria: get() la abre mapeada desde disco cuando se pida
+        return PREFIJO_REF + clave
+
+    def contiene(self, ref: Optional[str]) -> bool:
+        """¿La referencia sigue disponible (memoria o disco)?"""
+        if not ref:
+            return False
+        clave = self._clave(ref)
+        with self._lock:
+            return clave in self._memoria or os.path.exists(self._path(clave))
+
+    def get(self, ref: Optional[str]) -> Optional[pa.Table]:
+        """Tabla Arrow de la referencia (memoria, o disco mapeado en memoria); None si ya no existe."""
+        if not ref:
+            return None
+        clave = self._clave(ref)
+        with self._lock:
+            tabla = self._memoria.get(clave)
+            if tabla is not None:
+                self._memoria.move_to_end(clave)
+                self.hits_memoria += 1
+                return tabla
+            try:
+                tabla = ipc.open_file(pa.memory_map(self._path(clave), "r")).read_all()
+            except FileNotFoundError:
+                return None
+            self.hits_disco += 1
+            self._recordar(clave, tabla)
+            return tabla
+
+    def to_pandas(self, ref: Optional[str]) -> Optional[pd.DataFrame]:
+        tabla = self.get(ref)
+        return tabla.to_pandas() if tabla is not None else None
+
+    def export_csv(self, ref: str, path: str) -> bool:
+        """Escribe la tabla directamente desde Arrow a CSV (sin pasar por pandas)."""
+        tabla = self.get(ref)
+        if tabla is None:
+            return False
+        directorio = os.path.dirname(path)
+        if directorio:
+            os.makedirs(directorio, exist_ok=True)
+        pacsv.write_csv(tabla, path)
+        return True
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "en_memoria": len(self._memoria),
+            "bytes_memoria": self._bytes_memoria,
+            "hits_memoria": self.hits_memoria,
+            "hits_disco": self.hits_disco,
+        }
+
+
+class EscritorTablaV1:
+    """
+    Escribe una tabla en el almacén lote a lote (Arrow IPC en un archivo
+    temporal): la memoria usada es la de un lote, no la de la tabla completa.
+    - El esquema lo fija el primer lote; los siguientes se ajustan a él
+      (columnas faltantes como nulos, tipos compatibles convertidos).
+    - Si un lote trae un tipo más amplio (int -> double, null -> string) o
+      columnas nuevas, se unifica el esquema y lo ya escrito se reescribe una vez;
+      tipos incompatibles (número y luego "N/A") ensanchan la columna a texto.
+    - cerrar() devuelve la referencia "tbl:<hash>"; abortar() descarta el archivo.
+    """
+
+    def __init__(self, store: ResultTableStoreV1):
+        self.store = store
+        self.filas = 0
+        self.lotes = 0
+        self.schema: Optional[pa.Schema] = None
+        self._tmp: Optional[str] = None
+        self._sink = None
+        self._writer = None
+
+    @staticmethod
+    def _columna(columna: pa.ChunkedArray, tipo: pa.DataType) -> pa.ChunkedArray:
+        try:
+            return columna.cast(tipo)
+        except (pa.ArrowInvalid, pa.ArrowNotImplementedError):
+            if not pa.types.is_string(tipo):
+                raise
+            # Listas / structs sin cast directo a texto
+            return pa.chunked_array([pa.array([None if v is None else str(v) for v in columna.to_pylist()],
+                                              type=tipo)])
+
+    @classmethod
+    def _conformar(cls, tabla: pa.Table, schema: pa.Schema) -> pa.Table:
+        columnas = [cls._columna(tabla.column(f.name), f.type) if f.name in tabla.column_names
+                    else pa.nulls(tabla.num_rows, f.type) for f in schema]
+        return pa.Table.from_arrays(columnas, schema=schema)
+
+    def conformar(self, tabla: pa.Table) -> pa.Table:
+        """`tabla` ajustada al esquema (ya unificado) del archivo que se está escribiendo."""
+        return tabla if self.schema is None or tabla.schema.equals(self.schema) else self._conformar(tabla, self.schema)
+
+    def _abrir(self, schema: pa.Schema) -> None:
+        self.schema = schema
+        self._tmp = os.path.join(self.store.directorio, f".{uuid.uuid4().hex}.arrow.tmp")
+        self._sink = pa.OSFile(self._tmp, "wb")
+        self._writer = ipc.new_file(self._sink, schema)
+
+    def _cerrar_archivo(self) -> None:
+        if self._writer is not None:
+            self._writer.close()
+            self._sink.close()
+            self._writer = self._sink = None
+
+    def _ampliar(self, schema: pa.Schema) -> None:
+        """Reescribe lo ya escrito con el esquema unificado (ocurre a lo sumo unas pocas veces)."""
+        anterior = self._tmp
+        self._cerrar_archivo()
+        escrito = ipc.open_file(pa.memory_map(anterior, "r"))
+        self._abrir(schema)
+        for i in range(escrito.num_record_batches):
+            self._writer.write_table(self._conformar(pa.Table.from_batches([escrito.get_batch(i)]), schema))
+        del escrito
+        os.remove(anterior)
+
+    def escribir(self, lote: pa.Table) -> None:
+        if lote.num_rows == 0:
+            return
+        if self._writer is None:
+            self._abrir(lote.schema)
+        elif not lote.schema.equals(self.schema):
+            unificado = unificar_esquemas(self.schema, lote.schema)
+            if not unificado.equals(self.schema):
+                self._ampliar(unificado)
+            lote = self._conformar(lote, self.schema)
+        self._writer.write_table(lote)
+        self.filas += lote.num_rows
+        self.lotes += 1
+
+    def cerrar(self) -> str:
+        if self._writer is None:
+            return self.store.put([])
+        self._cerrar_archivo()
+        return self.store._registrar_archivo(self._tmp)
+
+    def abortar(self) -> None:
+        self._cerrar_archivo()
+        if self._tmp and os.path.exists(self._tmp):
+            os.remove(self._tmp)
+
+
+# ------------------------------------------------------------
+# Un almacén por directorio y por proceso
+# ------------------------------------------------------------
+_STORES: Dict[str, ResultTableStoreV1] = {}
+_STORES_LOCK = threading.Lock()
+
+
+def get_table_store(directorio: str = "data/result_tables", **kwargs) -> ResultTableStoreV1:
+    """Devuelve el almacén compartido de `directorio` (el LRU en memoria sirve a todas las sesiones)."""
+    clave = os.path.abspath(directorio)
+    with _STORES_LOCK:
+        store = _STORES.get(clave)
+        if store is None:
+            store = ResultTableStoreV1(directorio, **kwargs)
+            _STORES[clave] = store
+        return store
@@ -0,0 +1,77 @@
+# ============================================================
+#  core/text_normalizer.py
+#  Normalización de texto en español para índices y cachés
+#  Autor: Eduardo Sánchez Santana
+#  Fecha: 2025-11-03
+# ============================================================
+
+import re
+import unicodedata
+from typing import Iterable, List
+
+# Palabras funcionales que no aportan a la intención de la pregunta.
+STOPWORDS_ES = {
+    "el", "la", "los", "las", "un", "una", "unos", "unas", "lo", "al", "del",
+    "de", "en", "a", "y", "o", "u", "e", "que", "se", "por", "para", "con",
+    "es", "son", "fue", "fueron", "ha", "han", "hay", "me", "mi", "mis",
+    "su", "sus", "este", "esta", "estos", "estas", "ese", "esa", "cual",
+    "cuales", "como", "cuanto", "cuanta", "cuantos", "cuantas", "donde",
+    "cuando", "muestrame", "dime", "quiero", "saber", "ver", "favor",
+    "porfavor", "nos", "le", "les", "tu", "tus", "ya", "mas", "muy",
+}
+
+_RE_NO_ALFANUM = re.compile(r"[^0-9a-z]+")
+
+
+class _TablaSinAcentos(dict):
+    """Tabla para str.translate que calcula (y memoriza) el carácter base de cada código."""
+
+    def __missing__(self, codigo: int) -> str:
+        base = unicodedata.normalize("NFD", chr(codigo))[0]
+        self[codigo] = base
+        return base
+
+
+_SIN_ACENTOS = _TablaSinAcentos()
+
+
+def quitar_acentos(texto: str) -> str:
+    """
+    Elimina tildes y diacríticos carácter a carácter ("facturación" -> "facturacion").
+    Conserva la longitud del texto, por lo que los offsets siguen siendo válidos.
+    """
+    if texto.isascii():
+        return texto
+    return texto.translate(_SIN_ACENTOS)
+
+
+def normalizar_texto(texto: str, quitar_stopwords: bool = False) -> str:
+    """
+    Minúsculas, sin acentos ni puntuación y con espacios colapsados.
+    Opcionalmente elimina stop words.
+    """
+    texto = quitar_acentos((texto or "").lower())
+    tokens = _RE_NO_ALFANUM.sub(" ", texto).split()
+    if quitar_stopwords:
+        tokens = [t for t in tokens if t not in STOPWORDS_ES]
+    return " ".join(tokens)
+
+
+def tokenizar(texto: str, quitar_stopwords: bool = True) -> List[str]:
+    """Devuelve los tokens normalizados del texto."""
+    return normalizar_texto(texto, quitar_stopwords=quitar_stopwords).split()
+
+
+def ngramas_caracter(texto: str, tamanos: Iterable[int] = (3, 4)) -> List[str]:
+    """
+    N-gramas de caracteres por palabra, con bordes marcados (estilo char_wb).
+    Toleran errores de tipeo y variaciones de flexión ("venta" / "ventas").
+    """
+    ngramas = []
+    for token in texto.split():
+        t = f" {token} "
+        for n in tamanos:
+            if len(t) < n:
+                continue
+            ngramas.extend(t[i:i + n] for i in range(len(t) - n + 1))
+    return ngramas
@@ -0,0 +1,311 @@
+# ============================================================
+#  core/tracing_v1.py
+#  Trazas por turno y spans por etapa (compatibles con OpenTelemetry)
+#  Autor: Eduardo Sánchez Santana
+#  Fecha: 2025-11-07
+# ============================================================
+
+import contextvars
+import functools
+import os
+import threading
+import time
+import uuid
+from collections import deque
+from contextlib import contextmanager
+from typing import Any, Callable, Deque, Dict, Iterator, List, Optional
+
+from core.jsonl_log_v1 import get_log
+
+_SPAN_ACTUAL: contextvars.ContextVar[Optional["SpanV1"]] = contextvars.ContextVar("fe_span_actual", default=None)
+
+
+class SpanV1:
+    """
+    Un tramo medido de la traza. La duración se mide con reloj monótono
+    (perf_counter_ns); el inicio en reloj de pared solo sirve para ubicarlo en el tiempo.
+    """
+
+    __slots__ = ("trace_id", "span_id", "parent_id", "nombre", "atributos",
+                 "inicio_ns", "_t0", "duracion_ns", "error")
+
+    def __init__(self, nombre: str, padre: Optional["SpanV1"], atributos: Dict[str, Any]):
+        self.trace_id = padre.trace_id if padre else uuid.uuid4().hex
+        self.span_id = uuid.uuid4().hex[:16]
+        self.parent_id = padre.span_id if padre else None
+        self.nombre = nombre
+        self.atributos = dict(atributos)
+        self.inicio_ns = time.time_ns()
+        self._t0 = time.perf_counter_ns()
+        self.duracion_ns: Optional[int] = None
+        self.error: Optional[str] = None
+
+    def set(self, clave: str, valor: Any) -> None:
+        if valor is not None:
+            self.atributos[clave] = valor
+
+    def update(self, **atributos: Any) -> None:
+        for k, v in atributos.items():
+            self.set(k, v)
+
+    def terminar(self) -> None:
+        self.duracion_ns = time.perf_counter_ns() - self._t0
+
+    def duracion_parcial_ms(self) -> float:
+        """Tiempo transcurrido desde el inicio del span (aún abierto)."""
+        return (time.perf_counter_ns() - self._t0) / 1e6
+
+    @property
+    def duracion_ms(self) -> float:
+        return (self.duracion_ns or 0) / 1e6
+
+    def a_otlp(self) -> Dict[str, Any]:
+        """Span en el formato JSON de OTLP (opentelemetry-proto, codificación JSON)."""
+        span = {
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "name": self.nombre,
+            "kind": 3 if self.nombre.startswith("http.") else 1,
+            "startTimeUnixNano": str(self.inicio_ns),
+            "endTimeUnixNano": str(self.inicio_ns + (self.duracion_ns or 0)),
+            "attributes": [_atributo_otlp(k, v) for k, v in self.atributos.items()],
+            "status": {"code": 2, "message": self.error} if self.error else {"code": 1},
+        }
+        if self.parent_id:
+            span["parentSpanId"] = self.parent_id
+        return span
+
+
+class _SpanNulo:
+    """Span que no registra nada (trazado desactivado)."""
+
+    trace_id = span_id = parent_id = None
+
+    def set(self, clave: str, valor: Any) -> None:
+        pass
+
+    def update(self, **atributos: Any) -> None:
+        pass
+
+    def duracion_parcial_ms(self) -> float:
+        return 0.0
+
+
+_SPAN_NULO = _SpanNulo()
+
+
+def _atributo_otlp(clave: str, valor: Any) -> Dict[str, Any]:
+    if isinstance(valor, bool):
+        v = {"boolValue": valor}
+    elif isinstance(valor, int):
+        v = {"intValue": str(valor)}
+    elif isinstance(valor, float):
+        v = {"doubleValue": valor}
+    else:
+        v = {"stringValue": str(valor)}
+    return {"key": clave, "value": v}
+
+
+# ------------------------------------------------------------
+# Exportadores
+# ------------------------------------------------------------
+
+class ExportadorMemoriaV1:
+    """Conserva las últimas `max_trazas` trazas (para diagnóstico en la UI o en benchmarks)."""
+
+    def __init__(self, max_trazas: int = 100):
+        self.trazas: Deque[List[SpanV1]] = deque(maxlen=max_trazas)
+
+    def exportar(self, spans: List[SpanV1]) -> None:
+        self.trazas.append(spans)
+
+    def ultimas(self, n: int = 10) -> List[List[SpanV1]]:
+        return list(self.trazas)[-n:]
+
+
+class ExportadorArchivoOTLPV1:
+    """
+    Escribe cada traza como una línea JSON con el documento OTLP completo
+    ({"resourceSpans": [...]}), vía el log JSONL asíncrono: exportar no bloquea
+    el turno y cada línea se puede enviar tal cual a un colector OTLP/HTTP.
+    """
+
+    def __init__(self, path: str = "data/traces.jsonl", servicio: str = "fe_agent"):
+        self.path = path
+        self.servicio = servicio
+        self.log = get_log(path)
+
+    def exportar(self, spans: List[SpanV1]) -> None:
+        self.log.append(documento_otlp(spans, self.servicio))
+
+
+def documento_otlp(spans: List[SpanV1], servicio: str = "fe_agent") -> Dict[str, Any]:
+    """Documento OTLP JSON (ExportTraceServiceRequest) de una traza."""
+    return {
+        "resourceSpans": [{
+            "resource": {"attributes": [_atributo_otlp("service.name", servicio)]},
+            "scopeSpans": [{
+                "scope": {"name": "fe_agent.tracing_v1"},
+                "spans": [s.a_otlp() for s in spans],
+            }],
+        }]
+    }
+
+
+# ------------------------------------------------------------
+# Tracer
+# ------------------------------------------------------------
+
+# Spans terminados por trace_id, mientras la raíz siga abierta
+_ABIERTAS: Dict[str, List[SpanV1]] = {}
+
+
+class TracerV1:
+    """
+    Trazado liviano del pipeline:
+      - una traza por turno (trace_id), propagada con contextvars: llega sola a
+        las tareas asyncio; para un pool de hilos, enviar la función con
+        contextvars.copy_context().run,
+      - spans anidados por etapa y por cada llamada HTTP saliente,
+      - al cerrar el span raíz, la traza completa va a los exportadores.
+    Un span sin traza activa abre una traza propia (llamadas sueltas también se ven).
+    """
+
+    def __init__(self, exportadores: Optional[List[Any]] = None, activo: bool = True):
+        self.exportadores = list(exportadores or [])
+        self.activo = activo
+
+    @contextmanager
+    def span(self, nombre: str, **atributos: Any) -> Iterator[Any]:
+        if not self.activo:
+            yield _SPAN_NULO
+            return
+        padre = _SPAN_ACTUAL.get()
+        span = SpanV1(nombre, padre, atributos)
+        if padre is None:
+            _ABIERTAS[span.trace_id] = []
+        token = _SPAN_ACTUAL.set(span)
+        try:
+            yield span
+        except Exception as e:
+            span.error = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            span.terminar()
+            _SPAN_ACTUAL.reset(token)
+            if padre is None:
+                self._exportar([span] + _ABIERTAS.pop(span.trace_id, []))
+            else:
+                terminados = _ABIERTAS.get(span.trace_id)
+                if terminados is not None:
+                    terminados.append(span)
+
+    @contextmanager
+    def traza(self, nombre: str = "turno", **atributos: Any) -> Iterator[Any]:
+        """Span raíz de un turno: abre siempre una traza nueva, aunque haya otra activa."""
+        token = _SPAN_ACTUAL.set(None)
+        try:
+            with self.span(nombre, **atributos) as raiz:
+                yield raiz
+        finally:
+            _SPAN_ACTUAL.reset(token)
+
+    def _exportar(self, spans: List[SpanV1]) -> None:
+        for exportador in self.exportadores:
+            try:
+                exportador.exportar(spans)
+            except Exception as e:
+                print(f"[TracerV1] Error exportando traza: {e}")
+
+    @staticmethod
+    def trace_id_actual() -> Optional[str]:
+        span = _SPAN_ACTUAL.get()
+        return span.trace_id if span else None
+
+
+def trazar(nombre: Optional[str] = None) -> Callable:
+    """Decorador: envuelve la función en un span (nombre por defecto: Clase.metodo)."""
+    def decorador(funcion: Callable) -> Callable:
+        etiqueta = nombre or funcion.__qualname__
+
+        @functools.wraps(funcion)
+        def envoltura(*args, **kwargs):
+            with get_tracer().span(etiqueta):
+                return funcion(*args, **kwargs)
+        return envoltura
+    return decorador
+
+
+# ------------------------------------------------------------
+# Atributos de Ollama
+# ------------------------------------------------------------
+
+def atributos_ollama(respuesta: Dict[str, Any]) -> Dict[str, Any]:
+    """Conteos y duraciones que Ollama informa en la respuesta final (ns -> ms)."""
+    atributos = {
+        "llm.prompt_tokens": respuesta.get("prompt_eval_count"),
+        "llm.completion_tokens": respuesta.get("eval_count"),
+    }
+    for campo in ("prompt_eval_duration", "eval_duration", "load_duration", "total_duration"):
+        if respuesta.get(campo) is not None:
+            atributos[f"llm.{campo}_ms"] = round(respuesta[campo] / 1e6, 3)
+    return {k: v for k, v in atributos.items() if v is not None}
+
+
+def atributos_stream_cortado(chunks: int, primer_token_ms: Optional[float], total_ms: float) -> Dict[str, Any]:
+    """
+    Lo medible cuando el flujo se corta antes del chunk final `done` (Ollama solo
+    informa conteos y duraciones ahí): cada chunk trae un token, así que
+    completion_tokens = chunks; la generación es el tramo desde el primer token.
+    prompt_tokens y prompt_eval_duration no se conocen (primer_token_ms los acota).
+    """
+    atributos: Dict[str, Any] = {"llm.completion_tokens": chunks, "llm.conteos_estimados": True}
+    if primer_token_ms is not None:
+        atributos["llm.eval_duration_ms"] = round(total_ms - primer_token_ms, 3)
+    return atributos
+
+
+# ------------------------------------------------------------
+# Tracer compartido por proceso
+# ------------------------------------------------------------
+_TRACER: Optional[TracerV1] = None
+_TRACER_CONFIG: Optional[tuple] = None
+_TRACER_LOCK = threading.Lock()
+
+
+def configure_tracer(path: Optional[str] = "data/traces.jsonl",
+                     memoria: int = 100,
+                     activo: bool = True) -> TracerV1:
+    """
+    Configura el tracer compartido: exportación a archivo OTLP (si `path`) y a memoria.
+    Con la misma configuración devuelve el tracer existente (seguro ante reruns de Streamlit).
+    """
+    global _TRACER, _TRACER_CONFIG
+    config = (path, memoria, activo)
+    with _TRACER_LOCK:
+        if _TRACER is not None and _TRACER_CONFIG == config:
+            return _TRACER
+        exportadores: List[Any] = [ExportadorMemoriaV1(memoria)]
+        if path:
+            directorio = os.path.dirname(path)
+            if directorio:
+                os.makedirs(directorio, exist_ok=True)
+            exportadores.append(ExportadorArchivoOTLPV1(path))
+        _TRACER = TracerV1(exportadores, activo=activo)
+        _TRACER_CONFIG = config
+        return _TRACER
+
+
+def get_tracer() -> TracerV1:
+    """Devuelve el tracer del proceso (por defecto solo exporta a memoria)."""
+    global _TRACER
+    with _TRACER_LOCK:
+        if _TRACER is None:
+            _TRACER = TracerV1([ExportadorMemoriaV1()])
+        return _TRACER
+
+
+def resumen_traza(spans: List[SpanV1]) -> List[Dict[str, Any]]:
+    """Tabla simple (span, ms, atributos) para ver dónde se fue el tiempo de un turno."""
+    return [{"span": s.nombre, "ms": round(s.duracion_ms, 2), **s.atributos}
+            for s in sorted(spans, key=lambda s: s.inicio_ns)]
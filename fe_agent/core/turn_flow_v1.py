@@ -0,0 +1,179 @@
+# ============================================================
+#  core/turn_flow_v1.py
+#  Flujo de un turno del agente (app_fe_agent_v9 y benchmark)
+#  Autor: Eduardo Sánchez Santana
+#  Fecha: 2025-11-08
+# ============================================================
+
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, Optional
+
+# Resultados por partes más grandes que esto se muestran como primera página
+# (la tabla completa queda en el table store para exportar o graficar)
+MAX_FILAS_VISTA = 50_000
+
+# Tipos de gráfico que se dejan listos en segundo plano tras un resultado
+TIPOS_PRECALENTADOS = ("barras", "linea", "torta", "columnas")
+
+
+class PresentadorTurnoV1:
+    """
+    Salida de un turno. La interfaz (Streamlit) dibuja; el benchmark solo
+    renderiza las figuras. Los métodos por defecto no hacen nada.
+    """
+
+    def mensaje(self, texto: str) -> None:
+        pass
+
+    def avance(self, primeras, filas: int) -> None:
+        """Primera página de un resultado que todavía está llegando (on_progreso)."""
+        pass
+
+    def tabla(self, df) -> None:
+        pass
+
+    def tabla_parcial(self, primeras, total: int) -> None:
+        """Resultado demasiado grande para mostrarlo entero: solo su primera página (pa.Table)."""
+        pass
+
+    def grafico(self, df, visual: str, precalentar: bool = False) -> None:
+        pass
+
+
+class FlujoTurnoV1:
+    """
+    Un turno completo, el mismo para la app y para el benchmark:
+      0. atajo determinista (IntentMatcherV1),
+      1. ambigüedad / fuera de dominio y aclaración (solo sigue si el
+         clasificador local resolvió la intención sin dudas),
+      2. interpretación con el LLM,
+      3. operaciones de interfaz/contexto sin n8n,
+      4. ejecución (motor local o n8n, con avance por partes),
+      5. tabla y gráfico sugerido.
+    `medir(etapa, ms)` recibe el tiempo de cada etapa ("ambiguedad",
+    "desambiguacion", "interpretacion", "ejecucion", "renderizado").
+    run() devuelve {"resultado": "fuera_de_dominio" | "clarificacion" | "local"
+    | "error_ejecucion" | "resultado", "accion": ...}.
+    """
+
+    def __init__(self, fast, amb, dis, llm, hyp, n8n,
+                 medir: Optional[Callable[[str, float], None]] = None):
+        self.fast = fast
+        self.amb = amb
+        self.dis = dis
+        self.llm = llm
+        self.hyp = hyp
+        self.n8n = n8n
+        self.medir = medir
+
+    @contextmanager
+    def _etapa(self, nombre: str) -> Iterator[None]:
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            if self.medir is not None:
+                self.medir(nombre, (time.perf_counter() - t0) * 1000)
+
+    def run(self, cm, user_input: str, presentador: PresentadorTurnoV1) -> Dict[str, Any]:
+        # 0️⃣ Atajo determinista: preguntas conocidas sin pasar por el LLM
+        parsed = None
+        if self.fast is not None:
+            with self._etapa("interpretacion"):
+                parsed = self.fast.match(user_input)
+
+        if parsed is None:
+            # 1️⃣ Detectar ambigüedad o fuera de dominio
+            with self._etapa("ambiguedad"):
+                amb_eval = self.amb.procesar_input(user_input)
+            if amb_eval.get("requiere_clarificacion") and amb_eval.get("tipo") in ("clarify", "out_of_scope"):
+                with self._etapa("desambiguacion"):
+                    clar = self.dis.clarify(user_input, cm.to_llm_context(limit_historial=6),
+                                            amb_eval.get("coincidencias"))
+                q = clar.get("clarification_question")
+                reph = clar.get("rephrased_question")
+
+                if clar.get("status") == "out_of_scope":
+                    presentador.mensaje(q or "Esa pregunta parece fuera del dominio de la ferretería.")
+                    return {"resultado": "fuera_de_dominio", "accion": None}
+
+                # Solo una intención reconocida localmente sin dudas sigue a la interpretación
+                if not self.dis.resuelta_sin_dudas(clar):
+                    if q:
+                        presentador.mensaje(q)
+                        cm.update("clarificacion_pendiente", q)
+                    if reph:
+                        presentador.mensaje(f"¿Te refieres a: *{reph}*?")
+                    return {"resultado": "clarificacion", "accion": None}
+
+            # 2️⃣ Interpretación normal
+            with self._etapa("interpretacion"):
+                parsed = self.llm.interpret(user_input, cm.to_llm_context())
+
+        accion, params = parsed.get("accion"), parsed.get("parametros")
+        visual = parsed.get("visualizacion_sugerida", "")
+
+        # 3️⃣ Operaciones de interfaz/contexto (repetir, exportar, re-graficar): sin n8n
+        if self.hyp.classify(parsed) in ("local", "confirm") and accion:
+            with self._etapa("ejecucion"):
+                local = self.hyp.run_local(parsed, cm)
+            presentador.mensaje(local.get("mensaje") or local.get("texto", ""))
+            df = (local.get("data") or {}).get("df")
+            if accion in ("ui_show_chart", "ui_change_chart_type"):
+                df = cm.get_last_table()
+                visual = (params or {}).get("tipo") or visual
+            if df is not None:
+                presentador.tabla(df)
+                if visual:
+                    with self._etapa("renderizado"):
+                        presentador.grafico(df, visual)
+            cm.save()
+            return {"resultado": "local", "accion": accion}
+
+        # 4️⃣ Ejecutar acción (motor local si la soporta, n8n en otro caso)
+        # Si n8n responde por partes, la primera página se muestra mientras llega el resto
+        avance = {"primeras": None}
+
+        def on_progreso(primeras, filas: int) -> None:
+            avance["primeras"] = primeras
+            presentador.avance(primeras, filas)
+
+        with self._etapa("ejecucion"):
+            result = self.hyp.execute_action(accion, params, self.n8n, on_progreso=on_progreso)
+        data = result.get("data")
+
+        if not result.get("ok", False):
+            presentador.mensaje("No se pudo ejecutar la acción solicitada.")
+            return {"resultado": "error_ejecucion", "accion": accion}
+
+        # 5️⃣ Mostrar resultado + visualización
+        df = None
+        if isinstance(data, dict) and data.get("tabla_ref"):
+            # Recibido por lotes: ya está en el table store, no se rearma desde JSON
+            cm.set_last_table_ref(data["tabla_ref"])
+            total = int(data.get("total_filas") or 0)
+            if total <= MAX_FILAS_VISTA or visual:
+                df = cm.get_last_table()
+            if total <= MAX_FILAS_VISTA:
+                presentador.tabla(df)
+            else:
+                primeras = avance["primeras"]
+                if primeras is None:  # acierto de caché: no llegaron lotes en este turno
+                    primeras = cm.table_store.get(data["tabla_ref"]).slice(0, 200)
+                presentador.tabla_parcial(primeras, total)
+        elif isinstance(data, dict) and "tabla" in data:
+            import pandas as pd
+            df = pd.DataFrame(data["tabla"])
+            presentador.tabla(df)
+            cm.set_last_table(df)
+        else:
+            presentador.mensaje(str(data))
+
+        if df is not None and visual:
+            with self._etapa("renderizado"):
+                presentador.grafico(df, visual, precalentar=True)
+
+        cm.update_last_action(accion)
+        cm.save()
+        return {"resultado": "resultado", "accion": accion}
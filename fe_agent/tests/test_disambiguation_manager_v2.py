@@ -0,0 +1,48 @@
+# ============================================================
+#  tests/test_disambiguation_manager_v2.py
+#  Regresión: el clasificador local no resuelve preguntas vagas o compuestas
+# ============================================================
+
+import os
+import sys
+
+import pytest
+
+RAIZ = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, RAIZ)
+
+from core.ambiguity_manager_v3 import AmbiguityManagerV3  # noqa: E402
+from core.disambiguation_manager_v2 import DisambiguationManagerV2  # noqa: E402
+from core.intent_classifier_v1 import IntentClassifierV1  # noqa: E402
+
+
+@pytest.fixture(scope="module")
+def gestores():
+    # Las rutas de data/ son relativas a la raíz del proyecto
+    cwd = os.getcwd()
+    os.chdir(RAIZ)
+    try:
+        yield AmbiguityManagerV3(), DisambiguationManagerV2(classifier=IntentClassifierV1.cargar_o_entrenar())
+    finally:
+        os.chdir(cwd)
+
+
+@pytest.mark.parametrize("pregunta", [
+    "ventas y compras o margen",
+    "margen o ventas y compras del trimestre",
+    "información de clientes",
+    "datos de productos",
+])
+def test_pregunta_marcada_no_se_resuelve_localmente(gestores, pregunta):
+    amb, dis = gestores
+    evaluacion = amb.procesar_input(pregunta)
+    assert evaluacion["requiere_clarificacion"] and evaluacion["tipo"] == "clarify"
+    local = dis.clarify_local(pregunta, evaluacion.get("coincidencias"))
+    assert local is None or not dis.resuelta_sin_dudas(local)
+
+
+def test_pregunta_clara_se_resuelve_localmente(gestores):
+    amb, dis = gestores
+    pregunta = "cuál fue el total de ventas del mes pasado"
+    local = dis.clarify_local(pregunta, amb.procesar_input(pregunta).get("coincidencias"))
+    assert local is not None and dis.resuelta_sin_dudas(local)
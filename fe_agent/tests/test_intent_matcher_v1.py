@@ -0,0 +1,46 @@
+# ============================================================
+#  tests/test_intent_matcher_v1.py
+#  Regresión del atajo determinista (IntentMatcherV1)
+# ============================================================
+
+import os
+import sys
+
+import pytest
+
+RAIZ = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, RAIZ)
+
+from core.intent_matcher_v1 import IntentMatcherV1  # noqa: E402
+
+
+@pytest.fixture(scope="module")
+def matcher():
+    # Las rutas de data/ son relativas a la raíz del proyecto
+    cwd = os.getcwd()
+    os.chdir(RAIZ)
+    try:
+        yield IntentMatcherV1()
+    finally:
+        os.chdir(cwd)
+
+
+def test_solo_acciones_del_registro(matcher):
+    acciones = {d["accion"] for d in matcher.documentos}
+    assert acciones and all(a in matcher.registro for a in acciones)
+    # En el banco de preguntas, pero no en el diccionario operativo
+    assert matcher.match("¿Cuánto se ha vendido en lo que va del año?") is None
+
+
+@pytest.mark.parametrize("pregunta", [
+    "ventas del año pasado",          # período distinto al de la pregunta conocida
+    "stock actual de martillos",      # filtro por producto
+])
+def test_periodo_o_filtro_delegan_al_llm(matcher, pregunta):
+    assert matcher.match(pregunta) is None
+
+
+def test_pregunta_conocida_sigue_por_el_atajo(matcher):
+    r = matcher.match("¿Cuál es el total de ventas del mes?")
+    assert r["accion"] == "consultar_total_ventas"
+    assert r["parametros"] == {"periodo": "mes_actual"}
@@ -0,0 +1,35 @@
+# ============================================================
+#  tests/test_plot_reduction_v1.py
+#  Regresión de la reducción de barras (orden y períodos conservados)
+# ============================================================
+
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+RAIZ = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, RAIZ)
+
+from core.plot_reduction_v1 import MAX_BARRAS, reducir  # noqa: E402
+
+
+def test_barras_por_mes_conservan_orden_y_todos_los_meses():
+    meses = pd.period_range("2023-01", periods=36, freq="M").astype(str)
+    df = pd.DataFrame({"mes": meses, "total": np.arange(36.0)[::-1]})
+    reducido, info = reducir(df, "barras")
+    assert info["metodo"] == "tramos" and len(reducido) == MAX_BARRAS
+    assert reducido["mes"].iloc[0].startswith("2023-01")
+    assert reducido["mes"].iloc[-1].endswith("2025-12")
+    assert reducido["total"].sum() == df["total"].sum()
+
+
+def test_top_n_mantiene_el_orden_original():
+    df = pd.DataFrame({"producto": [f"P{k:02d}" for k in range(40)],
+                       "total": np.random.default_rng(0).random(40)})
+    reducido, info = reducir(df, "barras")
+    assert info["metodo"] == "top_n"
+    etiquetas = reducido["producto"].tolist()
+    assert etiquetas[:-1] == sorted(etiquetas[:-1])
+    assert etiquetas[-1] == "Otros (11)"
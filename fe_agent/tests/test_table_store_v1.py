@@ -0,0 +1,33 @@
+# ============================================================
+#  tests/test_table_store_v1.py
+#  Regresión del escritor por lotes con tipos que cambian entre páginas
+# ============================================================
+
+import os
+import sys
+
+RAIZ = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, RAIZ)
+
+from core.result_stream_v1 import ReceptorTablaV1  # noqa: E402
+from core.table_store_v1 import EscritorTablaV1, ResultTableStoreV1  # noqa: E402
+
+
+def test_columna_numerica_que_recibe_texto_se_ensancha(tmp_path):
+    store = ResultTableStoreV1(str(tmp_path))
+    receptor = ReceptorTablaV1(EscritorTablaV1(store))
+    receptor.agregar_registros([{"id": 1, "stock": 10}, {"id": 2, "stock": 7}])
+    receptor.agregar_registros([{"id": 3, "stock": "N/A"}, {"id": 4, "stock": 5.5}])
+    data = receptor.cerrar()
+    tabla = store.get(data["tabla_ref"])
+    assert data["total_filas"] == 4
+    assert tabla.column("stock").to_pylist() == ["10", "7", "N/A", "5.5"]
+    assert receptor.primera_pagina.num_rows == 4
+
+
+def test_bloque_ndjson_con_tipos_mezclados(tmp_path):
+    store = ResultTableStoreV1(str(tmp_path))
+    receptor = ReceptorTablaV1(EscritorTablaV1(store))
+    receptor.feed(b'{"v": 1}\n{"v": "N/A"}\n')
+    tabla = store.get(receptor.cerrar()["tabla_ref"])
+    assert tabla.column("v").to_pylist() == ["1", "N/A"]